@@ -0,0 +1,21 @@
+import logging
+from timeit import default_timer as timer
+
+from opensfm.dataset import DataSet
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+def run_dataset(data: DataSet) -> None:
+    """Convert per-image pickled matches to the binary matches store."""
+
+    start = timer()
+    converted = data.convert_matches_to_binary()
+    end = timer()
+    logger.info(
+        "Converted matches of {} images in {:.2f} seconds. "
+        "Set 'matches_format: binary' in config.yaml to use them.".format(
+            converted, end - start
+        )
+    )
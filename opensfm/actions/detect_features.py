@@ -1,5 +1,6 @@
 import logging
 from timeit import default_timer as timer
+from typing import Any, Dict, Optional
 
 from opensfm import features_processing, io
 from opensfm.dataset_base import DataSetBase
@@ -12,12 +13,14 @@ def run_dataset(data: DataSetBase) -> None:
     """Compute features for all images."""
 
     start = timer()
-    features_processing.run_features_processing(data, data.images(), False)
+    stages = features_processing.run_features_processing(data, data.images(), False)
     end = timer()
-    write_report(data, end - start)
+    write_report(data, end - start, stages)
 
 
-def write_report(data: DataSetBase, wall_time: float) -> None:
+def write_report(
+    data: DataSetBase, wall_time: float, stages: Optional[Dict[str, Any]] = None
+) -> None:
     image_reports = []
     for image in data.images():
         try:
@@ -27,4 +30,6 @@ def write_report(data: DataSetBase, wall_time: float) -> None:
             logger.warning("No feature report image {}".format(image))
 
     report = {"wall_time": wall_time, "image_reports": image_reports}
+    if stages is not None:
+        report["stages"] = stages
     data.save_report(io.json_dumps(report), "features.json")
@@ -138,17 +138,14 @@ def _transform_dense_point_cloud(
     """Apply a transformation to the merged point cloud."""
     A, b = transformation[:3, :3], transformation[:3, 3]
     input_path = udata.point_cloud_file()
-    with io.open_rt(input_path) as fin:
-        with io.open_wt(output_path) as fout:
-            for i, line in enumerate(fin):
-                if i < 13:
-                    fout.write(line)
-                else:
-                    x, y, z, nx, ny, nz, red, green, blue = line.split()
-                    x, y, z = np.dot(A, map(float, [x, y, z])) + b
-                    nx, ny, nz = np.dot(A, map(float, [nx, ny, nz]))
-                    fout.write(
-                        "{} {} {} {} {} {} {} {} {}\n".format(
-                            x, y, z, nx, ny, nz, red, green, blue
-                        )
-                    )
+    with udata.io_handler.open(input_path, "rb") as fin:
+        reader = io.PointCloudPlyReader(fin)
+        with udata.io_handler.open(output_path, "wb") as fout:
+            writer = io.PointCloudPlyWriter(
+                fout, reader.count, reader.binary, double_precision=True
+            )
+            for points, normals, colors, labels in reader.chunks():
+                points = points.dot(A.T) + b
+                normals = normals.dot(A.T)
+                writer.write(points, normals, colors, labels)
+            writer.close()
@@ -6,7 +6,7 @@ from opensfm.dataset_base import DataSetBase
 def run_dataset(data: DataSetBase, algorithm: reconstruction.ReconstructionAlgorithm) -> None:
     """Compute the SfM reconstruction."""
 
-    tracks_manager = data.load_tracks_manager()
+    tracks_manager = data.load_tracks_manager(images=data.images())
 
     if algorithm == reconstruction.ReconstructionAlgorithm.INCREMENTAL:
         report, reconstructions = reconstruction.incremental_reconstruction(
@@ -27,13 +27,15 @@ def run_dataset(
         data, undistorted_data_path, io_handler=data.io_handler
     )
     reconstructions = data.load_reconstruction(reconstruction)
+    if not reconstructions:
+        return
+    r = reconstructions[reconstruction_index]
+
     if data.tracks_exists(tracks):
-        tracks_manager = data.load_tracks_manager(tracks)
+        tracks_manager = data.load_tracks_manager(tracks, images=list(r.shots))
     else:
         tracks_manager = None
 
-    if reconstructions:
-        r = reconstructions[reconstruction_index]
-        undistort.undistort_reconstruction_with_images(
-            tracks_manager, r, data, udata, skip_images
-        )
+    undistort.undistort_reconstruction_with_images(
+        tracks_manager, r, data, udata, skip_images
+    )
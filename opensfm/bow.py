@@ -1,4 +1,6 @@
 import os.path
+import threading
+from typing import Dict, Tuple
 
 import cv2
 import numpy as np
@@ -6,18 +8,31 @@ from opensfm import context
 
 
 class BagOfWords:
-    def __init__(self, words, frequencies):
+    def __init__(self, words, frequencies, build_index=True):
         self.words = words
         self.frequencies = frequencies
         self.weights = np.log(frequencies.sum() / frequencies)
-        FLANN_INDEX_KDTREE = 1
-        flann_params = {"algorithm": FLANN_INDEX_KDTREE, "trees": 8, "checks": 300}
-        self.index = context.flann_Index(words, flann_params)
+        self.index = None
+        self._index_lock = threading.Lock()
+        if build_index:
+            self._get_index()
+
+    def _get_index(self):
+        with self._index_lock:
+            if self.index is None:
+                FLANN_INDEX_KDTREE = 1
+                flann_params = {
+                    "algorithm": FLANN_INDEX_KDTREE,
+                    "trees": 8,
+                    "checks": 300,
+                }
+                self.index = context.flann_Index(self.words, flann_params)
+            return self.index
 
     def map_to_words(self, descriptors, k, matcher_type="FLANN"):
         if matcher_type == "FLANN":
             params = {"checks": 200}
-            idx, dist = self.index.knnSearch(descriptors, k, params=params)
+            idx, dist = self._get_index().knnSearch(descriptors, k, params=params)
         else:
             matcher = cv2.DescriptorMatcher_create(matcher_type)
             matches = matcher.knnMatch(descriptors, self.words, k=k)
@@ -25,6 +40,17 @@ class BagOfWords:
             idx = np.array(idx).astype(np.int32)
         return idx
 
+    def map_to_words_batch(self, descriptors_list, k, matcher_type="FLANN"):
+        """Map the descriptors of several images to words with a single query.
+
+        Return the words of each image, as map_to_words would.
+        """
+        if not descriptors_list:
+            return []
+        sizes = [len(d) for d in descriptors_list]
+        idx = self.map_to_words(np.concatenate(descriptors_list), k, matcher_type)
+        return np.split(np.asarray(idx), np.cumsum(sizes)[:-1])
+
     def histogram(self, words):
         h = np.bincount(words, minlength=len(self.words)) * self.weights
         return h / h.sum()
@@ -59,6 +85,26 @@ def load_vlad_words_and_frequencies(config):
     return vlad["words"], vlad["frequencies"]
 
 
+# Vocabularies loaded by this process, per (file, matcher type)
+_bows_cache: Dict[Tuple[str, str], BagOfWords] = {}
+_bows_cache_lock = threading.Lock()
+
+
 def load_bows(config) -> BagOfWords:
-    words, frequencies = load_bow_words_and_frequencies(config)
-    return BagOfWords(words, frequencies)
+    """Load the vocabulary of the config, once per process.
+
+    The FLANN index of the words is only built for the FLANN matcher.
+    """
+    key = (config["bow_file"], config["bow_matcher_type"])
+    with _bows_cache_lock:
+        bows = _bows_cache.get(key)
+        if bows is None:
+            words, frequencies = load_bow_words_and_frequencies(config)
+            bows = BagOfWords(words, frequencies, key[1] == "FLANN")
+            _bows_cache[key] = bows
+    return bows
+
+
+def clear_bows_cache() -> None:
+    with _bows_cache_lock:
+        _bows_cache.clear()
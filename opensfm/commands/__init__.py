@@ -3,6 +3,7 @@ from . import (
     bundle,
     compute_depthmaps,
     compute_statistics,
+    convert_matches,
     create_rig,
     create_submodels,
     create_tracks,
@@ -30,6 +31,7 @@ opensfm_commands = [
     extract_metadata,
     detect_features,
     match_features,
+    convert_matches,
     create_rig,
     create_tracks,
     reconstruct,
@@ -0,0 +1,16 @@
+from opensfm.actions import convert_matches
+
+from . import command
+import argparse
+from opensfm.dataset import DataSet
+
+
+class Command(command.CommandBase):
+    name = "convert_matches"
+    help = "Convert pickled matches to the binary matches store"
+
+    def run_impl(self, dataset: DataSet, args: argparse.Namespace) -> None:
+        convert_matches.run_dataset(dataset)
+
+    def add_arguments_impl(self, parser: argparse.ArgumentParser) -> None:
+        pass
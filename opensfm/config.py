@@ -100,6 +100,8 @@ class OpenSfMConfig:
     flann_tree: int = 8
     # Smaller -> Faster (but might lose good matches)
     flann_checks: int = 20
+    # Save the FLANN index of each image in detect_features and load it when matching
+    flann_persist_index: bool = False
 
     ##################################
     # Params for BoW matching
@@ -111,6 +113,8 @@ class OpenSfMConfig:
     bow_num_checks: int = 20
     # Matcher type to assign words to features
     bow_matcher_type: str = "FLANN"
+    # Maximum number of images whose features are mapped to words in a single query during feature extraction
+    bow_words_batch_size: int = 8
 
     ##################################
     # Params for VLAD matching
@@ -164,12 +168,34 @@ class OpenSfMConfig:
     matching_vlad_gps_neighbors: int = 0
     # If True, VLAD image selection will use N neighbors from the same camera + N neighbors from any different camera. If False, the selection will take the nearest neighbors from all cameras.
     matching_vlad_other_cameras: bool = False
+    # If True, VLAD image selection without GPS preemption uses an approximate nearest neighbors index saved in the dataset
+    matching_vlad_index: bool = False
+    # Number of cells of the VLAD index. Set to 0 to use 4 * sqrt(number of images)
+    matching_vlad_index_cells: int = 0
+    # Number of VLAD index cells searched for each image. Higher values are slower with a better recall
+    matching_vlad_index_probes: int = 16
+    # Number of images per side of the distance tiles used for BoW and VLAD selection without GPS preemption
+    matching_affinity_block_size: int = 1024
     # Number of rounds to run when running triangulation-based pair selection
     matching_graph_rounds: int = 0
     # If True, removes static matches using ad-hoc heuristics
     matching_use_filters: bool = False
     # Use segmentation information (if available) to improve matching
     matching_use_segmentation: bool = False
+    # Storage of matches: one gzipped pickle per image (pickle), or a single memory-mappable store (binary)
+    matches_format: str = "pickle"
+    # Storage of tracks: a single CSV file (csv), or a memory-mappable columnar store (binary)
+    tracks_format: str = "csv"
+    # Memory budget of the feature loading cache in MB, split between worker processes (0 to use a fraction of the available memory)
+    feature_cache_memory: int = 0
+    # Fraction of the available memory used by the feature loading cache when feature_cache_memory is 0
+    feature_cache_memory_fraction: float = 0.25
+    # Reorder pairs so that pairs sharing an image are matched together, for feature cache locality
+    matching_schedule_pairs: bool = True
+    # Number of consecutive scheduled pairs sent at once to a worker process
+    matching_block_size: int = 32
+    # Number of candidate images brute force matched at once against an image (BRUTEFORCE matcher only). Set to 0 to match pairs one by one
+    matching_batch_size: int = 0
 
     ##################################
     # Params for geometric estimation
@@ -204,6 +230,17 @@ class OpenSfMConfig:
     resection_threshold: float = 0.004
     # Minimum number of resection inliers to accept it
     resection_min_inliers: int = 10
+    # How bootstrap image pairs are ranked : FULL evaluates all pairs up front, LAZY evaluates them
+    # in batches by decreasing number of common tracks, only as far as needed
+    bootstrap_pairs_ranking: str = "FULL"
+    # Number of pairs evaluated per batch with the LAZY bootstrap pairs ranking
+    bootstrap_pairs_batch_size: int = 64
+    # Split the image pairs graph into connected components and reconstruct each one in its own
+    # worker process (up to 'processes' at once)
+    reconstruction_parallel_components: bool = False
+    # Number of best candidate images resected concurrently at each step of the incremental
+    # reconstruction (1 to add images one at a time). Uses 'processes' threads
+    resection_candidates: int = 1
 
     ##################################
     # Params for track creation
@@ -263,6 +300,19 @@ class OpenSfMConfig:
     retriangulation_ratio: float = 1.2
     # Use analytic derivatives or auto-differentiated ones during bundle adjustment
     bundle_analytic_derivatives: bool = True
+    # How to schedule bundles while growing : RATIO bundles everything based on the interval and
+    # points ratio below, ADAPTIVE chooses between local, window and full bundles within a time budget
+    bundle_scheduling: str = "RATIO"
+    # Seconds of bundle time allowed per added image with ADAPTIVE bundle scheduling
+    bundle_time_budget_per_image: float = 2.0
+    # Increase of the median reprojection error since the last full bundle that requires a
+    # global adjustment with ADAPTIVE bundle scheduling
+    bundle_drift_ratio: float = 1.5
+    # Number of last added images bundled by a window bundle
+    bundle_window_size: int = 20
+    # Number of last shots by capture time optimized after adding images, earlier shots being kept
+    # fixed (0 to disable). Meant for sequences, it replaces the local bundle.
+    bundle_sliding_window: int = 0
     # Bundle after adding 'bundle_interval' cameras
     bundle_interval: int = 999999
     # Bundle when the number of points grows by this ratio
@@ -340,6 +390,18 @@ class OpenSfMConfig:
     depthmap_min_consistent_views: int = 3
     # Save debug files with partial reconstruction results
     depthmap_save_debug_files: bool = False
+    # Storage of depthmaps: compressed npz (COMPRESSED), uncompressed npz (NPZ) or memory-mappable npy files (NPY)
+    depthmap_storage: str = "COMPRESSED"
+    # Format of the dense point clouds : ASCII or BINARY (little-endian) PLY
+    depthmap_point_cloud_format: str = "ASCII"
+    # Memory budget in MB of the cache of scaled images and depthmaps shared by the depthmap stages
+    depthmap_image_cache_memory: int = 1024
+    # Size of the voxels in which merged dense points are averaged into a single point (0 to keep all points)
+    depthmap_merge_voxel_size: float = 0
+    # Size of the spatial tiles in which points are bucketed on disk when merging by voxels
+    depthmap_merge_tile_size: float = 50
+    # Also save the voxel-merged point cloud as one PLY per tile with an index, for streaming viewers
+    depthmap_merge_tiled_output: bool = False
 
     ##################################
     # Params for multi-processing/threading
@@ -348,6 +410,16 @@ class OpenSfMConfig:
     processes: int = 1
     # When processes > 1, number of threads used for reading images
     read_processes: int = 4
+    # Number of threads masking, sorting and mapping to words the extracted features
+    feature_postprocess_processes: int = 1
+    # Number of threads writing extracted features
+    feature_write_processes: int = 2
+    # Memory budget in MB of the queue of decoded images (0 to derive it from the available memory)
+    feature_queue_memory: int = 0
+    # Memory budget in MB of each queue of extracted features
+    feature_output_queue_memory: int = 512
+    # Parallel backend for pure-Python stages (matching, pair selection): threading or processes
+    parallel_backend: str = "threading"
 
     ##################################
     # Params for submodel split and merge
@@ -6,8 +6,10 @@ try:
 except ModuleNotFoundError:
     pass  # Windows
 import ctypes
+import functools
 import sys
-from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional, Tuple
 
 import cv2
 from joblib import Parallel, delayed, parallel_backend
@@ -40,22 +42,94 @@ else:
 
 
 # Parallel processes
-def parallel_map(func, args, num_proc: int, max_batch_size: int = 1):
-    """Run function for all arguments using multiple processes."""
+PARALLEL_BACKENDS = ("threading", "processes")
+
+# Arguments shared by all the tasks run by a worker process
+_worker_shared_args: Tuple[Any, ...] = ()
+# Number of worker processes of the pool the current process belongs to
+_num_process_workers: int = 1
+
+
+def _init_process_worker(shared_args: Tuple[Any, ...], num_workers: int) -> None:
+    """Store the shared arguments and pool size once per worker process."""
+    global _worker_shared_args, _num_process_workers
+    _worker_shared_args = shared_args
+    _num_process_workers = num_workers
+    cv2.setNumThreads(0)
+
+
+def num_process_workers() -> int:
+    """Number of processes sharing the memory budgets of this process.
+
+    It is the pool size in a worker process of the "processes" backend,
+    and 1 otherwise.
+    """
+    return _num_process_workers
+
+
+def _call_with_shared_args(func, shared_args: Tuple[Any, ...], arg):
+    return func(tuple(arg) + shared_args)
+
+
+def _call_in_process_worker(func, with_shared_args: bool, arg):
+    if with_shared_args:
+        return func(tuple(arg) + _worker_shared_args)
+    return func(arg)
+
+
+def parallel_map(
+    func,
+    args,
+    num_proc: int,
+    max_batch_size: int = 1,
+    backend: str = "threading",
+    shared_args: Optional[Tuple[Any, ...]] = None,
+):
+    """Run function for all arguments using multiple threads or processes.
+
+    The "threading" backend is best suited for functions spending most of
+    their time in native code that releases the GIL. The "processes"
+    backend runs pure-Python functions in worker processes, and requires
+    the function and its arguments to be picklable.
+
+    If shared_args is set, the function is called with tuple(arg) +
+    shared_args for each argument. Shared arguments are sent once to each
+    worker process instead of once per task.
+    """
+    if backend not in PARALLEL_BACKENDS:
+        raise ValueError("Invalid parallel backend: {}".format(backend))
+
     # De-activate/Restore any inner OpenCV threading
     threads_used = cv2.getNumThreads()
     cv2.setNumThreads(0)
 
+    args = list(args)
     num_proc = min(num_proc, len(args))
+    if shared_args is not None:
+        task = functools.partial(_call_with_shared_args, func, shared_args)
+    else:
+        task = func
+
     if num_proc <= 1:
-        res = list(map(func, args))
+        res = list(map(task, args))
     else:
-        with parallel_backend("threading", n_jobs=num_proc):
-            batch_size = max(1, int(len(args) / (num_proc * 2)))
-            batch_size = (
-                min(batch_size, max_batch_size) if max_batch_size else batch_size
-            )
-            res = Parallel(batch_size=batch_size)(delayed(func)(arg) for arg in args)
+        batch_size = max(1, int(len(args) / (num_proc * 2)))
+        batch_size = min(batch_size, max_batch_size) if max_batch_size else batch_size
+        if backend == "processes":
+            with ProcessPoolExecutor(
+                max_workers=num_proc,
+                initializer=_init_process_worker,
+                initargs=(shared_args or (), num_proc),
+            ) as executor:
+                worker_task = functools.partial(
+                    _call_in_process_worker, func, shared_args is not None
+                )
+                res = list(executor.map(worker_task, args, chunksize=batch_size))
+        else:
+            with parallel_backend("threading", n_jobs=num_proc):
+                res = Parallel(batch_size=batch_size)(
+                    delayed(task)(arg) for arg in args
+                )
 
     cv2.setNumThreads(threads_used)
     return res
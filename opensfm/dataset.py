@@ -4,25 +4,36 @@ import logging
 import os
 import pickle
 from io import BytesIO
-from typing import Dict, List, Tuple, Optional, IO, Any
+from typing import Dict, Iterable, List, Tuple, Optional, IO, Any
 
 import numpy as np
 from opensfm import (
     config,
+    context,
     features,
     geo,
     io,
+    matches_store,
     pygeometry,
     types,
     pymap,
     masking,
     rig,
+    tracks_store,
+    vlad_index,
 )
 from opensfm.dataset_base import DataSetBase
 from PIL.PngImagePlugin import PngImageFile
 
 logger: logging.Logger = logging.getLogger(__name__)
 
+# Arrays stored for each kind of depthmap
+DEPTHMAP_ARRAYS: Dict[str, Tuple[str, ...]] = {
+    "raw": ("depth", "plane", "score", "nghbr", "nghbrs"),
+    "clean": ("depth", "plane", "score"),
+    "pruned": ("points", "normals", "colors", "labels"),
+}
+
 
 class DataSet(DataSetBase):
     """Accessors to the main input and output data.
@@ -43,6 +54,7 @@ class DataSet(DataSetBase):
     image_files: Dict[str, str] = {}
     mask_files: Dict[str, str] = {}
     image_list: List[str] = []
+    _binary_matches_store: Optional[matches_store.BinaryMatchesStore] = None
 
     def __init__(self, data_path: str, io_handler=io.IoFilesystemDefault) -> None:
         """Init dataset associated to a folder."""
@@ -320,6 +332,40 @@ class DataSet(DataSetBase):
     def save_features(self, image: str, features_data: features.FeaturesData) -> None:
         self._save_features(self._feature_file(image), features_data)
 
+    def _feature_index_file(self, image: str) -> str:
+        """Return path of the persisted FLANN index of an image"""
+        return os.path.join(self._feature_path(), image + ".flann")
+
+    def _feature_index_metadata_file(self, image: str) -> str:
+        return os.path.join(self._feature_path(), image + ".flann.json")
+
+    def feature_index_exists(self, image: str) -> bool:
+        return self.io_handler.isfile(
+            self._feature_index_metadata_file(image)
+        ) and self.io_handler.isfile(self._feature_index_file(image))
+
+    def load_feature_index_metadata(self, image: str) -> Optional[Dict[str, Any]]:
+        if not self.feature_index_exists(image):
+            return None
+        with self.io_handler.open_rt(self._feature_index_metadata_file(image)) as fin:
+            return io.json_load(fin)
+
+    def load_feature_index(self, image: str, descriptors: np.ndarray) -> Any:
+        """Load the FLANN index of an image, built from the given descriptors."""
+        index = context.flann_Index()
+        index.load(descriptors, self._feature_index_file(image))
+        return index
+
+    def save_feature_index(
+        self, image: str, index: Any, metadata: Dict[str, Any]
+    ) -> None:
+        self.io_handler.mkdir_p(self._feature_path())
+        index.save(self._feature_index_file(image))
+        # Metadata is written last, so that it is only present with a
+        # complete index.
+        with self.io_handler.open_wt(self._feature_index_metadata_file(image)) as fout:
+            io.json_dump(metadata, fout)
+
     def _words_file(self, image: str) -> str:
         return os.path.join(self._feature_path(), image + ".words.npz")
 
@@ -335,6 +381,20 @@ class DataSet(DataSetBase):
         with self.io_handler.open(self._words_file(image), "wb") as f:
             np.savez_compressed(f, words=words.astype(np.uint16))
 
+    def _vlad_index_file(self) -> str:
+        return os.path.join(self.data_path, "vlad_index.npz")
+
+    def vlad_index_exists(self) -> bool:
+        return self.io_handler.isfile(self._vlad_index_file())
+
+    def load_vlad_index(self) -> vlad_index.VladIndex:
+        with self.io_handler.open(self._vlad_index_file(), "rb") as f:
+            return vlad_index.VladIndex.load(f)
+
+    def save_vlad_index(self, index: vlad_index.VladIndex) -> None:
+        with self.io_handler.open(self._vlad_index_file(), "wb") as f:
+            index.save(f)
+
     def _matches_path(self) -> str:
         """Return path of matches directory"""
         return os.path.join(self.data_path, "matches")
@@ -343,10 +403,31 @@ class DataSet(DataSetBase):
         """File for matches for an image"""
         return os.path.join(self._matches_path(), "{}_matches.pkl.gz".format(image))
 
+    def _use_binary_matches(self) -> bool:
+        matches_format = self.config["matches_format"]
+        if matches_format not in ("pickle", "binary"):
+            raise ValueError("Invalid matches_format: {}".format(matches_format))
+        return matches_format == "binary"
+
+    def binary_matches_store(self) -> matches_store.BinaryMatchesStore:
+        """Binary matches store of the dataset."""
+        if self._binary_matches_store is None:
+            self._binary_matches_store = matches_store.BinaryMatchesStore(
+                self.io_handler, self._matches_path()
+            )
+        return self._binary_matches_store
+
     def matches_exists(self, image: str) -> bool:
+        if self._use_binary_matches():
+            return self.binary_matches_store().has_image(image)
         return self.io_handler.isfile(self._matches_file(image))
 
     def load_matches(self, image: str) -> Dict[str, np.ndarray]:
+        if self._use_binary_matches():
+            return self.binary_matches_store().load_image_matches(image)
+        return self._load_pickled_matches(image)
+
+    def _load_pickled_matches(self, image: str) -> Dict[str, np.ndarray]:
         # Prevent pickling of anything except what we strictly need
         # as 'pickle.load' is RCE-prone. Will raise on any class other
         # than the numpy ones we allow.
@@ -372,6 +453,10 @@ class DataSet(DataSetBase):
         return matches
 
     def save_matches(self, image: str, matches: Dict[str, np.ndarray]) -> None:
+        if self._use_binary_matches():
+            self.binary_matches_store().save_image_matches(image, matches)
+            return
+
         self.io_handler.mkdir_p(self._matches_path())
 
         with BytesIO() as buffer:
@@ -381,6 +466,16 @@ class DataSet(DataSetBase):
                 fw.write(buffer.getvalue())
 
     def find_matches(self, im1: str, im2: str) -> np.ndarray:
+        if self._use_binary_matches():
+            store = self.binary_matches_store()
+            im1_matches = store.load_pair_matches(im1, im2)
+            if im1_matches is not None:
+                return im1_matches
+            im2_matches = store.load_pair_matches(im2, im1)
+            if im2_matches is not None and len(im2_matches):
+                return im2_matches[:, [1, 0]]
+            return np.array([])
+
         if self.matches_exists(im1):
             im1_matches = self.load_matches(im1)
             if im2 in im1_matches:
@@ -392,24 +487,82 @@ class DataSet(DataSetBase):
                     return im2_matches[im1][:, [1, 0]]
         return np.array([])
 
+    def convert_matches_to_binary(self) -> int:
+        """Copy pickled per-image matches files to the binary matches store.
+
+        Returns the number of converted images. Existing pickled files
+        are kept.
+        """
+        store = self.binary_matches_store()
+        converted = 0
+        for image in self.images():
+            if not self.io_handler.isfile(self._matches_file(image)):
+                continue
+            store.save_image_matches(image, self._load_pickled_matches(image))
+            converted += 1
+        return converted
+
+    def _use_binary_tracks(self) -> bool:
+        tracks_format = self.config["tracks_format"]
+        if tracks_format not in ("csv", "binary"):
+            raise ValueError("Invalid tracks_format: {}".format(tracks_format))
+        return tracks_format == "binary"
+
     def _tracks_manager_file(self, filename: Optional[str] = None) -> str:
         """Return path of tracks file"""
-        return os.path.join(self.data_path, filename or "tracks.csv")
+        default = "tracks.bin" if self._use_binary_tracks() else "tracks.csv"
+        return os.path.join(self.data_path, filename or default)
+
+    def _existing_tracks_manager_file(self, filename: Optional[str] = None) -> str:
+        """Return path of tracks file, falling back to the other format."""
+        path = self._tracks_manager_file(filename)
+        if filename or self._tracks_path_exists(path):
+            return path
+        for default in ("tracks.bin", "tracks.csv"):
+            fallback = os.path.join(self.data_path, default)
+            if self._tracks_path_exists(fallback):
+                return fallback
+        return path
+
+    def _tracks_path_exists(self, path: str) -> bool:
+        return self.io_handler.isfile(path) or self.io_handler.isdir(path)
 
     def load_tracks_manager(
-        self, filename: Optional[str] = None
+        self, filename: Optional[str] = None, images: Optional[List[str]] = None
     ) -> pymap.TracksManager:
-        """Return the tracks manager"""
-        with self.io_handler.open(self._tracks_manager_file(filename), "r") as f:
-            return pymap.TracksManager.instanciate_from_string(f.read())
+        """Return the tracks manager
+
+        If images is given, only the observations of these images are loaded.
+        Binary tracks are read directly for these images only.
+        """
+        path = self._existing_tracks_manager_file(filename)
+        if self.io_handler.isdir(path):
+            store = tracks_store.BinaryTracksStore(self.io_handler, path)
+            return store.load(images)
+
+        with self.io_handler.open(path, "r") as f:
+            tracks_manager = pymap.TracksManager.instanciate_from_string(f.read())
+        if images is None:
+            return tracks_manager
+        images = set(images)
+        shot_ids = tracks_manager.get_shot_ids()
+        if images.issuperset(shot_ids):
+            return tracks_manager
+        return tracks_manager.construct_sub_tracks_manager(
+            tracks_manager.get_track_ids(), [s for s in shot_ids if s in images]
+        )
 
     def tracks_exists(self, filename: Optional[str] = None) -> bool:
-        return self.io_handler.isfile(self._tracks_manager_file(filename))
+        return self._tracks_path_exists(self._existing_tracks_manager_file(filename))
 
     def save_tracks_manager(
         self, tracks_manager: pymap.TracksManager, filename: Optional[str] = None
     ) -> None:
-        with self.io_handler.open(self._tracks_manager_file(filename), "w") as fw:
+        path = self._tracks_manager_file(filename)
+        if self._use_binary_tracks():
+            tracks_store.BinaryTracksStore(self.io_handler, path).save(tracks_manager)
+            return
+        with self.io_handler.open(path, "w") as fw:
             fw.write(tracks_manager.as_string())
 
     def _reconstruction_file(self, filename: Optional[str]) -> str:
@@ -863,7 +1016,7 @@ class UndistortedDataSet(object):
     def load_point_cloud(
         self, filename: str = "merged.ply"
     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
-        with self.io_handler.open(self.point_cloud_file(filename), "r") as fp:
+        with self.io_handler.open(self.point_cloud_file(filename), "rb") as fp:
             return io.point_cloud_from_ply(fp)
 
     def save_point_cloud(
@@ -875,11 +1028,94 @@ class UndistortedDataSet(object):
         filename: str = "merged.ply",
     ) -> None:
         self.io_handler.mkdir_p(self._depthmap_path())
-        with self.io_handler.open(self.point_cloud_file(filename), "w") as fp:
-            io.point_cloud_to_ply(points, normals, colors, labels, fp)
+        with self.io_handler.open(self.point_cloud_file(filename), "wb") as fp:
+            io.point_cloud_to_ply(
+                points, normals, colors, labels, fp, self._point_cloud_binary()
+            )
+
+    def save_point_cloud_chunks(
+        self,
+        count: int,
+        chunks: Iterable[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]],
+        filename: str = "merged.ply",
+    ) -> None:
+        """Save a point cloud of count points given by chunks, one at a time."""
+        self.io_handler.mkdir_p(self._depthmap_path())
+        with self.io_handler.open(self.point_cloud_file(filename), "wb") as fp:
+            writer = io.PointCloudPlyWriter(fp, count, self._point_cloud_binary())
+            for points, normals, colors, labels in chunks:
+                writer.write(points, normals, colors, labels)
+            writer.close()
+
+    def _point_cloud_binary(self) -> bool:
+        return self.config["depthmap_point_cloud_format"] == "BINARY"
+
+    def _depthmap_npy_file(self, image: str, kind: str, name: str) -> str:
+        return self.depthmap_file(image, "{}.{}.npy".format(kind, name))
+
+    def _depthmap_npy_exists(self, image: str, kind: str) -> bool:
+        # Arrays are written in order, the last one marks a complete depthmap
+        last = DEPTHMAP_ARRAYS[kind][-1]
+        return self.io_handler.isfile(self._depthmap_npy_file(image, kind, last))
+
+    def depthmap_exists(self, image: str, kind: str) -> bool:
+        """Whether a raw, clean or pruned depthmap is stored, in any format."""
+        return self._depthmap_npy_exists(image, kind) or self.io_handler.isfile(
+            self.depthmap_file(image, kind + ".npz")
+        )
+
+    def save_depthmap_arrays(
+        self, image: str, kind: str, arrays: Dict[str, np.ndarray]
+    ) -> None:
+        """Save the arrays of a raw, clean or pruned depthmap.
+
+        The format is set by 'depthmap_storage': a compressed npz file
+        (COMPRESSED), an uncompressed npz file (NPZ) or one npy file per
+        array that can be memory-mapped (NPY). Files of the depthmap stored
+        in the other format are removed, so that they aren't loaded instead.
+        """
+        self.io_handler.mkdir_p(self._depthmap_path())
+        storage = self.config["depthmap_storage"]
+        if storage == "NPY":
+            # The last array marks a complete depthmap, so it goes first
+            marker = DEPTHMAP_ARRAYS[kind][-1]
+            self.io_handler.rm_if_exist(self._depthmap_npy_file(image, kind, marker))
+            for name in DEPTHMAP_ARRAYS[kind]:
+                filepath = self._depthmap_npy_file(image, kind, name)
+                with self.io_handler.open(filepath, "wb") as f:
+                    np.save(f, arrays[name])
+            self.io_handler.rm_if_exist(self.depthmap_file(image, kind + ".npz"))
+        elif storage in ("NPZ", "COMPRESSED"):
+            save = np.savez if storage == "NPZ" else np.savez_compressed
+            filepath = self.depthmap_file(image, kind + ".npz")
+            with self.io_handler.open(filepath, "wb") as f:
+                save(f, **{name: arrays[name] for name in DEPTHMAP_ARRAYS[kind]})
+            # The last array first, as it marks a complete NPY depthmap
+            for name in reversed(DEPTHMAP_ARRAYS[kind]):
+                self.io_handler.rm_if_exist(self._depthmap_npy_file(image, kind, name))
+        else:
+            raise ValueError("Unknown depthmap storage {}".format(storage))
+
+    def load_depthmap_arrays(
+        self, image: str, kind: str, names: Optional[Iterable[str]] = None
+    ) -> Tuple[np.ndarray, ...]:
+        """Load some arrays (all by default) of a raw, clean or pruned depthmap.
+
+        Only the requested arrays are read. NPY depthmaps are memory-mapped
+        when the filesystem allows it.
+        """
+        names = DEPTHMAP_ARRAYS[kind] if names is None else names
+        if self._depthmap_npy_exists(image, kind):
+            return tuple(
+                self.io_handler.load_npy(self._depthmap_npy_file(image, kind, name))
+                for name in names
+            )
+        with self.io_handler.open(self.depthmap_file(image, kind + ".npz"), "rb") as f:
+            o = np.load(f)
+            return tuple(o[name] for name in names)
 
     def raw_depthmap_exists(self, image: str) -> bool:
-        return self.io_handler.isfile(self.depthmap_file(image, "raw.npz"))
+        return self.depthmap_exists(image, "raw")
 
     def save_raw_depthmap(
         self,
@@ -890,40 +1126,40 @@ class UndistortedDataSet(object):
         nghbr: np.ndarray,
         nghbrs: np.ndarray,
     ) -> None:
-        self.io_handler.mkdir_p(self._depthmap_path())
-        filepath = self.depthmap_file(image, "raw.npz")
-        with self.io_handler.open(filepath, "wb") as f:
-            np.savez_compressed(
-                f, depth=depth, plane=plane, score=score, nghbr=nghbr, nghbrs=nghbrs
-            )
+        self.save_depthmap_arrays(
+            image,
+            "raw",
+            {
+                "depth": depth,
+                "plane": plane,
+                "score": score,
+                "nghbr": nghbr,
+                "nghbrs": nghbrs,
+            },
+        )
 
     def load_raw_depthmap(
         self, image: str
     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
-        with self.io_handler.open(self.depthmap_file(image, "raw.npz"), "rb") as f:
-            o = np.load(f)
-            return o["depth"], o["plane"], o["score"], o["nghbr"], o["nghbrs"]
+        return self.load_depthmap_arrays(image, "raw")
 
     def clean_depthmap_exists(self, image: str) -> bool:
-        return self.io_handler.isfile(self.depthmap_file(image, "clean.npz"))
+        return self.depthmap_exists(image, "clean")
 
     def save_clean_depthmap(
         self, image: str, depth: np.ndarray, plane: np.ndarray, score: np.ndarray
     ) -> None:
-        self.io_handler.mkdir_p(self._depthmap_path())
-        filepath = self.depthmap_file(image, "clean.npz")
-        with self.io_handler.open(filepath, "wb") as f:
-            np.savez_compressed(f, depth=depth, plane=plane, score=score)
+        self.save_depthmap_arrays(
+            image, "clean", {"depth": depth, "plane": plane, "score": score}
+        )
 
     def load_clean_depthmap(
         self, image: str
     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
-        with self.io_handler.open(self.depthmap_file(image, "clean.npz"), "rb") as f:
-            o = np.load(f)
-            return o["depth"], o["plane"], o["score"]
+        return self.load_depthmap_arrays(image, "clean")
 
     def pruned_depthmap_exists(self, image: str) -> bool:
-        return self.io_handler.isfile(self.depthmap_file(image, "pruned.npz"))
+        return self.depthmap_exists(image, "pruned")
 
     def save_pruned_depthmap(
         self,
@@ -933,28 +1169,16 @@ class UndistortedDataSet(object):
         colors: np.ndarray,
         labels: np.ndarray,
     ) -> None:
-        self.io_handler.mkdir_p(self._depthmap_path())
-        filepath = self.depthmap_file(image, "pruned.npz")
-        with self.io_handler.open(filepath, "wb") as f:
-            np.savez_compressed(
-                f,
-                points=points,
-                normals=normals,
-                colors=colors,
-                labels=labels,
-            )
+        self.save_depthmap_arrays(
+            image,
+            "pruned",
+            {"points": points, "normals": normals, "colors": colors, "labels": labels},
+        )
 
     def load_pruned_depthmap(
         self, image: str
     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
-        with self.io_handler.open(self.depthmap_file(image, "pruned.npz"), "rb") as f:
-            o = np.load(f)
-            return (
-                o["points"],
-                o["normals"],
-                o["colors"],
-                o["labels"],
-            )
+        return self.load_depthmap_arrays(image, "pruned")
 
     def load_undistorted_tracks_manager(self) -> pymap.TracksManager:
         filename = os.path.join(self.data_path, "tracks.csv")
@@ -10,6 +10,7 @@ from opensfm import (
     pygeometry,
     types,
     pymap,
+    vlad_index,
 )
 
 logger: logging.Logger = logging.getLogger(__name__)
@@ -106,6 +107,24 @@ class DataSetBase(ABC):
     def save_features(self, image: str, features_data: features.FeaturesData) -> None:
         pass
 
+    @abstractmethod
+    def feature_index_exists(self, image: str) -> bool:
+        pass
+
+    @abstractmethod
+    def load_feature_index_metadata(self, image: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def load_feature_index(self, image: str, descriptors: np.ndarray) -> Any:
+        pass
+
+    @abstractmethod
+    def save_feature_index(
+        self, image: str, index: Any, metadata: Dict[str, Any]
+    ) -> None:
+        pass
+
     @abstractmethod
     def words_exist(self, image: str) -> bool:
         pass
@@ -118,6 +137,18 @@ class DataSetBase(ABC):
     def save_words(self, image: str, words: np.ndarray) -> None:
         pass
 
+    @abstractmethod
+    def vlad_index_exists(self) -> bool:
+        pass
+
+    @abstractmethod
+    def load_vlad_index(self) -> vlad_index.VladIndex:
+        pass
+
+    @abstractmethod
+    def save_vlad_index(self, index: vlad_index.VladIndex) -> None:
+        pass
+
     @abstractmethod
     def matches_exists(self, image: str) -> bool:
         pass
@@ -132,7 +163,7 @@ class DataSetBase(ABC):
 
     @abstractmethod
     def load_tracks_manager(
-        self, filename: Optional[str] = None
+        self, filename: Optional[str] = None, images: Optional[List[str]] = None
     ) -> pymap.TracksManager:
         pass
 
@@ -1,5 +1,10 @@
+import heapq
 import logging
+import os
 import typing as t
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from timeit import default_timer as timer
 
 import cv2
 import numpy as np
@@ -9,11 +14,15 @@ from opensfm import pydense
 from opensfm import pymap
 from opensfm import tracking
 from opensfm import types
-from opensfm.context import parallel_map
 from opensfm.dataset import UndistortedDataSet
+from opensfm.feature_loading import FeatureCache
 
 logger = logging.getLogger(__name__)
 
+# Per-shot stages, each one requiring the previous one to be done for the
+# shot and its neighbors
+DEPTHMAP_STAGES = ("compute", "clean", "prune")
+
 
 def compute_depthmaps(
     data: UndistortedDataSet,
@@ -32,64 +41,164 @@ def compute_depthmaps(
     processes = config["processes"]
     num_neighbors = config["depthmap_num_neighbors"]
 
-    neighbors = {}
-    common_tracks = common_tracks_double_dict(graph)
-    for shot in reconstruction.shots.values():
-        neighbors[shot.id] = find_neighboring_images(
-            shot, common_tracks, reconstruction, num_neighbors
-        )
+    neighbors, depth_ranges = compute_neighbors_and_depth_ranges(
+        graph, reconstruction, num_neighbors, config
+    )
 
-    arguments = []
+    stage_arguments = {}
     for shot in reconstruction.shots.values():
         if len(neighbors[shot.id]) <= 1:
             continue
-        mind, maxd = compute_depth_range(graph, reconstruction, shot, config)
-        arguments.append((data, neighbors[shot.id], mind, maxd, shot))
-    parallel_map(compute_depthmap_catched, arguments, processes)
+        mind, maxd = depth_ranges[shot.id]
+        stage_arguments[shot.id] = {
+            "compute": (data, neighbors[shot.id], mind, maxd, shot),
+            "clean": (data, neighbors[shot.id], shot),
+            "prune": (data, neighbors[shot.id], shot),
+        }
+
+    cache = FeatureCache(int(config["depthmap_image_cache_memory"] * 1024 * 1024))
+    report = run_depthmap_stages(stage_arguments, neighbors, processes, cache)
+
+    if config["depthmap_merge_voxel_size"] > 0:
+        report["merge"] = save_voxel_merged_depthmaps(data, reconstruction)
+    else:
+        save_merged_depthmaps(data, reconstruction)
+    data.base.save_report(io.json_dumps(report), "dense.json")
 
-    arguments = []
-    for shot in reconstruction.shots.values():
-        if len(neighbors[shot.id]) <= 1:
-            continue
-        arguments.append((data, neighbors[shot.id], shot))
-    parallel_map(clean_depthmap_catched, arguments, processes)
 
-    arguments = []
-    for shot in reconstruction.shots.values():
-        if len(neighbors[shot.id]) <= 1:
-            continue
-        arguments.append((data, neighbors[shot.id], shot))
-    parallel_map(prune_depthmap_catched, arguments, processes)
+def depthmap_stage_dependencies(
+    shot_ids: t.Iterable[str], neighbors: t.Dict[str, t.List[pymap.Shot]]
+) -> t.Dict[t.Tuple[str, str], t.Set[t.Tuple[str, str]]]:
+    """Tasks required by each (stage, shot) task.
 
-    point_cloud = merge_depthmaps(data, reconstruction)
-    data.save_point_cloud(*point_cloud, filename="merged.ply")
+    A stage of a shot requires the previous stage of the shot and of its
+    neighbors having depthmaps.
+    """
+    shot_ids = set(shot_ids)
+    dependencies = {}
+    for shot_id in shot_ids:
+        dependencies[(DEPTHMAP_STAGES[0], shot_id)] = set()
+        required = {n.id for n in neighbors[shot_id] if n.id in shot_ids}
+        required.add(shot_id)
+        for previous, stage in zip(DEPTHMAP_STAGES, DEPTHMAP_STAGES[1:]):
+            dependencies[(stage, shot_id)] = {(previous, r) for r in required}
+    return dependencies
+
+
+def run_depthmap_stages(
+    stage_arguments: t.Dict[str, t.Dict[str, t.Tuple]],
+    neighbors: t.Dict[str, t.List[pymap.Shot]],
+    processes: int,
+    cache: t.Optional[FeatureCache] = None,
+) -> t.Dict[str, t.Any]:
+    """Run the depthmap stages of all shots as soon as their inputs exist.
+
+    Instead of waiting for all shots to finish a stage, a shot is cleaned
+    as soon as the raw depthmaps of its neighbors are computed, and pruned
+    as soon as they are cleaned. Ready tasks of later stages run first, so
+    that shots go through the pipeline while their images are cached.
+
+    Returns a report with the wall time of each stage of each shot.
+    """
+    dependencies = depthmap_stage_dependencies(stage_arguments, neighbors)
+    dependents = defaultdict(list)
+    for task, required in dependencies.items():
+        for r in required:
+            dependents[r].append(task)
+    remaining = {task: len(required) for task, required in dependencies.items()}
+
+    order = {shot_id: i for i, shot_id in enumerate(stage_arguments)}
+    ready = []
+
+    def push(task: t.Tuple[str, str]) -> None:
+        stage, shot_id = task
+        priority = -DEPTHMAP_STAGES.index(stage)
+        heapq.heappush(ready, (priority, order[shot_id], task))
+
+    for task, count in remaining.items():
+        if count == 0:
+            push(task)
+
+    # De-activate/Restore any inner OpenCV threading
+    threads_used = cv2.getNumThreads()
+    cv2.setNumThreads(0)
+
+    start = timer()
+    timings = defaultdict(dict)
+    with ThreadPoolExecutor(max_workers=max(1, processes)) as executor:
+        running = {}
+        while ready or running:
+            while ready and len(running) < max(1, processes):
+                _, _, task = heapq.heappop(ready)
+                stage, shot_id = task
+                future = executor.submit(
+                    run_depthmap_stage, stage, stage_arguments[shot_id][stage], cache
+                )
+                running[future] = task
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                stage, shot_id = task
+                timings[shot_id][stage] = future.result()
+                for dependent in dependents[task]:
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0:
+                        push(dependent)
+
+    cv2.setNumThreads(threads_used)
+
+    report = {
+        "wall_time": timer() - start,
+        "num_shots": len(stage_arguments),
+        "shots": dict(timings),
+    }
+    if cache is not None:
+        report["image_cache"] = cache.stats()
+    return report
+
+
+def run_depthmap_stage(
+    stage: str, arguments: t.Tuple, cache: t.Optional[FeatureCache]
+) -> float:
+    """Run a stage of a shot and return its wall time."""
+    start = timer()
+    if stage == "compute":
+        compute_depthmap_catched(arguments, cache)
+    elif stage == "clean":
+        clean_depthmap_catched(arguments, cache)
+    elif stage == "prune":
+        prune_depthmap_catched(arguments, cache)
+    else:
+        raise ValueError("Unknown depthmap stage {}".format(stage))
+    return timer() - start
 
 
-def compute_depthmap_catched(arguments):
+def compute_depthmap_catched(arguments, cache=None):
     try:
-        compute_depthmap(arguments)
+        compute_depthmap(arguments, cache)
     except Exception as e:
         logger.error("Exception on child. Arguments: {}".format(arguments))
         logger.exception(e)
 
 
-def clean_depthmap_catched(arguments):
+def clean_depthmap_catched(arguments, cache=None):
     try:
-        clean_depthmap(arguments)
+        clean_depthmap(arguments, cache)
     except Exception as e:
         logger.error("Exception on child. Arguments: {}".format(arguments))
         logger.exception(e)
 
 
-def prune_depthmap_catched(arguments):
+def prune_depthmap_catched(arguments, cache=None):
     try:
-        prune_depthmap(arguments)
+        prune_depthmap(arguments, cache)
     except Exception as e:
         logger.error("Exception on child. Arguments: {}".format(arguments))
         logger.exception(e)
 
 
-def compute_depthmap(arguments):
+def compute_depthmap(arguments, cache=None):
     """Compute depthmap for a single shot."""
     log.setup()
 
@@ -111,7 +220,7 @@ def compute_depthmap(arguments):
     de.set_patchmatch_iterations(data.config["depthmap_patchmatch_iterations"])
     de.set_patch_size(data.config["depthmap_patch_size"])
     de.set_min_patch_sd(data.config["depthmap_min_patch_sd"])
-    add_views_to_depth_estimator(data, neighbors, de)
+    add_views_to_depth_estimator(data, neighbors, de, cache)
 
     if method == "BRUTE_FORCE":
         depth, plane, score, nghbr = de.compute_brute_force()
@@ -160,7 +269,7 @@ def compute_depthmap(arguments):
         plt.show()
 
 
-def clean_depthmap(arguments):
+def clean_depthmap(arguments, cache=None):
     """Clean depthmap by checking consistency with neighbors."""
     log.setup()
 
@@ -176,11 +285,13 @@ def clean_depthmap(arguments):
     dc = pydense.DepthmapCleaner()
     dc.set_same_depth_threshold(data.config["depthmap_same_depth_threshold"])
     dc.set_min_consistent_views(data.config["depthmap_min_consistent_views"])
-    add_views_to_depth_cleaner(data, neighbors, dc)
+    add_views_to_depth_cleaner(data, neighbors, dc, cache)
     depth = dc.clean()
 
     # Save and display results
-    raw_depth, raw_plane, raw_score, raw_nghbr, nghbrs = data.load_raw_depthmap(shot.id)
+    raw_depth, raw_plane, raw_score = data.load_depthmap_arrays(
+        shot.id, "raw", ("depth", "plane", "score")
+    )
     data.save_clean_depthmap(shot.id, depth, raw_plane, raw_score)
 
     if data.config["depthmap_save_debug_files"]:
@@ -204,7 +315,7 @@ def clean_depthmap(arguments):
         plt.show()
 
 
-def prune_depthmap(arguments):
+def prune_depthmap(arguments, cache=None):
     """Prune depthmap to remove redundant points."""
     log.setup()
 
@@ -219,7 +330,7 @@ def prune_depthmap(arguments):
 
     dp = pydense.DepthmapPruner()
     dp.set_same_depth_threshold(data.config["depthmap_same_depth_threshold"])
-    add_views_to_depth_pruner(data, neighbors, dp)
+    add_views_to_depth_pruner(data, neighbors, dp, cache)
     points, normals, colors, labels = dp.prune()
 
     # Save and display results
@@ -263,6 +374,276 @@ def merge_depthmaps(
     return merge_depthmaps_from_provider(shot_ids, depthmap_provider)
 
 
+def save_merged_depthmaps(
+    data: UndistortedDataSet,
+    reconstruction: types.Reconstruction,
+    filename: str = "merged.ply",
+) -> int:
+    """Merge pruned depthmaps into a point cloud file, one shot at a time.
+
+    Only the labels of the depthmaps are read to count points for the PLY
+    header, then points are written shot by shot, so that the merged cloud
+    is never held in memory.
+
+    Returns the number of points written.
+    """
+    logger.info("Merging depthmaps")
+    shot_ids = [s for s in reconstruction.shots if data.pruned_depthmap_exists(s)]
+    if not shot_ids:
+        logger.warning("Depthmaps contain no points.  Try using more images.")
+
+    count = 0
+    for shot_id in shot_ids:
+        (labels,) = data.load_depthmap_arrays(shot_id, "pruned", ("labels",))
+        count += len(labels)
+
+    chunks = (data.load_pruned_depthmap(shot_id) for shot_id in shot_ids)
+    data.save_point_cloud_chunks(count, chunks, filename)
+    return count
+
+
+# Points of the out-of-core merge are bucketed into tile files of records
+MERGE_RECORD_DTYPE = np.dtype(
+    [
+        ("point", "<f4", (3,)),
+        ("normal", "<f4", (3,)),
+        ("color", "u1", (3,)),
+        ("label", "u1"),
+    ]
+)
+
+
+def voxel_merge(
+    points: np.ndarray,
+    normals: np.ndarray,
+    colors: np.ndarray,
+    labels: np.ndarray,
+    voxel_size: float,
+) -> t.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Replace the points falling in the same voxel by a single point.
+
+    Positions, normals and colors are averaged, normals are re-normalized
+    and the label is the most frequent one of the voxel. Voxels are aligned
+    to the origin, so that points of different tiles never share a voxel
+    when the tile size is a multiple of the voxel size.
+    """
+    if len(points) == 0:
+        return points, normals, colors, labels
+
+    keys = np.floor(np.asarray(points) / voxel_size).astype(np.int64)
+    _, inverse, counts = np.unique(
+        keys, axis=0, return_inverse=True, return_counts=True
+    )
+    inverse = inverse.ravel()
+    num_voxels = len(counts)
+
+    def voxel_sums(values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        return np.column_stack(
+            [
+                np.bincount(inverse, weights=values[:, i], minlength=num_voxels)
+                for i in range(values.shape[1])
+            ]
+        )
+
+    merged_points = voxel_sums(points) / counts[:, None]
+    merged_normals = voxel_sums(normals)
+    norms = np.linalg.norm(merged_normals, axis=1)
+    merged_normals[norms > 0] /= norms[norms > 0, None]
+    merged_colors = np.round(voxel_sums(colors) / counts[:, None])
+
+    pairs, pair_counts = np.unique(
+        inverse * 256 + np.asarray(labels, dtype=np.int64), return_counts=True
+    )
+    pair_voxels, pair_labels = pairs // 256, pairs % 256
+    order = np.lexsort((-pair_counts, pair_voxels))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = pair_voxels[order][1:] != pair_voxels[order][:-1]
+    merged_labels = np.zeros(num_voxels, dtype=np.uint8)
+    merged_labels[pair_voxels[order][first]] = pair_labels[order][first]
+
+    return (
+        merged_points.astype(np.float32),
+        merged_normals.astype(np.float32),
+        merged_colors.astype(np.uint8),
+        merged_labels,
+    )
+
+
+def _merge_tile_name(key: t.Tuple[int, int, int]) -> str:
+    return "{}_{}_{}".format(*key)
+
+
+def _clear_merge_folder(data: UndistortedDataSet, path: str) -> None:
+    """Remove the files left in a folder by a previous merge."""
+    if data.io_handler.isdir(path):
+        for name in data.io_handler.ls(path):
+            data.io_handler.rm_if_exist(os.path.join(path, name))
+
+
+def bucket_depthmaps_into_tiles(
+    data: UndistortedDataSet,
+    shot_ids: t.Iterable[str],
+    tile_size: float,
+    path: str,
+) -> t.Dict[t.Tuple[int, int, int], int]:
+    """Append the points of the pruned depthmaps to one file per tile.
+
+    Only one depthmap is held in memory at a time. Returns the number of
+    points of each tile.
+    """
+    counts = defaultdict(int)
+    for shot_id in shot_ids:
+        points, normals, colors, labels = data.load_pruned_depthmap(shot_id)
+        if len(points) == 0:
+            continue
+
+        records = np.empty(len(points), dtype=MERGE_RECORD_DTYPE)
+        records["point"] = points
+        records["normal"] = normals
+        records["color"] = colors
+        records["label"] = labels
+
+        keys = np.floor(records["point"] / tile_size).astype(np.int64)
+        tiles, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind="stable")
+        offsets = np.searchsorted(inverse[order], np.arange(len(tiles) + 1))
+        records = records[order]
+
+        for i, tile in enumerate(tiles):
+            key = tuple(int(k) for k in tile)
+            filename = os.path.join(path, _merge_tile_name(key) + ".bin")
+            with data.io_handler.open(filename, "ab") as fb:
+                fb.write(records[offsets[i] : offsets[i + 1]].tobytes())
+            counts[key] += int(offsets[i + 1] - offsets[i])
+    return dict(counts)
+
+
+def _load_merge_tile(
+    data: UndistortedDataSet, filename: str
+) -> t.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    records = data.io_handler.memmap(filename, MERGE_RECORD_DTYPE)
+    return (
+        np.array(records["point"]),
+        np.array(records["normal"]),
+        np.array(records["color"]),
+        np.array(records["label"]),
+    )
+
+
+def _save_merge_tile(
+    data: UndistortedDataSet,
+    filename: str,
+    points: np.ndarray,
+    normals: np.ndarray,
+    colors: np.ndarray,
+    labels: np.ndarray,
+) -> None:
+    records = np.empty(len(points), dtype=MERGE_RECORD_DTYPE)
+    records["point"] = points
+    records["normal"] = normals
+    records["color"] = colors
+    records["label"] = labels
+    with data.io_handler.open(filename, "wb") as fb:
+        fb.write(records.tobytes())
+
+
+def save_voxel_merged_depthmaps(
+    data: UndistortedDataSet,
+    reconstruction: types.Reconstruction,
+    filename: str = "merged.ply",
+) -> t.Dict[str, t.Any]:
+    """Merge pruned depthmaps keeping a single point per voxel.
+
+    Points are first bucketed into spatial tiles on disk, then each tile is
+    loaded and merged independently, so that memory is bounded by the size
+    of the largest tile rather than by the whole point cloud. Merged tiles
+    are concatenated into filename and, if depthmap_merge_tiled_output is
+    set, also saved as one PLY file per tile in the tiles folder along with
+    an index.json listing their bounds.
+
+    Returns a report of the number of points and tiles.
+    """
+    logger.info("Merging depthmaps by voxels")
+    config = data.config
+    voxel_size = config["depthmap_merge_voxel_size"]
+    tile_size = max(1, round(config["depthmap_merge_tile_size"] / voxel_size))
+    tile_size *= voxel_size
+
+    shot_ids = [s for s in reconstruction.shots if data.pruned_depthmap_exists(s)]
+    if not shot_ids:
+        logger.warning("Depthmaps contain no points.  Try using more images.")
+
+    path = data.point_cloud_file("merge_tiles")
+    _clear_merge_folder(data, path)
+    data.io_handler.mkdir_p(path)
+
+    input_counts = bucket_depthmaps_into_tiles(data, shot_ids, tile_size, path)
+
+    tiled_output = config["depthmap_merge_tiled_output"]
+    _clear_merge_folder(data, data.point_cloud_file("tiles"))
+    if tiled_output:
+        data.io_handler.mkdir_p(data.point_cloud_file("tiles"))
+
+    merged_counts = {}
+    tiles_index = []
+    for key in sorted(input_counts):
+        name = _merge_tile_name(key)
+        raw_file = os.path.join(path, name + ".bin")
+        merged = voxel_merge(*_load_merge_tile(data, raw_file), voxel_size)
+        data.io_handler.rm_if_exist(raw_file)
+
+        merged_counts[key] = len(merged[0])
+        _save_merge_tile(data, os.path.join(path, name + ".merged.bin"), *merged)
+        if tiled_output:
+            tile_filename = os.path.join("tiles", name + ".ply")
+            data.save_point_cloud(*merged, filename=tile_filename)
+            tiles_index.append(
+                {
+                    "filename": tile_filename,
+                    "key": list(key),
+                    "min": [k * tile_size for k in key],
+                    "max": [(k + 1) * tile_size for k in key],
+                    "num_points": len(merged[0]),
+                }
+            )
+
+    def chunks():
+        for key in sorted(merged_counts):
+            merged_file = os.path.join(path, _merge_tile_name(key) + ".merged.bin")
+            yield _load_merge_tile(data, merged_file)
+            data.io_handler.rm_if_exist(merged_file)
+
+    num_points = sum(merged_counts.values())
+    data.save_point_cloud_chunks(num_points, chunks(), filename)
+
+    if tiled_output:
+        with data.io_handler.open_wt(data.point_cloud_file("tiles/index.json")) as fout:
+            io.json_dump(
+                {
+                    "voxel_size": voxel_size,
+                    "tile_size": tile_size,
+                    "tiles": tiles_index,
+                },
+                fout,
+            )
+
+    report = {
+        "voxel_size": voxel_size,
+        "tile_size": tile_size,
+        "num_tiles": len(merged_counts),
+        "num_input_points": sum(input_counts.values()),
+        "num_points": num_points,
+    }
+    logger.info(
+        "Merged {} points into {} points in {} tiles".format(
+            report["num_input_points"], num_points, len(merged_counts)
+        )
+    )
+    return report
+
+
 def merge_depthmaps_from_provider(
     shot_ids: t.Iterable[str], depthmap_provider: t.Callable
 ) -> t.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
@@ -276,30 +657,63 @@ def merge_depthmaps_from_provider(
     return aggregate_depthmaps(shot_ids, depthmap_provider)
 
 
-def add_views_to_depth_estimator(data: UndistortedDataSet, neighbors, de):
+def load_cached(cache: t.Optional[FeatureCache], key: t.Hashable, load: t.Callable):
+    """Load a value through the cache, if any.
+
+    Cached values are shared between threads and must not be modified.
+    """
+    if cache is None:
+        return load()
+    return cache.get_or_compute(key, load)
+
+
+def load_scaled_gray_image(data: UndistortedDataSet, shot) -> t.Tuple:
+    """Load the gray image and mask of a shot at the depthmap resolution."""
+    color_image = data.load_undistorted_image(shot.id)
+    mask = load_combined_mask(data, shot)
+    gray_image = cv2.cvtColor(color_image, cv2.COLOR_RGB2GRAY)
+    original_height, original_width = gray_image.shape
+    width = min(original_width, int(data.config["depthmap_resolution"]))
+    height = width * original_height // original_width
+    image = scale_down_image(gray_image, width, height)
+    mask = scale_image(mask, image.shape[1], image.shape[0], cv2.INTER_NEAREST)
+    return image, mask, width, height
+
+
+def load_scaled_color_image(
+    data: UndistortedDataSet, shot, width: int, height: int
+) -> t.Tuple[np.ndarray, np.ndarray]:
+    """Load the color image and segmentation labels of a shot at a given size."""
+    color_image = data.load_undistorted_image(shot.id)
+    labels = load_segmentation_labels(data, shot)
+    image = scale_down_image(color_image, width, height)
+    labels = scale_image(labels, image.shape[1], image.shape[0], cv2.INTER_NEAREST)
+    return image, labels
+
+
+def add_views_to_depth_estimator(data: UndistortedDataSet, neighbors, de, cache=None):
     """Add neighboring views to the DepthmapEstimator."""
     num_neighbors = data.config["depthmap_num_matching_views"]
     for shot in neighbors[: num_neighbors + 1]:
         assert shot.camera.projection_type == "perspective"
-        color_image = data.load_undistorted_image(shot.id)
-        mask = load_combined_mask(data, shot)
-        gray_image = cv2.cvtColor(color_image, cv2.COLOR_RGB2GRAY)
-        original_height, original_width = gray_image.shape
-        width = min(original_width, int(data.config["depthmap_resolution"]))
-        height = width * original_height // original_width
-        image = scale_down_image(gray_image, width, height)
-        mask = scale_image(mask, image.shape[1], image.shape[0], cv2.INTER_NEAREST)
+        image, mask, width, height = load_cached(
+            cache, ("gray", shot.id), lambda: load_scaled_gray_image(data, shot)
+        )
         K = shot.camera.get_K_in_pixel_coordinates(width, height)
         R = shot.pose.get_rotation_matrix()
         t = shot.pose.translation
         de.add_view(K, R, t, image, mask)
 
 
-def add_views_to_depth_cleaner(data: UndistortedDataSet, neighbors, dc):
+def add_views_to_depth_cleaner(data: UndistortedDataSet, neighbors, dc, cache=None):
     for shot in neighbors:
         if not data.raw_depthmap_exists(shot.id):
             continue
-        depth, plane, score, nghbr, nghbrs = data.load_raw_depthmap(shot.id)
+        (depth,) = load_cached(
+            cache,
+            ("raw_depth", shot.id),
+            lambda: data.load_depthmap_arrays(shot.id, "raw", ("depth",)),
+        )
         height, width = depth.shape
         K = shot.camera.get_K_in_pixel_coordinates(width, height)
         R = shot.pose.get_rotation_matrix()
@@ -332,17 +746,21 @@ def load_segmentation_labels(data: UndistortedDataSet, shot):
         return np.zeros(size, dtype=np.uint8)
 
 
-def add_views_to_depth_pruner(data: UndistortedDataSet, neighbors, dp):
+def add_views_to_depth_pruner(data: UndistortedDataSet, neighbors, dp, cache=None):
     for shot in neighbors:
         if not data.clean_depthmap_exists(shot.id):
             continue
-        depth, plane, score = data.load_clean_depthmap(shot.id)
-        height, width = depth.shape
-        color_image = data.load_undistorted_image(shot.id)
-        labels = load_segmentation_labels(data, shot)
+        depth, plane = load_cached(
+            cache,
+            ("clean", shot.id),
+            lambda: data.load_depthmap_arrays(shot.id, "clean", ("depth", "plane")),
+        )
         height, width = depth.shape
-        image = scale_down_image(color_image, width, height)
-        labels = scale_image(labels, image.shape[1], image.shape[0], cv2.INTER_NEAREST)
+        image, labels = load_cached(
+            cache,
+            ("color", shot.id, width, height),
+            lambda: load_scaled_color_image(data, shot, width, height),
+        )
         K = shot.camera.get_K_in_pixel_coordinates(width, height)
         R = shot.pose.get_rotation_matrix()
         t = shot.pose.translation
@@ -366,6 +784,137 @@ def compute_depth_range(tracks_manager, reconstruction, shot, config):
     return config_min_depth or min_depth, config_max_depth or max_depth
 
 
+def shot_point_observations(
+    tracks_manager: pymap.TracksManager, reconstruction: types.Reconstruction
+) -> t.Tuple[t.List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """Observations of the reconstructed points by the reconstructed shots.
+
+    Returns the shot ids, the point coordinates and, for each observation,
+    the index of its shot and of its point, sorted by shot.
+    """
+    point_ids = list(reconstruction.points)
+    point_index = {point_id: i for i, point_id in enumerate(point_ids)}
+    coordinates = np.array(
+        [reconstruction.points[p].coordinates for p in point_ids]
+    ).reshape(-1, 3)
+
+    shot_ids = list(reconstruction.shots)
+    tracked_shots = set(tracks_manager.get_shot_ids())
+    obs_shots, obs_points = [], []
+    for i, shot_id in enumerate(shot_ids):
+        if shot_id not in tracked_shots:
+            continue
+        track_ids = tracks_manager.get_shot_observations_arrays(shot_id)[0]
+        indices = np.array([point_index.get(t, -1) for t in track_ids], dtype=int)
+        indices = indices[indices >= 0]
+        obs_shots.append(np.full(len(indices), i))
+        obs_points.append(indices)
+
+    if len(obs_shots) == 0:
+        return shot_ids, coordinates, np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    return shot_ids, coordinates, np.concatenate(obs_shots), np.concatenate(obs_points)
+
+
+def compute_neighbors_and_depth_ranges(
+    tracks_manager: pymap.TracksManager,
+    reconstruction: types.Reconstruction,
+    num_neighbors: int,
+    config: t.Dict[str, t.Any],
+    min_common_tracks: int = 50,
+) -> t.Tuple[
+    t.Dict[str, t.List[pymap.Shot]], t.Dict[str, t.Tuple[float, float]]
+]:
+    """Neighboring images and depth range of all shots.
+
+    Array-based equivalent of calling find_neighboring_images with the
+    pairs of common_tracks_double_dict, and compute_depth_range, for every
+    shot. For each shot, the common points with all other shots are
+    gathered at once and their triangulation angles are computed together.
+    As with common_tracks_double_dict, only pairs having at least
+    min_common_tracks common tracks, reconstructed or not, are neighbors.
+
+    Shots without observed points get no depth range.
+    """
+    theta_min = np.pi / 60
+    theta_max = np.pi / 6
+    min_score = 20
+
+    shot_ids, coordinates, obs_shots, obs_points = shot_point_observations(
+        tracks_manager, reconstruction
+    )
+    shots = [reconstruction.shots[s] for s in shot_ids]
+    origins = np.array([s.pose.get_origin() for s in shots]).reshape(-1, 3)
+
+    # Other shots having enough common tracks with each shot
+    shot_index = {shot_id: i for i, shot_id in enumerate(shot_ids)}
+    tracked_shots = set(tracks_manager.get_shot_ids())
+    connected = [[] for _ in shots]
+    connectivity = tracks_manager.get_all_pairs_connectivity(
+        [s for s in shot_ids if s in tracked_shots]
+    )
+    for (im1, im2), size in connectivity.items():
+        if size >= min_common_tracks:
+            connected[shot_index[im1]].append(shot_index[im2])
+            connected[shot_index[im2]].append(shot_index[im1])
+
+    # Observations sorted by point, to find the observers of a set of points
+    by_point = np.argsort(obs_points, kind="stable")
+    observers = obs_shots[by_point]
+    point_offsets = np.searchsorted(
+        obs_points[by_point], np.arange(len(coordinates) + 1)
+    )
+    shot_offsets = np.searchsorted(obs_shots, np.arange(len(shots) + 1))
+
+    config_min_depth = config["depthmap_min_depth"]
+    config_max_depth = config["depthmap_max_depth"]
+
+    neighbors, depth_ranges = {}, {}
+    for i, shot in enumerate(shots):
+        points = obs_points[shot_offsets[i] : shot_offsets[i + 1]]
+        neighbors[shot.id] = [shot]
+        if len(points) == 0:
+            continue
+
+        X = coordinates[points]
+        R = shot.pose.get_rotation_matrix()
+        depths = X.dot(R[2]) + shot.pose.translation[2]
+        min_depth = np.percentile(depths, 10) * 0.9
+        max_depth = np.percentile(depths, 90) * 1.1
+        depth_ranges[shot.id] = (
+            config_min_depth or min_depth,
+            config_max_depth or max_depth,
+        )
+
+        # All (other shot, common point) pairs
+        starts = point_offsets[points]
+        counts = point_offsets[points + 1] - starts
+        ends = np.cumsum(counts)
+        gathered = np.arange(ends[-1]) - np.repeat(ends - counts, counts)
+        gathered += np.repeat(starts, counts)
+        others = observers[gathered]
+        common = np.repeat(points, counts)
+        keep = others != i
+        others, common = others[keep], common[keep]
+
+        to_shot = origins[i] - coordinates[common]
+        to_other = origins[others] - coordinates[common]
+        cos = np.einsum("ij,ij->i", to_shot, to_other) / np.sqrt(
+            np.einsum("ij,ij->i", to_shot, to_shot)
+            * np.einsum("ij,ij->i", to_other, to_other)
+        )
+        theta = np.arccos(np.clip(cos, -1, 1))
+        good = (theta > theta_min) & (theta < theta_max)
+
+        scores = np.bincount(others[good], minlength=len(shots))
+        candidates = np.flatnonzero(scores > min_score)
+        candidates = candidates[np.isin(candidates, connected[i])]
+        order = np.argsort(-scores[candidates], kind="stable")
+        best = candidates[order[:num_neighbors]]
+        neighbors[shot.id] += [shots[j] for j in best]
+
+    return neighbors, depth_ranges
+
+
 def common_tracks_double_dict(
     tracks_manager: pymap.TracksManager,
 ) -> t.Dict[str, t.Dict[str, t.List[str]]]:
@@ -1,9 +1,10 @@
 import logging
-from functools import lru_cache
-from typing import Optional, Tuple, Any
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple, Any, Callable, Dict, Hashable
 
 import numpy as np
-from opensfm import pygeometry, features as ft, masking
+from opensfm import context, pygeometry, features as ft, masking
 from opensfm.dataset_base import DataSetBase
 
 
@@ -14,18 +15,162 @@ SEGMENTATION_IN_DESCRIPTOR_MULT = (
     35  # determined experimentally for HAHOG UCHAR type descriptors
 )
 
+# Budget used when the available memory can't be queried
+DEFAULT_CACHE_MEMORY_MB = 2048
+
+
+def estimate_nbytes(value: Any) -> int:
+    """Approximate memory held by the arrays of a cached value."""
+    if value is None:
+        return 0
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, ft.FeaturesData):
+        return (
+            estimate_nbytes(value.points)
+            + estimate_nbytes(value.descriptors)
+            + estimate_nbytes(value.colors)
+            + estimate_nbytes(value.semantic)
+        )
+    if isinstance(value, ft.SemanticData):
+        return estimate_nbytes(value.segmentation) + estimate_nbytes(value.instances)
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_nbytes(v) for v in value)
+    return 0
+
+
+class FeatureCache(object):
+    """Thread-safe LRU cache bounded by the memory held by its values.
+
+    Least recently used entries are evicted once the total estimated size
+    exceeds max_bytes. Values bigger than the whole budget are not cached.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Any],
+        nbytes: Callable[[Any], int] = estimate_nbytes,
+    ) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        value = compute()
+        self.put(key, value, nbytes(value))
+        return value
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def cache_budget(config: Dict[str, Any], num_workers: Optional[int] = None) -> int:
+    """Feature cache budget in bytes, from the config and available memory.
+
+    The budget is shared by the num_workers processes of a pool, each one
+    having its own cache. It defaults to the size of the pool of the
+    current process, if any.
+    """
+    memory_mb = config["feature_cache_memory"]
+    if memory_mb <= 0:
+        available_mb = context.memory_available()
+        if available_mb is None:
+            memory_mb = DEFAULT_CACHE_MEMORY_MB
+        else:
+            memory_mb = available_mb * config["feature_cache_memory_fraction"]
+    if num_workers is None:
+        num_workers = context.num_process_workers()
+    return int(memory_mb * 1024 * 1024 / max(1, num_workers))
+
 
 class FeatureLoader(object):
+    def __init__(self) -> None:
+        self._cache: Optional[FeatureCache] = None
+        self._cache_lock = threading.Lock()
+
     def clear_cache(self) -> None:
-        self.load_mask.cache_clear()
-        self.load_points_colors_segmentations_instances.cache_clear()
-        self._load_all_data_unmasked.cache_clear()
-        self._load_all_data_masked.cache_clear()
-        self.load_features_index.cache_clear()
-        self.load_words.cache_clear()
-
-    @lru_cache(1000)
+        with self._cache_lock:
+            self._cache = None
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit, miss and eviction counters of the feature cache."""
+        with self._cache_lock:
+            cache = self._cache
+        return cache.stats() if cache else FeatureCache(0).stats()
+
+    def _get_cache(self, data: DataSetBase) -> FeatureCache:
+        """Shared cache, sized from the config of the first dataset using it."""
+        with self._cache_lock:
+            if self._cache is None:
+                budget = cache_budget(data.config)
+                logger.debug(
+                    "Feature cache budget: {:.0f} MB".format(budget / 1024 / 1024)
+                )
+                self._cache = FeatureCache(budget)
+            return self._cache
+
+    def _cached(
+        self,
+        data: DataSetBase,
+        key: Tuple[Hashable, ...],
+        compute: Callable[[], Any],
+        nbytes: Callable[[Any], int] = estimate_nbytes,
+    ) -> Any:
+        return self._get_cache(data).get_or_compute((data,) + key, compute, nbytes)
+
     def load_mask(self, data: DataSetBase, image: str) -> Optional[np.ndarray]:
+        return self._cached(
+            data, ("mask", image), lambda: self._load_mask_nocache(data, image)
+        )
+
+    def _load_mask_nocache(
+        self, data: DataSetBase, image: str
+    ) -> Optional[np.ndarray]:
         all_features_data = self._load_all_data_unmasked(data, image)
         if not all_features_data:
             return None
@@ -66,9 +211,19 @@ class FeatureLoader(object):
                 data, image, all_features_data.points[:, :2]
             )
 
-    @lru_cache(1000)
     def load_points_colors_segmentations_instances(
         self, data: DataSetBase, image: str
+    ) -> Optional[ft.FeaturesData]:
+        return self._cached(
+            data,
+            ("points_colors", image),
+            lambda: self._load_points_colors_segmentations_instances_nocache(
+                data, image
+            ),
+        )
+
+    def _load_points_colors_segmentations_instances_nocache(
+        self, data: DataSetBase, image: str
     ) -> Optional[ft.FeaturesData]:
         all_features_data = self._load_features_nocache(data, image)
         if not all_features_data:
@@ -80,13 +235,25 @@ class FeatureLoader(object):
             all_features_data.semantic,
         )
 
-    @lru_cache(2000)
     def load_bearings(
         self,
         data: DataSetBase,
         image: str,
         masked: bool,
         camera: pygeometry.Camera,
+    ) -> Optional[np.ndarray]:
+        return self._cached(
+            data,
+            ("bearings", image, masked, camera),
+            lambda: self._load_bearings_nocache(data, image, masked, camera),
+        )
+
+    def _load_bearings_nocache(
+        self,
+        data: DataSetBase,
+        image: str,
+        masked: bool,
+        camera: pygeometry.Camera,
     ) -> Optional[np.ndarray]:
         if masked:
             features_data = self._load_all_data_masked(data, image)
@@ -147,15 +314,24 @@ class FeatureLoader(object):
             features.semantic,
         )
 
-    @lru_cache(20)
     def _load_all_data_unmasked(
         self, data: DataSetBase, image: str
     ) -> Optional[ft.FeaturesData]:
-        return self._load_features_nocache(data, image)
+        return self._cached(
+            data, ("unmasked", image), lambda: self._load_features_nocache(data, image)
+        )
 
-    @lru_cache(200)
     def _load_all_data_masked(
         self, data: DataSetBase, image: str
+    ) -> Optional[ft.FeaturesData]:
+        return self._cached(
+            data,
+            ("masked", image),
+            lambda: self._load_all_data_masked_nocache(data, image),
+        )
+
+    def _load_all_data_masked_nocache(
+        self, data: DataSetBase, image: str
     ) -> Optional[ft.FeaturesData]:
         features_data = self._load_all_data_unmasked(data, image)
         if not features_data:
@@ -165,13 +341,30 @@ class FeatureLoader(object):
             return features_data.mask(mask)
         return features_data
 
-    @lru_cache(200)
     def load_features_index(
         self,
         data: DataSetBase,
         image: str,
         masked: bool,
         segmentation_in_descriptor: bool,
+    ) -> Optional[Tuple[ft.FeaturesData, Any]]:
+        # The FLANN index holds a copy of the descriptors and its trees,
+        # which take about as much memory as the descriptors themselves.
+        return self._cached(
+            data,
+            ("features_index", image, masked, segmentation_in_descriptor),
+            lambda: self._load_features_index_nocache(
+                data, image, masked, segmentation_in_descriptor
+            ),
+            lambda value: 2 * estimate_nbytes(value[0].descriptors) if value else 0,
+        )
+
+    def _load_features_index_nocache(
+        self,
+        data: DataSetBase,
+        image: str,
+        masked: bool,
+        segmentation_in_descriptor: bool,
     ) -> Optional[Tuple[ft.FeaturesData, Any]]:
         features_data = self.load_all_data(
             data, image, masked, segmentation_in_descriptor
@@ -181,13 +374,57 @@ class FeatureLoader(object):
         descriptors = features_data.descriptors
         if descriptors is None:
             return None
+        if data.config["flann_persist_index"]:
+            index = self._load_persisted_index(data, image, descriptors)
+            if index is not None:
+                return features_data, index
         return features_data, ft.build_flann_index(
             descriptors,
             data.config,
         )
 
-    @lru_cache(200)
+    def _load_persisted_index(
+        self, data: DataSetBase, image: str, descriptors: np.ndarray
+    ) -> Optional[Any]:
+        metadata = data.load_feature_index_metadata(image)
+        if metadata is None:
+            return None
+        if metadata != ft.flann_index_metadata(descriptors, data.config):
+            logger.debug("Ignoring stale FLANN index of image {}".format(image))
+            return None
+        return data.load_feature_index(image, descriptors)
+
+    def save_features_index(
+        self, data: DataSetBase, image: str, segmentation_in_descriptor: bool
+    ) -> bool:
+        """Build the FLANN index of the masked features of an image and save it.
+
+        Return False if the features can't be indexed with FLANN.
+        """
+        features_data = self.load_all_data(
+            data, image, True, segmentation_in_descriptor
+        )
+        if not features_data or features_data.descriptors is None:
+            return False
+        descriptors = features_data.descriptors
+        if descriptors.dtype.type is not np.float32:
+            return False
+        index = ft.build_flann_index(descriptors, data.config)
+        data.save_feature_index(
+            image, index, ft.flann_index_metadata(descriptors, data.config)
+        )
+        return True
+
     def load_words(self, data: DataSetBase, image: str, masked: bool) -> np.ndarray:
+        return self._cached(
+            data,
+            ("words", image, masked),
+            lambda: self._load_words_nocache(data, image, masked),
+        )
+
+    def _load_words_nocache(
+        self, data: DataSetBase, image: str, masked: bool
+    ) -> np.ndarray:
         words = data.load_words(image)
         if masked:
             mask = self.load_mask(data, image)
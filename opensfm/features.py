@@ -1,5 +1,6 @@
 """Tools to extract features."""
 
+import hashlib
 import logging
 import time
 from typing import Tuple, Dict, Any, List, Optional
@@ -12,6 +13,9 @@ from opensfm import context, pyfeatures
 logger: logging.Logger = logging.getLogger(__name__)
 
 
+FLANN_INDEX_VERSION = 1
+
+
 class SemanticData:
     segmentation: np.ndarray
     instances: Optional[np.ndarray]
@@ -623,7 +627,7 @@ def extract_features(
     return normalize_features(points, desc, colors, image.shape[1], image.shape[0])
 
 
-def build_flann_index(descriptors: np.ndarray, config: Dict[str, Any]) -> Any:
+def flann_index_params(descriptors: np.ndarray, config: Dict[str, Any]) -> Dict[str, int]:
     # FLANN_INDEX_LINEAR = 0
     FLANN_INDEX_KDTREE = 1
     FLANN_INDEX_KMEANS = 2
@@ -639,7 +643,7 @@ def build_flann_index(descriptors: np.ndarray, config: Dict[str, Any]) -> Any:
             FLANN_INDEX_METHOD = FLANN_INDEX_KDTREE
         else:
             raise ValueError("Unknown flann algorithm type " "must be KMEANS, KDTREE")
-        flann_params = {
+        return {
             "algorithm": FLANN_INDEX_METHOD,
             "branching": config["flann_branching"],
             "iterations": config["flann_iterations"],
@@ -650,4 +654,25 @@ def build_flann_index(descriptors: np.ndarray, config: Dict[str, Any]) -> Any:
             "FLANN isn't supported for binary features because of poor-performance. Use BRUTEFORCE instead."
         )
 
-    return context.flann_Index(descriptors, flann_params)
+
+def build_flann_index(descriptors: np.ndarray, config: Dict[str, Any]) -> Any:
+    return context.flann_Index(descriptors, flann_index_params(descriptors, config))
+
+
+def flann_index_metadata(
+    descriptors: np.ndarray, config: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Identify the descriptors and parameters a FLANN index is built from.
+
+    A persisted index is only valid if its metadata equals the one
+    computed from the descriptors it is loaded with.
+    """
+    descriptors = np.ascontiguousarray(descriptors)
+    return {
+        "version": FLANN_INDEX_VERSION,
+        "features_version": FeaturesData.FEATURES_VERSION,
+        "descriptors_sha1": hashlib.sha1(descriptors.tobytes()).hexdigest(),
+        "descriptors_shape": list(descriptors.shape),
+        "descriptors_dtype": str(descriptors.dtype),
+        "params": flann_index_params(descriptors, config),
+    }
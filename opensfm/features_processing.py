@@ -1,27 +1,45 @@
-import itertools
+import collections
 import logging
 import math
-import queue
 import threading
 from timeit import default_timer as timer
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, Callable
 
+import cv2
 import numpy as np
-from opensfm import bow, features, io, log, pygeometry, upright, masking
-from opensfm.context import parallel_map
+from opensfm import (
+    bow,
+    feature_loader,
+    features,
+    io,
+    log,
+    pygeometry,
+    upright,
+    masking,
+)
 from opensfm.dataset_base import DataSetBase
 
 
 logger: logging.Logger = logging.getLogger(__name__)
 
 
-def run_features_processing(data: DataSetBase, images: List[str], force: bool) -> None:
-    """Main entry point for running features extraction on a list of images."""
-    default_queue_size = 10
-    max_queue_size = 200
+def run_features_processing(
+    data: DataSetBase, images: List[str], force: bool
+) -> Dict[str, Any]:
+    """Main entry point for running features extraction on a list of images.
+
+    Images go through a streaming pipeline of stages (decode, detect,
+    post-process, write), each with its own threads. Queues between stages
+    are bounded in bytes so that decoding can't run ahead of detection
+    further than the memory allows. Return per-stage statistics.
+    """
+    default_queue_mb = 1024
+    max_queue_images = 200
 
     mem_available = log.memory_available()
     processes = data.config["processes"]
+    image_size = average_image_size(data)
+    queue_mb = data.config["feature_queue_memory"]
     if mem_available:
         # Use 90% of available memory
         ratio_use = 0.9
@@ -32,51 +50,64 @@ def run_features_processing(data: DataSetBase, images: List[str], force: bool) -
 
         # 50% for the queue / 50% for parralel processing
         expected_mb = mem_available / 2
-        expected_images = min(
-            max_queue_size, int(expected_mb / average_image_size(data))
-        )
+        if queue_mb <= 0:
+            queue_mb = min(expected_mb, max_queue_images * image_size)
         processing_size = average_processing_size(data)
         logger.info(
             f"Scale-space expected size of a single image : {processing_size} MB"
         )
         processes = min(max(1, int(expected_mb / processing_size)), processes)
-    else:
-        expected_images = default_queue_size
+    elif queue_mb <= 0:
+        queue_mb = default_queue_mb
     logger.info(
-        f"Expecting to queue at most {expected_images} images while parallel processing of {processes} images."
+        f"Expecting to queue at most {queue_mb:.0f} MB of images while parallel processing of {processes} images."
     )
 
-    process_queue = queue.Queue(expected_images)
-    arguments: List[Tuple[str, Any]] = []
-
-    if processes == 1:
-        for image in images:
-            counter = Counter()
-            read_images(process_queue, data, [image], counter, 1, force)
-            run_detection(process_queue)
-            process_queue.get()
-    else:
-        counter = Counter()
-        read_processes = data.config["read_processes"]
-        if 1.5 * read_processes >= processes:
-            read_processes = max(1, processes // 2)
-
-        chunk_size = math.ceil(len(images) / read_processes)
-        chunks_count = math.ceil(len(images) / chunk_size)
-        read_processes = min(read_processes, chunks_count)
-
-        expected: int = len(images)
-        for i in range(read_processes):
-            images_chunk = images[i * chunk_size : (i + 1) * chunk_size]
-            arguments.append(
-                (
-                    "producer",
-                    (process_queue, data, images_chunk, counter, expected, force),
-                )
+    output_queue_mb = data.config["feature_output_queue_memory"]
+    stages = [
+        Stage(
+            "decode",
+            lambda image: decode_image(data, image, force),
+            data.config["read_processes"],
+            queue_mb * 1024 * 1024,
+        ),
+        Stage(
+            "detect",
+            lambda item: detect_stage(data, item),
+            processes,
+            output_queue_mb * 1024 * 1024,
+        ),
+        Stage(
+            "postprocess",
+            lambda item: postprocess_stage(data, item),
+            data.config["feature_postprocess_processes"],
+            output_queue_mb * 1024 * 1024,
+        ),
+        Stage(
+            "words",
+            lambda items: words_stage(data, items),
+            1,
+            output_queue_mb * 1024 * 1024,
+            batch_size=data.config["bow_words_batch_size"],
+        ),
+        Stage(
+            "write",
+            lambda item: write_stage(data, item),
+            data.config["feature_write_processes"],
+            0,
+        ),
+    ]
+    report = run_pipeline(stages, images)
+    for name, stats in report.items():
+        logger.info(
+            "Stage {}: {} items, {:.2f} items/s, queue max {:.0f} MB".format(
+                name,
+                stats["items"],
+                stats["throughput"],
+                stats["max_queue_bytes"] / 1024 / 1024,
             )
-        for _ in range(processes):
-            arguments.append(("consumer", (process_queue)))
-        parallel_map(process, arguments, processes, 1)
+        )
+    return report
 
 
 def average_image_size(data: DataSetBase) -> float:
@@ -118,73 +149,184 @@ def is_high_res_panorama(
     return w == 2 * h or exif_pano
 
 
-class Counter(object):
-    """Lock-less counter from https://julien.danjou.info/atomic-lock-free-counters-in-python/
-    that relies on the CPython impl. of itertools.count() that is thread-safe. Used, as for
-    some reason, joblib doesn't like a good old threading.Lock (everything is stuck)
-    """
-
-    def __init__(self) ->None:
-        self.number_of_read = 0
-        self.counter = itertools.count()
-        self.read_lock = threading.Lock()
-
-    def increment(self) -> None:
-        next(self.counter)
-
-    def value(self) -> int:
-        with self.read_lock:
-            value = next(self.counter) - self.number_of_read
-            self.number_of_read += 1
-        return value
+class BytesQueue(object):
+    """FIFO queue blocking producers while it holds more than max_bytes.
 
+    An item is always accepted by an empty queue, so that items bigger than
+    the limit can't block the pipeline. A max_bytes of 0 means no limit.
+    Occupancy is sampled at each put, for reporting.
+    """
 
-def process(args: Tuple[str, Any]) -> None:
-    process_type, real_args = args
-    if process_type == "producer":
-        queue, data, images, counter, expected, force = real_args
-        read_images(queue, data, images, counter, expected, force)
-    if process_type == "consumer":
-        queue = real_args
-        run_detection(queue)
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._items = collections.deque()
+        self._bytes = 0
+        self._condition = threading.Condition()
+        self.max_observed_bytes = 0
+        self.max_observed_items = 0
+        self._sampled_items = 0
+        self._samples = 0
+
+    def put(self, item: Any, nbytes: int) -> None:
+        with self._condition:
+            while (
+                self.max_bytes > 0
+                and self._items
+                and self._bytes + nbytes > self.max_bytes
+            ):
+                self._condition.wait()
+            self._items.append((item, nbytes))
+            self._bytes += nbytes
+            self.max_observed_bytes = max(self.max_observed_bytes, self._bytes)
+            self.max_observed_items = max(self.max_observed_items, len(self._items))
+            self._sampled_items += len(self._items)
+            self._samples += 1
+            self._condition.notify_all()
+
+    def get(self) -> Any:
+        return self.get_batch(1)[0]
+
+    def get_batch(self, max_items: int, end: Any = None) -> List[Any]:
+        """Wait for an item, and return it with up to max_items queued ones.
+
+        The end item is only returned alone.
+        """
+        with self._condition:
+            while not self._items:
+                self._condition.wait()
+            items = []
+            while self._items and len(items) < max_items:
+                if items and self._items[0][0] is end:
+                    break
+                item, nbytes = self._items.popleft()
+                self._bytes -= nbytes
+                items.append(item)
+                if item is end:
+                    break
+            self._condition.notify_all()
+            return items
+
+    def mean_items(self) -> float:
+        return self._sampled_items / self._samples if self._samples else 0.0
+
+
+class Stage(object):
+    """A pipeline stage: func is run by worker threads on each input item.
+
+    func returns the item passed to the next stage with its size in bytes,
+    or None to drop the item. Items passed to the next stage are queued in
+    a BytesQueue of max_output_bytes.
+
+    If batch_size is more than 1, func is called with a list of up to
+    batch_size items already queued, and returns a list of results.
+    """
 
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Any], Any],
+        workers: int,
+        max_output_bytes: int,
+        batch_size: int = 1,
+    ) -> None:
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.max_output_bytes = max_output_bytes
+        self.batch_size = max(1, batch_size)
+        self.items = 0
+        self.busy_time = 0.0
+        self.wall_time = 0.0
+        self.lock = threading.Lock()
+
+
+_END_OF_STREAM = object()
+
+
+def run_pipeline(stages: List[Stage], items: List[Any]) -> Dict[str, Any]:
+    """Stream items through the stages and return per-stage statistics.
+
+    The first exception raised by a stage is re-raised once all threads
+    have finished, remaining items being drained without being processed.
+    """
+    queues = [BytesQueue(0)] + [BytesQueue(s.max_output_bytes) for s in stages[:-1]]
+    queues.append(None)
+    errors = []
+    start = timer()
 
-def read_images(
-    queue: queue.Queue,
-    data: DataSetBase,
-    images: List[str],
-    counter: Counter,
-    expected: int,
-    force: bool,
-) -> None:
-    full_queue_timeout = 120
-    for image in images:
-        logger.info(f"Reading data for image {image} (queue-size={queue.qsize()}")
-        image_array = data.load_image(image)
-        if data.config["features_bake_segmentation"]:
-            segmentation_array = data.load_segmentation(image)
-            instances_array = data.load_instances(image)
-        else:
-            segmentation_array, instances_array = None, None
-        args = image, image_array, segmentation_array, instances_array, data, force
-        queue.put(args, block=True, timeout=full_queue_timeout)
-        counter.increment()
-        if counter.value() == expected:
-            logger.info("Finished reading images")
-            queue.put(None)
-
-
-def run_detection(queue: queue.Queue):
-    while True:
-        args = queue.get()
-        if args is None:
-            queue.put(None)
-            break
-        image, image_array, segmentation_array, instances_array, data, force = args
-        detect(image, image_array, segmentation_array, instances_array, data, force)
-        del image_array
-        del segmentation_array
-        del instances_array
+    # De-activate/Restore any inner OpenCV threading
+    threads_used = cv2.getNumThreads()
+    cv2.setNumThreads(0)
+
+    def work(index: int, remaining: List[int]) -> None:
+        stage = stages[index]
+        input_queue, output_queue = queues[index], queues[index + 1]
+        log.setup()
+        while True:
+            batch = input_queue.get_batch(stage.batch_size, _END_OF_STREAM)
+            if batch[0] is _END_OF_STREAM:
+                input_queue.put(_END_OF_STREAM, 0)
+                break
+            if errors:
+                continue
+            t = timer()
+            try:
+                if stage.batch_size > 1:
+                    results = stage.func(batch)
+                else:
+                    results = [stage.func(batch[0])]
+            except Exception as e:
+                logger.exception("Stage {} failed".format(stage.name))
+                errors.append(e)
+                continue
+            with stage.lock:
+                stage.items += len(batch)
+                stage.busy_time += timer() - t
+            if output_queue is None:
+                continue
+            for result in results:
+                if result is not None:
+                    output_queue.put(*result)
+
+        with stage.lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+            if last:
+                stage.wall_time = timer() - start
+        if last and output_queue is not None:
+            output_queue.put(_END_OF_STREAM, 0)
+
+    threads = []
+    for index, stage in enumerate(stages):
+        remaining = [stage.workers]
+        for _ in range(stage.workers):
+            thread = threading.Thread(target=work, args=(index, remaining))
+            thread.start()
+            threads.append(thread)
+
+    for item in items:
+        queues[0].put(item, 0)
+    queues[0].put(_END_OF_STREAM, 0)
+    for thread in threads:
+        thread.join()
+    cv2.setNumThreads(threads_used)
+
+    if errors:
+        raise errors[0]
+
+    report = {}
+    for stage, input_queue in zip(stages, queues):
+        report[stage.name] = {
+            "workers": stage.workers,
+            "items": stage.items,
+            "busy_time": stage.busy_time,
+            "wall_time": stage.wall_time,
+            "throughput": stage.items / stage.wall_time if stage.wall_time else 0.0,
+            "max_queue_bytes": input_queue.max_observed_bytes,
+            "max_queue_items": input_queue.max_observed_items,
+            "mean_queue_items": input_queue.mean_items(),
+        }
+    return report
 
 
 def bake_segmentation(
@@ -222,41 +364,175 @@ def bake_segmentation(
     return tuple(panoptic_data)
 
 
-def detect(
-    image: str,
-    image_array: np.ndarray,
-    segmentation_array: Optional[np.ndarray],
-    instances_array: Optional[np.ndarray],
-    data: DataSetBase,
-    force: bool = False,
-) -> None:
-    log.setup()
+def save_features_index(data: DataSetBase, image: str) -> None:
+    """Build and save the FLANN index used to match the image features."""
+    saved = feature_loader.instance.save_features_index(
+        data, image, data.config["matching_use_segmentation"]
+    )
+    if not saved:
+        logger.warning("Could not build a FLANN index for image {}".format(image))
+
 
-    need_words = (
+def needs_words(data: DataSetBase) -> bool:
+    return (
         data.config["matcher_type"] == "WORDS"
         or data.config["matching_bow_neighbors"] > 0
     )
-    has_words = not need_words or data.words_exist(image)
+
+
+def needs_index(data: DataSetBase) -> bool:
+    return data.config["flann_persist_index"] and data.config["matcher_type"] == "FLANN"
+
+
+def needs_detection(data: DataSetBase, image: str, force: bool) -> bool:
+    """Whether features of the image must be computed.
+
+    Images with up-to-date features only get their missing FLANN index.
+    """
+    has_words = not needs_words(data) or data.words_exist(image)
     has_features = data.features_exist(image)
+    if force or not has_features or not has_words:
+        return True
 
-    if not force and has_features and has_words:
-        logger.info(
-            "Skip recomputing {} features for image {}".format(
-                data.feature_type().upper(), image
-            )
+    logger.info(
+        "Skip recomputing {} features for image {}".format(
+            data.feature_type().upper(), image
         )
-        return
+    )
+    if needs_index(data) and not data.feature_index_exists(image):
+        save_features_index(data, image)
+    return False
+
+
+class ImageItem(object):
+    """Data of an image flowing through the feature extraction stages."""
+
+    def __init__(
+        self,
+        image: str,
+        image_array: Optional[np.ndarray],
+        segmentation_array: Optional[np.ndarray],
+        instances_array: Optional[np.ndarray],
+    ) -> None:
+        self.image = image
+        self.image_array = image_array
+        self.segmentation_array = segmentation_array
+        self.instances_array = instances_array
+        self.raw_features: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self.features_data: Optional[features.FeaturesData] = None
+        self.words: Optional[np.ndarray] = None
+        self.processing_time = 0.0
+
+    def nbytes(self) -> int:
+        arrays = [self.image_array, self.segmentation_array, self.instances_array]
+        if self.raw_features is not None:
+            arrays.extend(self.raw_features)
+        if self.features_data is not None:
+            arrays.extend(
+                [
+                    self.features_data.points,
+                    self.features_data.descriptors,
+                    self.features_data.colors,
+                ]
+            )
+        arrays.append(self.words)
+        return sum(a.nbytes for a in arrays if a is not None)
+
+
+def decode_image(
+    data: DataSetBase, image: str, force: bool
+) -> Optional[Tuple[ImageItem, int]]:
+    """Decode stage : load image, segmentation and instances."""
+    if not needs_detection(data, image, force):
+        return None
+    logger.info(f"Reading data for image {image}")
+    image_array = data.load_image(image)
+    if data.config["features_bake_segmentation"]:
+        segmentation_array = data.load_segmentation(image)
+        instances_array = data.load_instances(image)
+    else:
+        segmentation_array, instances_array = None, None
+    item = ImageItem(image, image_array, segmentation_array, instances_array)
+    return item, item.nbytes()
 
+
+def detect_stage(data: DataSetBase, item: ImageItem) -> Tuple[ImageItem, int]:
+    """Detect stage : extract features from the decoded image."""
     logger.info(
-        "Extracting {} features for image {}".format(data.feature_type().upper(), image)
+        "Extracting {} features for image {}".format(
+            data.feature_type().upper(), item.image
+        )
     )
-
     start = timer()
+    item.raw_features = features.extract_features(
+        item.image_array,
+        data.config,
+        is_high_res_panorama(data, item.image, item.image_array),
+    )
+    if not data.config["features_bake_segmentation"]:
+        # Pixels are only needed to bake segmentation
+        item.image_array = None
+    item.processing_time += timer() - start
+    return item, item.nbytes()
 
-    p_unmasked, f_unmasked, c_unmasked = features.extract_features(
-        image_array, data.config, is_high_res_panorama(data, image, image_array)
+
+def postprocess_stage(data: DataSetBase, item: ImageItem) -> Tuple[ImageItem, int]:
+    """Post-process stage : mask or bake segmentation, sort and map to words."""
+    start = timer()
+    p_unmasked, f_unmasked, c_unmasked = item.raw_features
+    item.features_data = postprocess_features(
+        data,
+        item.image,
+        item.image_array,
+        item.segmentation_array,
+        item.instances_array,
+        p_unmasked,
+        f_unmasked,
+        c_unmasked,
     )
+    item.image_array = None
+    item.segmentation_array = None
+    item.instances_array = None
+    item.raw_features = None
+    item.processing_time += timer() - start
+    return item, item.nbytes()
+
+
+def words_stage(
+    data: DataSetBase, items: List[ImageItem]
+) -> List[Tuple[ImageItem, int]]:
+    """Words stage : map features of a batch of images to BoW words."""
+    if needs_words(data):
+        start = timer()
+        all_words = map_to_words_batch(
+            data, [item.features_data.descriptors for item in items]
+        )
+        # Batch mapping time is shared evenly between images
+        elapsed = (timer() - start) / len(items)
+        for item, words in zip(items, all_words):
+            item.words = words
+            item.processing_time += elapsed
+    return [(item, item.nbytes()) for item in items]
+
 
+def write_stage(data: DataSetBase, item: ImageItem) -> None:
+    """Write stage : save features, words, FLANN index and report."""
+    start = timer()
+    write_features(data, item.image, item.features_data, item.words)
+    item.processing_time += timer() - start
+    write_image_report(data, item.image, item.features_data, item.processing_time)
+
+
+def postprocess_features(
+    data: DataSetBase,
+    image: str,
+    image_array: np.ndarray,
+    segmentation_array: Optional[np.ndarray],
+    instances_array: Optional[np.ndarray],
+    p_unmasked: np.ndarray,
+    f_unmasked: np.ndarray,
+    c_unmasked: np.ndarray,
+) -> features.FeaturesData:
     # Load segmentation and bake it in the data
     if data.config["features_bake_segmentation"]:
         exif = data.load_exif(image)
@@ -290,21 +566,41 @@ def detect(
         )
     else:
         semantic_data = None
-    features_data = features.FeaturesData(p_sorted, f_sorted, c_sorted, semantic_data)
+    return features.FeaturesData(p_sorted, f_sorted, c_sorted, semantic_data)
+
+
+def map_to_words_batch(
+    data: DataSetBase, descriptors_list: List[np.ndarray]
+) -> List[np.ndarray]:
+    bows = bow.load_bows(data.config)
+    n_closest = data.config["bow_words_to_match"]
+    return bows.map_to_words_batch(
+        descriptors_list, n_closest, data.config["bow_matcher_type"]
+    )
+
+
+def write_features(
+    data: DataSetBase,
+    image: str,
+    features_data: features.FeaturesData,
+    words: Optional[np.ndarray],
+) -> None:
     data.save_features(image, features_data)
+    if words is not None:
+        data.save_words(image, words)
+    if needs_index(data):
+        save_features_index(data, image)
 
-    if need_words:
-        bows = bow.load_bows(data.config)
-        n_closest = data.config["bow_words_to_match"]
-        closest_words = bows.map_to_words(
-            f_sorted, n_closest, data.config["bow_matcher_type"]
-        )
-        data.save_words(image, closest_words)
 
-    end = timer()
+def write_image_report(
+    data: DataSetBase,
+    image: str,
+    features_data: features.FeaturesData,
+    wall_time: float,
+) -> None:
     report = {
         "image": image,
-        "num_features": len(p_sorted),
-        "wall_time": end - start,
+        "num_features": len(features_data.points),
+        "wall_time": wall_time,
     }
     data.save_report(io.json_dumps(report), "features/{}.json".format(image))
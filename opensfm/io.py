@@ -1105,29 +1105,234 @@ def reconstruction_to_ply(
     return points_to_ply_string(vertices, point_num_views)
 
 
-def point_cloud_from_ply(
-    fp: TextIO,
-) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
-    """Load point cloud from a PLY file."""
-    all_lines = fp.read().splitlines()
-    start = all_lines.index("end_header") + 1
-    lines = all_lines[start:]
-    n = len(lines)
+# PLY property types and their little-endian NumPy equivalents
+PLY_TYPES: Dict[str, str] = {
+    "char": "i1",
+    "uchar": "u1",
+    "short": "<i2",
+    "ushort": "<u2",
+    "int": "<i4",
+    "uint": "<u4",
+    "float": "<f4",
+    "double": "<f8",
+    "int8": "i1",
+    "uint8": "u1",
+    "int16": "<i2",
+    "uint16": "<u2",
+    "int32": "<i4",
+    "uint32": "<u4",
+    "float32": "<f4",
+    "float64": "<f8",
+}
+
+# Vertex properties of dense point clouds
+POINT_CLOUD_PROPERTIES: List[Tuple[str, str]] = [
+    ("x", "float"),
+    ("y", "float"),
+    ("z", "float"),
+    ("nx", "float"),
+    ("ny", "float"),
+    ("nz", "float"),
+    ("diffuse_red", "uchar"),
+    ("diffuse_green", "uchar"),
+    ("diffuse_blue", "uchar"),
+    ("class", "uchar"),
+]
+POINT_CLOUD_ASCII_FORMAT = ["%.4f"] * 3 + ["%.3f"] * 3 + ["%d"] * 4
+
+# Number of points read at once when loading a point cloud
+POINT_CLOUD_CHUNK_SIZE = 1000000
+
+
+def point_cloud_ply_properties(double_precision: bool) -> List[Tuple[str, str]]:
+    """Vertex properties of point clouds, with double or float coordinates."""
+    if not double_precision:
+        return POINT_CLOUD_PROPERTIES
+    return [
+        (name, "double" if name in ("x", "y", "z") else ply_type)
+        for name, ply_type in POINT_CLOUD_PROPERTIES
+    ]
+
+
+def point_cloud_ply_header(
+    count_vertices: int, binary: bool, double_precision: bool = False
+) -> str:
+    header = [
+        "ply",
+        "format {} 1.0".format("binary_little_endian" if binary else "ascii"),
+        "element vertex {}".format(count_vertices),
+    ]
+    header += [
+        "property {} {}".format(ply_type, name)
+        for name, ply_type in point_cloud_ply_properties(double_precision)
+    ]
+    header += ["end_header", ""]
+    return "\n".join(header)
+
+
+class PointCloudPlyWriter(object):
+    """Write a point cloud to a PLY file, a chunk of points at a time.
+
+    The number of points is written in the header, so it must be known
+    beforehand. The file must be opened in binary mode. Coordinates are
+    stored as doubles if double_precision is True (e.g. for geographic
+    coordinates), as floats otherwise.
+    """
+
+    def __init__(
+        self,
+        fp: IO[bytes],
+        count: int,
+        binary: bool = False,
+        double_precision: bool = False,
+    ) -> None:
+        self.fp = fp
+        self.count = count
+        self.binary = binary
+        self.written = 0
+        self.dtype = np.dtype(
+            [
+                (name, PLY_TYPES[ply_type])
+                for name, ply_type in point_cloud_ply_properties(double_precision)
+            ]
+        )
+        fp.write(point_cloud_ply_header(count, binary, double_precision).encode())
+
+    def write(
+        self,
+        points: np.ndarray,
+        normals: np.ndarray,
+        colors: np.ndarray,
+        labels: np.ndarray,
+    ) -> None:
+        n = len(points)
+        if self.written + n > self.count:
+            raise ValueError(
+                "Writing more than the {} points of the PLY header".format(self.count)
+            )
+        self.written += n
+        if n == 0:
+            return
+
+        if self.binary:
+            vertices = np.empty(n, dtype=self.dtype)
+            for i, name in enumerate(("x", "y", "z")):
+                vertices[name] = points[:, i]
+            for i, name in enumerate(("nx", "ny", "nz")):
+                vertices[name] = normals[:, i]
+            for i, name in enumerate(("diffuse_red", "diffuse_green", "diffuse_blue")):
+                vertices[name] = colors[:, i]
+            vertices["class"] = labels
+            self.fp.write(vertices.tobytes())
+        else:
+            table = np.column_stack(
+                (
+                    np.asarray(points, dtype=np.float64),
+                    np.asarray(normals, dtype=np.float64),
+                    np.asarray(colors, dtype=np.int64),
+                    np.asarray(labels, dtype=np.int64),
+                )
+            )
+            np.savetxt(self.fp, table, fmt=POINT_CLOUD_ASCII_FORMAT)
 
-    points = np.zeros((n, 3), dtype=np.float32)
-    normals = np.zeros((n, 3), dtype=np.float32)
-    colors = np.zeros((n, 3), dtype=np.uint8)
-    labels = np.zeros((n,), dtype=np.uint8)
+    def close(self) -> None:
+        if self.written != self.count:
+            raise IOError(
+                "Wrote {} points instead of the {} of the PLY header".format(
+                    self.written, self.count
+                )
+            )
 
-    for i, row in enumerate(lines):
-        words = row.split()
-        label = int(words[9])
-        points[i] = list(map(float, words[0:3]))
-        normals[i] = list(map(float, words[3:6]))
-        colors[i] = list(map(int, words[6:9]))
-        labels[i] = label
 
-    return points, normals, colors, labels
+class PointCloudPlyReader(object):
+    """Read a point cloud from an ASCII or binary little-endian PLY file.
+
+    The file must be opened in binary mode. Points are read by chunks, so
+    that a cloud can be processed without holding it in memory. Points
+    have the precision of the file coordinates.
+    """
+
+    def __init__(self, fp: IO[bytes]) -> None:
+        self.fp = fp
+        self.count = 0
+        self.binary = False
+        properties = []
+        in_vertex = False
+        while True:
+            line = fp.readline()
+            if not line:
+                raise IOError("Missing end_header in PLY file")
+            words = line.decode().split()
+            if not words:
+                continue
+            if words[0] == "end_header":
+                break
+            if words[0] == "format":
+                if words[1] == "binary_little_endian":
+                    self.binary = True
+                elif words[1] != "ascii":
+                    raise IOError("Unsupported PLY format {}".format(words[1]))
+            elif words[0] == "element":
+                in_vertex = words[1] == "vertex"
+                if in_vertex:
+                    self.count = int(words[2])
+            elif words[0] == "property" and in_vertex:
+                properties.append((words[2], PLY_TYPES[words[1]]))
+        self.dtype = np.dtype(properties)
+
+    def chunks(
+        self, chunk_size: int = POINT_CLOUD_CHUNK_SIZE
+    ) -> Iterable[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """Yield the points, normals, colors and labels of chunks of points."""
+        remaining = self.count
+        while remaining > 0:
+            n = min(chunk_size, remaining)
+            if self.binary:
+                buffer = self.fp.read(n * self.dtype.itemsize)
+                vertices = np.frombuffer(buffer, dtype=self.dtype)
+            else:
+                lines = [self.fp.readline().decode() for _ in range(n)]
+                table = np.loadtxt(lines, ndmin=2)
+                vertices = np.empty(len(table), dtype=self.dtype)
+                for i, name in enumerate(self.dtype.names):
+                    vertices[name] = table[:, i]
+            if len(vertices) < n:
+                raise IOError("PLY file has less points than its header")
+            remaining -= n
+            yield self._vertex_arrays(vertices)
+
+    def _vertex_arrays(
+        self, vertices: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        names = vertices.dtype.names
+
+        def stack(columns: List[str], dtype: Any) -> np.ndarray:
+            out = np.zeros((len(vertices), len(columns)), dtype=dtype)
+            for i, name in enumerate(columns):
+                if name in names:
+                    out[:, i] = vertices[name]
+            return out
+
+        points = stack(["x", "y", "z"], vertices.dtype["x"])
+        normals = stack(["nx", "ny", "nz"], np.float32)
+        colors = stack(["diffuse_red", "diffuse_green", "diffuse_blue"], np.uint8)
+        labels = stack(["class"], np.uint8)[:, 0]
+        return points, normals, colors, labels
+
+
+def point_cloud_from_ply(
+    fp: IO[bytes],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Load point cloud from an ASCII or binary PLY file opened in binary mode."""
+    chunks = list(PointCloudPlyReader(fp).chunks())
+    if len(chunks) == 0:
+        return (
+            np.zeros((0, 3), dtype=np.float32),
+            np.zeros((0, 3), dtype=np.float32),
+            np.zeros((0, 3), dtype=np.uint8),
+            np.zeros((0,), dtype=np.uint8),
+        )
+    return tuple(np.concatenate(arrays) for arrays in zip(*chunks))
 
 
 def point_cloud_to_ply(
@@ -1135,40 +1340,13 @@ def point_cloud_to_ply(
     normals: np.ndarray,
     colors: np.ndarray,
     labels: np.ndarray,
-    fp: TextIO,
+    fp: IO[bytes],
+    binary: bool = False,
 ) -> None:
-    fp.write("ply\n")
-    fp.write("format ascii 1.0\n")
-    fp.write("element vertex {}\n".format(len(points)))
-    fp.write("property float x\n")
-    fp.write("property float y\n")
-    fp.write("property float z\n")
-    fp.write("property float nx\n")
-    fp.write("property float ny\n")
-    fp.write("property float nz\n")
-    fp.write("property uchar diffuse_red\n")
-    fp.write("property uchar diffuse_green\n")
-    fp.write("property uchar diffuse_blue\n")
-    fp.write("property uchar class\n")
-    fp.write("end_header\n")
-
-    template = "{:.4f} {:.4f} {:.4f} {:.3f} {:.3f} {:.3f} {} {} {} {}\n"
-    for i in range(len(points)):
-        p, n, c, l = points[i], normals[i], colors[i], labels[i]
-        fp.write(
-            template.format(
-                p[0],
-                p[1],
-                p[2],
-                n[0],
-                n[1],
-                n[2],
-                int(c[0]),
-                int(c[1]),
-                int(c[2]),
-                int(l),
-            )
-        )
+    """Save point cloud to a PLY file opened in binary mode."""
+    writer = PointCloudPlyWriter(fp, len(points), binary)
+    writer.write(points, normals, colors, labels)
+    writer.close()
 
 
 # Filesystem interaction methods
@@ -1345,6 +1523,26 @@ class IoFilesystemBase(ABC):
     def timestamp(cls, path: str):
         pass
 
+    @classmethod
+    def memmap(cls, path: str, dtype: Any) -> np.ndarray:
+        """Read-only array over a raw binary file.
+
+        The default implementation reads the whole file. Local filesystems
+        overload it to memory-map the file instead.
+        """
+        with cls.open(path, "rb") as fb:
+            return np.frombuffer(fb.read(), dtype=dtype)
+
+    @classmethod
+    def load_npy(cls, path: str) -> np.ndarray:
+        """Read-only array saved with np.save.
+
+        The default implementation reads the whole file. Local filesystems
+        overload it to memory-map the file instead.
+        """
+        with cls.open(path, "rb") as fb:
+            return np.load(fb)
+
 
 class IoFilesystemDefault(IoFilesystemBase):
     def __init__(self) -> None:
@@ -1424,3 +1622,13 @@ class IoFilesystemDefault(IoFilesystemBase):
     def timestamp(cls, path: str) -> str:
         # pyre-fixme[7]: Expected `str` but got `float`.
         return os.path.getmtime(path)
+
+    @classmethod
+    def memmap(cls, path: str, dtype: Any) -> np.ndarray:
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r")
+
+    @classmethod
+    def load_npy(cls, path: str) -> np.ndarray:
+        return np.load(path, mmap_mode="r")
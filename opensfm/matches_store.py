@@ -0,0 +1,134 @@
+"""Binary storage of pairwise feature matches.
+
+Matches of all images are stored in two files:
+ - a payload file holding the matches of every pair as consecutive rows of
+   two little-endian int32 feature indices,
+ - a text index file with one line per stored pair: ``im1 im2 offset count``
+   (tab-separated), where offset is in int32 units in the payload.
+
+An index line holding only ``im1`` marks the start of a new set of matches
+for im1 and discards the previously stored ones. Both files are append-only,
+so storing the matches of an image never rewrites existing data. The payload
+is memory-mapped, so that reading the matches of a pair is a slice of the
+mapped array and doesn't need to decode anything else.
+"""
+
+import logging
+import os
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from opensfm import io
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+PAYLOAD_DTYPE = np.dtype("<i4")
+INDEX_SEPARATOR = "\t"
+
+TPairIndex = Dict[str, Dict[str, Tuple[int, int]]]
+
+
+class BinaryMatchesStore(object):
+    """Append-only, memory-mapped store of pairwise matches."""
+
+    def __init__(self, io_handler: io.IoFilesystemBase, path: str) -> None:
+        self.io_handler = io_handler
+        self.path = path
+        self._index: Optional[TPairIndex] = None
+        self._payload: Optional[np.ndarray] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Memory-mapped payload and index are re-loaded lazily after
+        # unpickling, so sending the store to other processes is cheap.
+        state = self.__dict__.copy()
+        state["_index"] = None
+        state["_payload"] = None
+        return state
+
+    def index_file(self) -> str:
+        return os.path.join(self.path, "matches_index.txt")
+
+    def payload_file(self) -> str:
+        return os.path.join(self.path, "matches.bin")
+
+    def exists(self) -> bool:
+        return self.io_handler.isfile(self.index_file())
+
+    def images(self):
+        """Images having stored matches."""
+        return self._load_index().keys()
+
+    def has_image(self, image: str) -> bool:
+        return image in self._load_index()
+
+    def load_image_matches(self, image: str) -> Dict[str, np.ndarray]:
+        """Matches of an image with all its matched images.
+
+        Raise IOError if no matches are stored for the image.
+        """
+        index = self._load_index()
+        if image not in index:
+            raise IOError("No matches stored for image {}".format(image))
+        return {
+            other: self._read(offset, count)
+            for other, (offset, count) in index[image].items()
+        }
+
+    def load_pair_matches(self, im1: str, im2: str) -> Optional[np.ndarray]:
+        """Matches stored in im1 for the pair (im1, im2), or None."""
+        entry = self._load_index().get(im1, {}).get(im2)
+        if entry is None:
+            return None
+        return self._read(*entry)
+
+    def save_image_matches(self, image: str, matches: Dict[str, np.ndarray]) -> None:
+        """Append the matches of an image, replacing previously stored ones."""
+        index = self._load_index()
+        self.io_handler.mkdir_p(self.path)
+
+        entries = {}
+        with self.io_handler.open(self.payload_file(), "ab") as fb:
+            offset = fb.tell() // PAYLOAD_DTYPE.itemsize
+            for other, pair_matches in matches.items():
+                rows = np.ascontiguousarray(pair_matches, dtype=PAYLOAD_DTYPE)
+                rows = rows.reshape(-1, 2)
+                fb.write(rows.tobytes())
+                entries[other] = (offset, len(rows))
+                offset += rows.size
+
+        lines = [image]
+        for other, (offset, count) in entries.items():
+            lines.append(INDEX_SEPARATOR.join((image, other, str(offset), str(count))))
+        with self.io_handler.open(self.index_file(), "a") as fw:
+            fw.write("\n".join(lines) + "\n")
+
+        index[image] = entries
+
+    def _read(self, offset: int, count: int) -> np.ndarray:
+        end = offset + 2 * count
+        if self._payload is None or len(self._payload) < end:
+            self._payload = self.io_handler.memmap(self.payload_file(), PAYLOAD_DTYPE)
+        return self._payload[offset:end].reshape(-1, 2)
+
+    def _load_index(self) -> TPairIndex:
+        if self._index is not None:
+            return self._index
+
+        index = {}
+        if self.exists():
+            with self.io_handler.open_rt(self.index_file()) as fin:
+                for line in fin:
+                    fields = line.rstrip("\n").split(INDEX_SEPARATOR)
+                    if len(fields) == 1:
+                        index[fields[0]] = {}
+                    elif len(fields) == 4:
+                        im1, im2, offset, count = fields
+                        index.setdefault(im1, {})[im2] = (int(offset), int(count))
+                    else:
+                        logger.warning(
+                            "Ignoring invalid matches index line: {}".format(line)
+                        )
+        self._index = index
+        return index
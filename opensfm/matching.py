@@ -1,4 +1,7 @@
+import heapq
 import logging
+import os
+from collections import defaultdict
 from timeit import default_timer as timer
 from typing import Sized, Optional, Dict, Any, Tuple, List, Generator
 
@@ -52,10 +55,11 @@ def match_images(
     )
 
     # Match them !
-    return (
-        match_images_with_pairs(data, config_override, exifs, pairs),
-        preport,
+    pairs_matches, cache_stats = _match_images_with_pairs(
+        data, config_override, exifs, pairs
     )
+    preport["feature_cache"] = cache_stats
+    return pairs_matches, preport
 
 
 def match_images_with_pairs(
@@ -66,18 +70,64 @@ def match_images_with_pairs(
     poses: Optional[Dict[str, pygeometry.Pose]] = None,
 ) -> Dict[Tuple[str, str], List[Tuple[int, int]]]:
     """Perform pair matchings given pairs."""
+    return _match_images_with_pairs(data, config_override, exifs, pairs, poses)[0]
+
+
+def _match_images_with_pairs(
+    data: DataSetBase,
+    config_override: Dict[str, Any],
+    exifs: Dict[str, Any],
+    pairs: List[Tuple[str, str]],
+    poses: Optional[Dict[str, pygeometry.Pose]] = None,
+) -> Tuple[Dict[Tuple[str, str], List[Tuple[int, int]]], Dict[str, Any]]:
+    """Perform pair matchings given pairs, and report feature cache usage."""
     cameras = data.load_camera_models()
-    args = list(match_arguments(pairs, data, config_override, cameras, exifs, poses))
+    schedule = config_override.get(
+        "matching_schedule_pairs", data.config["matching_schedule_pairs"]
+    )
+    if schedule:
+        pairs = schedule_pairs(pairs)
+
+    matcher_type = config_override.get("matcher_type", data.config["matcher_type"])
+    batch_size = config_override.get(
+        "matching_batch_size", data.config["matching_batch_size"]
+    )
+    batched = batch_size > 0 and matcher_type.upper() == "BRUTEFORCE" and not poses
+    if batched:
+        args = batch_arguments(pairs, batch_size)
+        shared_args = (cameras, exifs, data, config_override)
+        task = _match_batch_unwrap_args_with_cache_counters
+    else:
+        args = list(match_arguments(pairs))
+        shared_args = (cameras, exifs, data, config_override, poses)
+        task = _match_unwrap_args_with_cache_counters
 
     # Perform all pair matchings in parallel
     start = timer()
     logger.info("Matching {} image pairs".format(len(pairs)))
     processes = config_override.get("processes", data.config["processes"])
+    backend = config_override.get("parallel_backend", data.config["parallel_backend"])
     mem_per_process = 512
     jobs_per_process = 2
+    if schedule and backend == "processes" and not batched:
+        # Each worker process has its own feature cache : send it whole
+        # blocks of consecutive scheduled pairs.
+        jobs_per_process = config_override.get(
+            "matching_block_size", data.config["matching_block_size"]
+        )
     processes = context.processes_that_fit_in_memory(processes, mem_per_process)
-    logger.info("Computing pair matching with %d processes" % processes)
-    matches = context.parallel_map(match_unwrap_args, args, processes, jobs_per_process)
+    logger.info(
+        "Computing pair matching with %d processes (%s)" % (processes, backend)
+    )
+    baseline = {os.getpid(): _cache_counters()}
+    results = context.parallel_map(
+        task,
+        args,
+        processes,
+        jobs_per_process,
+        backend=backend,
+        shared_args=shared_args,
+    )
     logger.info(
         "Matched {} pairs {} in {} seconds ({} seconds/pair).".format(
             len(pairs),
@@ -89,9 +139,92 @@ def match_images_with_pairs(
 
     # Index results per pair
     resulting_pairs = {}
-    for im1, im2, m in matches:
-        resulting_pairs[im1, im2] = m
-    return resulting_pairs
+    worker_counters = {}
+    for result in results:
+        if batched:
+            batch_matches, (pid, counters) = result
+        else:
+            im1, im2, m, (pid, counters) = result
+            batch_matches = [(im1, im2, m)]
+        for im1, im2, m in batch_matches:
+            resulting_pairs[im1, im2] = m
+        worker_counters[pid] = max(worker_counters.get(pid, counters), counters)
+    cache_stats = _aggregate_cache_counters(worker_counters, baseline)
+    logger.info(
+        "Feature cache hit rate: {:.1f}%".format(100 * cache_stats["hit_rate"])
+    )
+    return resulting_pairs, cache_stats
+
+
+def schedule_pairs(pairs: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Order pairs so that pairs sharing an image are matched close in time.
+
+    The match graph is traversed greedily : all remaining pairs of an image
+    are emitted together, and the next image is the most connected one
+    among those just visited, so its features are likely still cached.
+    """
+    pairs_of_image = defaultdict(list)
+    for i, (im1, im2) in enumerate(pairs):
+        pairs_of_image[im1].append(i)
+        pairs_of_image[im2].append(i)
+    remaining = {im: len(p) for im, p in pairs_of_image.items()}
+
+    done = [False] * len(pairs)
+    order = []
+    frontier = []
+    by_degree = iter(sorted(remaining, key=lambda im: -remaining[im]))
+    while len(order) < len(pairs):
+        image = None
+        while frontier:
+            count, candidate = heapq.heappop(frontier)
+            if remaining[candidate] == -count:
+                image = candidate
+                break
+            if remaining[candidate] > 0:
+                heapq.heappush(frontier, (-remaining[candidate], candidate))
+        if image is None:
+            image = next(im for im in by_degree if remaining[im] > 0)
+
+        for i in pairs_of_image[image]:
+            if done[i]:
+                continue
+            done[i] = True
+            order.append(pairs[i])
+            im1, im2 = pairs[i]
+            other = im2 if im1 == image else im1
+            remaining[image] -= 1
+            remaining[other] -= 1
+            if remaining[other] > 0:
+                heapq.heappush(frontier, (-remaining[other], other))
+    return order
+
+
+def _cache_counters() -> Tuple[int, int, int]:
+    stats = feature_loader.instance.cache_stats()
+    return stats["hits"], stats["misses"], stats["evictions"]
+
+
+def _aggregate_cache_counters(
+    worker_counters: Dict[int, Tuple[int, int, int]],
+    baseline: Dict[int, Tuple[int, int, int]],
+) -> Dict[str, Any]:
+    """Sum the feature cache counters of all workers since the baseline."""
+    hits, misses, evictions = 0, 0, 0
+    for pid, counters in worker_counters.items():
+        start = baseline.get(pid, (0, 0, 0))
+        if counters < start:
+            # Cache was cleared during matching
+            start = (0, 0, 0)
+        hits += counters[0] - start[0]
+        misses += counters[1] - start[1]
+        evictions += counters[2] - start[2]
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "evictions": evictions,
+        "hit_rate": hits / lookups if lookups else 0.0,
+    }
 
 
 def log_projection_types(
@@ -153,27 +286,15 @@ def save_matches(
 
 def match_arguments(
     pairs: List[Tuple[str, str]],
-    data: DataSetBase,
-    config_override: Dict[str, Any],
-    cameras: Dict[str, pygeometry.Camera],
-    exifs: Dict[str, pygeometry.Camera],
-    poses: Optional[Dict[str, pygeometry.Pose]],
-) -> Generator[
-    Tuple[
-        str,
-        str,
-        Dict[str, pygeometry.Camera],
-        Dict[str, pygeometry.Camera],
-        DataSetBase,
-        Dict[str, Any],
-        Optional[Dict[str, pygeometry.Pose]],
-    ],
-    None,
-    None,
-]:
-    """Generate arguments for parralel processing of pair matching"""
+) -> Generator[Tuple[str, str], None, None]:
+    """Generate arguments for parralel processing of pair matching.
+
+    Cameras, EXIFs, dataset, config and poses are shared by all pairs
+    and passed separately to parallel_map, so they're sent only once
+    to each worker.
+    """
     for im1, im2 in pairs:
-        yield im1, im2, cameras, exifs, data, config_override, poses
+        yield im1, im2
 
 
 def match_unwrap_args(
@@ -211,6 +332,59 @@ def match_unwrap_args(
     return im1, im2, matches
 
 
+def match_batch_unwrap_args(
+    args: Tuple[
+        str,
+        List[str],
+        Dict[str, pygeometry.Camera],
+        Dict[str, Any],
+        DataSetBase,
+        Dict[str, Any],
+    ]
+) -> List[Tuple[str, str, np.ndarray]]:
+    """Wrapper for parallel processing of batched matching of an image."""
+    log.setup()
+    im1, candidates, cameras, exifs, data, config_override = args
+    camera1 = cameras[exifs[im1]["camera"]]
+    candidate_cameras = [cameras[exifs[im2]["camera"]] for im2 in candidates]
+    matches = match_batch(
+        im1, candidates, camera1, candidate_cameras, data, config_override
+    )
+    return [(im1, im2, matches[im2]) for im2 in candidates]
+
+
+def _match_batch_unwrap_args_with_cache_counters(
+    args: Tuple[Any, ...]
+) -> Tuple[List[Tuple[str, str, np.ndarray]], Tuple[int, Tuple[int, int, int]]]:
+    """Match an image batch, and return the feature cache counters of the worker."""
+    return match_batch_unwrap_args(args), (os.getpid(), _cache_counters())
+
+
+def batch_arguments(
+    pairs: List[Tuple[str, str]], batch_size: int
+) -> List[Tuple[str, List[str]]]:
+    """Group pairs by first image, in batches of at most batch_size candidates.
+
+    Batches follow the order of the first occurrence of each image in pairs.
+    """
+    candidates = {}
+    for im1, im2 in pairs:
+        candidates.setdefault(im1, []).append(im2)
+    args = []
+    for im1, im2s in candidates.items():
+        for i in range(0, len(im2s), batch_size):
+            args.append((im1, im2s[i : i + batch_size]))
+    return args
+
+
+def _match_unwrap_args_with_cache_counters(
+    args: Tuple[Any, ...]
+) -> Tuple[str, str, np.ndarray, Tuple[int, Tuple[int, int, int]]]:
+    """Match a pair, and return the feature cache counters of the worker."""
+    im1, im2, matches = match_unwrap_args(args)
+    return im1, im2, matches, (os.getpid(), _cache_counters())
+
+
 def match_descriptors(
     im1: str,
     im2: str,
@@ -464,6 +638,74 @@ def _match_descriptors_impl(
     )
 
 
+def _match_descriptors_batch_impl(
+    im1: str,
+    candidates: List[str],
+    camera1: pygeometry.Camera,
+    candidate_cameras: List[pygeometry.Camera],
+    data: DataSetBase,
+    overriden_config: Dict[str, Any],
+) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, str]]:
+    """Brute force descriptor matching of an image with several candidates."""
+    dummy = np.array([])
+    matcher_type = "BRUTEFORCE"
+    results = {im2: (dummy, dummy, dummy, matcher_type) for im2 in candidates}
+
+    segmentation_in_descriptor = overriden_config["matching_use_segmentation"]
+    features_data1 = feature_loader.instance.load_all_data(
+        data, im1, masked=True, segmentation_in_descriptor=segmentation_in_descriptor
+    )
+    if (
+        features_data1 is None
+        or len(features_data1.points) < 2
+        or features_data1.descriptors is None
+    ):
+        return results
+
+    valid = []
+    for im2, camera2 in zip(candidates, candidate_cameras):
+        features_data2 = feature_loader.instance.load_all_data(
+            data,
+            im2,
+            masked=True,
+            segmentation_in_descriptor=segmentation_in_descriptor,
+        )
+        if (
+            features_data2 is None
+            or len(features_data2.points) < 2
+            or features_data2.descriptors is None
+        ):
+            continue
+        valid.append((im2, camera2, features_data2))
+
+    all_matches = match_brute_force_batch(
+        features_data1.descriptors,
+        [f.descriptors for _, _, f in valid],
+        overriden_config,
+        overriden_config["symmetric_matching"],
+    )
+
+    for (im2, camera2, features_data2), matches in zip(valid, all_matches):
+        if overriden_config["matching_use_filters"]:
+            matches = apply_adhoc_filters(
+                data,
+                list(matches),
+                im1,
+                camera1,
+                features_data1.points,
+                im2,
+                camera2,
+                features_data2.points,
+            )
+        results[im2] = (
+            features_data1.points,
+            features_data2.points,
+            np.array(matches, dtype=int),
+            matcher_type,
+        )
+    return results
+
+
 def match_robust(
     im1: str,
     im2: str,
@@ -581,6 +823,81 @@ def match(
         )
     time_2d_matching = timer() - time_start
 
+    return _match_robust_from_descriptors(
+        im1,
+        im2,
+        p1,
+        p2,
+        matches,
+        matcher_type,
+        camera1,
+        camera2,
+        data,
+        overriden_config,
+        time_start,
+        time_2d_matching,
+    )
+
+
+def match_batch(
+    im1: str,
+    candidates: List[str],
+    camera1: pygeometry.Camera,
+    candidate_cameras: List[pygeometry.Camera],
+    data: DataSetBase,
+    config_override: Dict[str, Any],
+) -> Dict[str, np.ndarray]:
+    """Perform full matching of an image with several candidate images.
+
+    Descriptors of all candidates are brute force matched at once (see
+    match_brute_force_batch), then each pair is robustly matched as in match.
+    """
+    overriden_config = data.config.copy()
+    overriden_config.update(config_override)
+
+    time_start = timer()
+    descriptor_matches = _match_descriptors_batch_impl(
+        im1, candidates, camera1, candidate_cameras, data, overriden_config
+    )
+    # Batched descriptor matching time is shared evenly between pairs
+    time_2d_matching = (timer() - time_start) / max(1, len(candidates))
+
+    results = {}
+    for im2, camera2 in zip(candidates, candidate_cameras):
+        p1, p2, matches, matcher_type = descriptor_matches[im2]
+        pair_start = timer() - time_2d_matching
+        results[im2] = _match_robust_from_descriptors(
+            im1,
+            im2,
+            p1,
+            p2,
+            matches,
+            matcher_type,
+            camera1,
+            camera2,
+            data,
+            overriden_config,
+            pair_start,
+            time_2d_matching,
+        )
+    return results
+
+
+def _match_robust_from_descriptors(
+    im1: str,
+    im2: str,
+    p1: np.ndarray,
+    p2: np.ndarray,
+    matches: np.ndarray,
+    matcher_type: str,
+    camera1: pygeometry.Camera,
+    camera2: pygeometry.Camera,
+    data: DataSetBase,
+    overriden_config: Dict[str, Any],
+    time_start: float,
+    time_2d_matching: float,
+) -> np.ndarray:
+    """Robust matching of descriptor matches, in indexes of unmasked features."""
     symmetric = "symmetric" if overriden_config["symmetric_matching"] else "one-way"
     robust_matching_min_match = overriden_config["robust_matching_min_match"]
     if len(matches) < robust_matching_min_match:
@@ -746,6 +1063,105 @@ def match_brute_force(
     return _convert_matches_to_vector(good_matches)
 
 
+def match_brute_force_batch(
+    f1: np.ndarray,
+    candidates: List[np.ndarray],
+    config: Dict[str, Any],
+    symmetric: bool,
+    max_block_elements: int = 2 ** 25,
+) -> List[np.ndarray]:
+    """Brute force match an image with several images and apply Lowe's ratio.
+
+    Distances to the stacked descriptors of a block of candidate images are
+    computed with a single matrix product, and nearest neighbours are
+    searched within each candidate image, so results are the ones of
+    match_brute_force (or match_brute_force_symmetric) for each pair.
+
+    Args:
+        f1: feature descriptors of the query image
+        candidates: feature descriptors of each candidate image
+        config: config parameters
+        symmetric: keep only matches consistent in both directions
+        max_block_elements: maximum size of a block distance matrix
+
+    Returns:
+        a (n, 2) array of (f1 index, candidate index) for each candidate
+    """
+    binary = f1.dtype.type == np.uint8
+    a = _descriptors_for_distance(f1, binary)
+    a_norms = np.einsum("ij,ij->i", a, a)
+
+    results = []
+    block, block_size = [], 0
+    for i, f2 in enumerate(candidates):
+        block.append(f2)
+        block_size += len(f2)
+        last = i == len(candidates) - 1
+        if last or (block_size + len(candidates[i + 1])) * len(a) > max_block_elements:
+            stacked = _descriptors_for_distance(np.concatenate(block), binary)
+            b_norms = np.einsum("ij,ij->i", stacked, stacked)
+            distances = a_norms[:, None] + b_norms[None, :] - 2 * a.dot(stacked.T)
+            np.maximum(distances, 0, out=distances)
+
+            start = 0
+            for f in block:
+                end = start + len(f)
+                results.append(
+                    _match_distances(
+                        distances[:, start:end], config["lowes_ratio"], binary, symmetric
+                    )
+                )
+                start = end
+            block, block_size = [], 0
+    return results
+
+
+def _descriptors_for_distance(descriptors: np.ndarray, binary: bool) -> np.ndarray:
+    """Descriptors as float32 rows whose squared L2 distance is the matching one.
+
+    For binary descriptors, the squared L2 distance between unpacked bits
+    is the Hamming distance.
+    """
+    if binary:
+        return np.unpackbits(descriptors, axis=1).astype(np.float32)
+    return descriptors.astype(np.float32)
+
+
+def _match_distances(
+    distances: np.ndarray, ratio: float, binary: bool, symmetric: bool
+) -> np.ndarray:
+    """Lowe's ratio filtered nearest neighbours from a distance matrix.
+
+    Distances are squared L2 distances, or Hamming distances if binary.
+    """
+    # Ratio is applied on L2 distances : compare squared distances instead.
+    squared_ratio = ratio if binary else ratio ** 2
+    n1, n2 = distances.shape
+    if n1 < 2 or n2 < 2:
+        return np.zeros((0, 2), dtype=int)
+
+    best_12, good_12 = _ratio_test(distances, squared_ratio)
+    idx1 = np.flatnonzero(good_12)
+    idx2 = best_12[idx1]
+    if symmetric:
+        best_21, good_21 = _ratio_test(distances.T, squared_ratio)
+        consistent = good_21[idx2] & (best_21[idx2] == idx1)
+        idx1, idx2 = idx1[consistent], idx2[consistent]
+    return np.column_stack((idx1, idx2))
+
+
+def _ratio_test(distances: np.ndarray, ratio: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Nearest column of each row, and whether it passes the ratio test."""
+    two_nearest = np.argpartition(distances, 1, axis=1)[:, :2]
+    rows = np.arange(len(distances))[:, None]
+    two_distances = distances[rows, two_nearest]
+    order = np.argsort(two_distances, axis=1)
+    nearest = two_nearest[rows[:, 0], order[:, 0]]
+    d_first = two_distances[rows[:, 0], order[:, 0]]
+    d_second = two_distances[rows[:, 0], order[:, 1]]
+    return nearest, d_first < ratio * d_second
+
+
 def _convert_matches_to_vector(matches: List[Any]) -> List[Tuple[int, int]]:
     """Convert Dmatch object to matrix form."""
     return [(mm.queryIdx, mm.trainIdx) for mm in matches]
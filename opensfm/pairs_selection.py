@@ -1,4 +1,5 @@
 import copy
+import hashlib
 import logging
 import math
 from collections import defaultdict
@@ -7,7 +8,7 @@ from typing import Optional, Tuple, List, Set, Dict, Iterable, Any
 
 import numpy as np
 import scipy.spatial as spatial
-from opensfm import bow, context, feature_loader, vlad, geo, geometry
+from opensfm import bow, context, feature_loader, vlad, vlad_index, geo, geometry
 from opensfm.dataset_base import DataSetBase
 
 logger: logging.Logger = logging.getLogger(__name__)
@@ -301,6 +302,8 @@ def match_candidates_with_bow(
         reference,
         max_gps_distance,
         max_gps_neighbors,
+        max_neighbors,
+        enforce_other_cameras,
     )
 
     return construct_pairs(results, max_neighbors, exifs, enforce_other_cameras)
@@ -314,9 +317,15 @@ def compute_bow_affinity(
     reference: geo.TopocentricConverter,
     max_gps_distance: float,
     max_gps_neighbors: int,
+    max_neighbors: int = 0,
+    enforce_other_cameras: bool = False,
 ) -> List[Tuple[str, List[float], List[str]]]:
     """Compute afinity scores between references and candidates
     images using BoW-based distance.
+
+    If max_neighbors > 0 and candidates aren't preempted using GPS, only
+    the max_neighbors closest candidates of each reference are returned
+    (per camera group if enforce_other_cameras is True).
     """
     preempted_candidates, need_load = preempt_candidates(
         images_ref, images_cand, exifs, reference, max_gps_neighbors, max_gps_distance
@@ -326,12 +335,32 @@ def compute_bow_affinity(
     logger.info("Computing %d BoW histograms" % len(need_load))
     histograms = load_histograms(data, need_load)
 
+    preempted = max_gps_distance > 0 or max_gps_neighbors > 0
+    if not preempted and max_neighbors > 0:
+        logger.info("Computing BoW candidates using affinity matrix tiles")
+        return compute_affinity_top_k(
+            data,
+            histograms,
+            images_ref,
+            images_cand,
+            "L1",
+            max_neighbors,
+            exifs if enforce_other_cameras else None,
+        )
+
     # parallel VLAD neighbors computation
     args, processes, batch_size = create_parallel_matching_args(
-        data, preempted_candidates, histograms
+        data, preempted_candidates
     )
     logger.info("Computing BoW candidates with %d processes" % processes)
-    return context.parallel_map(match_bow_unwrap_args, args, processes, batch_size)
+    return context.parallel_map(
+        match_bow_unwrap_args,
+        args,
+        processes,
+        batch_size,
+        backend=data.config["parallel_backend"],
+        shared_args=(histograms,),
+    )
 
 
 def match_candidates_with_vlad(
@@ -373,6 +402,8 @@ def match_candidates_with_vlad(
         max_gps_distance,
         max_gps_neighbors,
         histograms,
+        max_neighbors,
+        enforce_other_cameras,
     )
 
     return construct_pairs(results, max_neighbors, exifs, enforce_other_cameras)
@@ -387,13 +418,20 @@ def compute_vlad_affinity(
     max_gps_distance: float,
     max_gps_neighbors: int,
     histograms: Dict[str, np.ndarray],
+    max_neighbors: int = 0,
+    enforce_other_cameras: bool = False,
 ) -> List[Tuple[str, List[float], List[str]]]:
     """Compute afinity scores between references and candidates
     images using VLAD-based distance.
+
+    If max_neighbors > 0 and candidates aren't preempted using GPS, only
+    the max_neighbors closest candidates of each reference are returned
+    (per camera group if enforce_other_cameras is True).
     """
     preempted_candidates, need_load = preempt_candidates(
         images_ref, images_cand, exifs, reference, max_gps_neighbors, max_gps_distance
     )
+    preempted = max_gps_distance > 0 or max_gps_neighbors > 0
 
     if len(preempted_candidates) == 0:
         logger.warning(
@@ -401,18 +439,334 @@ def compute_vlad_affinity(
         )
         preempted_candidates = {image: images_cand for image in images_ref}
         need_load = set(images_ref + images_cand)
+        preempted = False
 
     # construct VLAD histograms
     need_load = {im for im in need_load if im not in histograms}
     logger.info("Computing %d VLAD histograms" % len(need_load))
     histograms.update(vlad_histograms(need_load, data))
 
+    if not preempted and max_neighbors > 0 and data.config["matching_vlad_index"]:
+        logger.info("Computing VLAD candidates using the VLAD index")
+        return vlad_index_neighbors(
+            data,
+            histograms,
+            images_ref,
+            images_cand,
+            max_neighbors * (2 if enforce_other_cameras else 1),
+        )
+    elif not preempted and max_neighbors > 0:
+        logger.info("Computing VLAD candidates using affinity matrix tiles")
+        return compute_affinity_top_k(
+            data,
+            histograms,
+            images_ref,
+            images_cand,
+            "L2",
+            max_neighbors,
+            exifs if enforce_other_cameras else None,
+        )
+
     # parallel VLAD neighbors computation
     args, processes, batch_size = create_parallel_matching_args(
-        data, preempted_candidates, histograms
+        data, preempted_candidates
     )
     logger.info("Computing VLAD candidates with %d processes" % processes)
-    return context.parallel_map(match_vlad_unwrap_args, args, processes, batch_size)
+    return context.parallel_map(
+        match_vlad_unwrap_args,
+        args,
+        processes,
+        batch_size,
+        backend=data.config["parallel_backend"],
+        shared_args=(histograms,),
+    )
+
+
+def stack_histograms(
+    histograms: Dict[str, np.ndarray], images: Iterable[str]
+) -> Tuple[List[str], np.ndarray]:
+    """Stack the histograms of the images having one into a float32 matrix.
+
+    Returns the stacked images and the (images x dimension) matrix.
+    """
+    names = [im for im in images if im in histograms]
+    if len(names) == 0:
+        return names, np.zeros((0, 0), dtype=np.float32)
+    matrix = np.empty((len(names), len(histograms[names[0]])), dtype=np.float32)
+    for i, im in enumerate(names):
+        matrix[i] = histograms[im]
+    return names, matrix
+
+
+def affinity_tile(
+    reference: np.ndarray, candidates: np.ndarray, metric: str
+) -> np.ndarray:
+    """Distances between the rows of two histogram matrices.
+
+    L1 is used for BoW histograms and L2 for VLAD descriptors.
+    """
+    if metric == "L1":
+        return spatial.distance.cdist(reference, candidates, "cityblock")
+    elif metric == "L2":
+        squared = (
+            np.einsum("ij,ij->i", reference, reference)[:, None]
+            + np.einsum("ij,ij->i", candidates, candidates)[None, :]
+            - 2 * reference.dot(candidates.T)
+        )
+        return np.sqrt(np.maximum(squared, 0))
+    else:
+        raise ValueError("Invalid affinity metric: {}".format(metric))
+
+
+def _merge_top_k(
+    best_distances: np.ndarray,
+    best_indices: np.ndarray,
+    distances: np.ndarray,
+    indices: np.ndarray,
+    k: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep the k smallest distances of each row among the best ones and a new tile."""
+    all_distances = np.hstack((best_distances, distances))
+    all_indices = np.hstack((best_indices, np.broadcast_to(indices, distances.shape)))
+    if all_distances.shape[1] <= k:
+        return all_distances, all_indices
+    keep = np.argpartition(all_distances, k - 1, axis=1)[:, :k]
+    return (
+        np.take_along_axis(all_distances, keep, axis=1),
+        np.take_along_axis(all_indices, keep, axis=1),
+    )
+
+
+def affinity_top_k_block(
+    rows: Tuple[int, int],
+    reference: np.ndarray,
+    candidates: np.ndarray,
+    self_columns: np.ndarray,
+    reference_groups: Optional[np.ndarray],
+    candidate_groups: Optional[np.ndarray],
+    metric: str,
+    k: int,
+    block_size: int,
+) -> List[Tuple[List[float], List[int]]]:
+    """Closest candidates of a block of reference rows.
+
+    Candidates are processed by tiles of block_size columns, so that memory
+    stays bounded by the size of a tile. self_columns holds, for each
+    reference, its own column in the candidates (-1 if none), which is
+    skipped. If groups are given, the k closest candidates having the same
+    group and the k closest having a different group are kept.
+
+    Returns, for each row, the distances and columns of the kept candidates.
+    """
+    start, end = rows
+    num_rows = end - start
+    num_sets = 1 if reference_groups is None else 2
+    best = [
+        (np.empty((num_rows, 0)), np.empty((num_rows, 0), dtype=int))
+        for _ in range(num_sets)
+    ]
+
+    row_index = np.arange(num_rows)
+    for c_start in range(0, len(candidates), block_size):
+        c_end = min(c_start + block_size, len(candidates))
+        tile = affinity_tile(reference[start:end], candidates[c_start:c_end], metric)
+        columns = np.arange(c_start, c_end)
+
+        own = self_columns[start:end]
+        in_tile = (own >= c_start) & (own < c_end)
+        tile[row_index[in_tile], own[in_tile] - c_start] = np.inf
+
+        if reference_groups is None:
+            best[0] = _merge_top_k(*best[0], tile, columns, k)
+        else:
+            same = (
+                reference_groups[start:end, None]
+                == candidate_groups[None, c_start:c_end]
+            )
+            best[0] = _merge_top_k(*best[0], np.where(same, tile, np.inf), columns, k)
+            best[1] = _merge_top_k(*best[1], np.where(same, np.inf, tile), columns, k)
+
+    distances = np.hstack([b[0] for b in best])
+    indices = np.hstack([b[1] for b in best])
+    results = []
+    for row_distances, row_indices in zip(distances, indices):
+        valid = np.isfinite(row_distances)
+        results.append((row_distances[valid].tolist(), row_indices[valid].tolist()))
+    return results
+
+
+def compute_affinity_top_k(
+    data: DataSetBase,
+    histograms: Dict[str, np.ndarray],
+    images_ref: List[str],
+    images_cand: List[str],
+    metric: str,
+    k: int,
+    exifs: Optional[Dict[str, Any]],
+) -> List[Tuple[str, List[float], List[str]]]:
+    """Compute the k closest candidates of each reference image.
+
+    Histograms are stacked into dense matrices and distances are computed
+    by tiles of 'matching_affinity_block_size' references and candidates.
+    If exifs are given, the k closest candidates having the same camera and
+    the k closest having another camera are kept.
+
+    Returns results in the format expected by construct_pairs.
+    """
+    ref_names, reference = stack_histograms(histograms, images_ref)
+    cand_names, candidates = stack_histograms(histograms, images_cand)
+
+    results = [(im, [], []) for im in images_ref if im not in histograms]
+    if len(ref_names) == 0 or len(cand_names) == 0:
+        return results + [(im, [], []) for im in ref_names]
+
+    cand_columns = {im: i for i, im in enumerate(cand_names)}
+    self_columns = np.array([cand_columns.get(im, -1) for im in ref_names])
+
+    reference_groups, candidate_groups = None, None
+    if exifs is not None:
+        cameras = {}
+        reference_groups = np.array(
+            [cameras.setdefault(exifs[im]["camera"], len(cameras)) for im in ref_names]
+        )
+        candidate_groups = np.array(
+            [cameras.setdefault(exifs[im]["camera"], len(cameras)) for im in cand_names]
+        )
+
+    block_size = data.config["matching_affinity_block_size"]
+    blocks = [
+        (start, min(start + block_size, len(ref_names)))
+        for start in range(0, len(ref_names), block_size)
+    ]
+    # Tiles are computed by BLAS and scipy without holding the GIL
+    block_results = context.parallel_map(
+        _affinity_top_k_block_unwrap_args,
+        [(rows,) for rows in blocks],
+        data.config["processes"],
+        shared_args=(
+            reference,
+            candidates,
+            self_columns,
+            reference_groups,
+            candidate_groups,
+            metric,
+            k,
+            block_size,
+        ),
+    )
+
+    rows = (row for block in block_results for row in block)
+    for im, (distances, columns) in zip(ref_names, rows):
+        results.append((im, distances, [cand_names[c] for c in columns]))
+    return results
+
+
+def _affinity_top_k_block_unwrap_args(
+    args: Tuple[Any, ...]
+) -> List[Tuple[List[float], List[int]]]:
+    """Wrapper for parallel processing of affinity tiles"""
+    return affinity_top_k_block(*args)
+
+
+def vlad_index_metadata(data: DataSetBase, dimension: int) -> Dict[str, Any]:
+    """Identify the vocabulary and descriptors a VLAD index is built from.
+
+    A persisted index is only valid if its metadata equals the one computed
+    with the current vocabulary and configuration.
+    """
+    words = np.ascontiguousarray(vlad.instance.load_words(data))
+    return {
+        "version": vlad_index.VLAD_INDEX_VERSION,
+        "feature_type": data.config["feature_type"],
+        "words_sha1": hashlib.sha1(words.tobytes()).hexdigest(),
+        "words_shape": list(words.shape),
+        "dimension": dimension,
+    }
+
+
+def update_vlad_index(
+    data: DataSetBase, histograms: Dict[str, np.ndarray]
+) -> vlad_index.VladIndex:
+    """Add VLAD descriptors to the dataset index, building it if missing.
+
+    The index is rebuilt if it was computed with another vocabulary or
+    descriptor dimension than the current one.
+    """
+    dimension = len(next(iter(histograms.values())))
+    metadata = vlad_index_metadata(data, dimension)
+    index = None
+    if data.vlad_index_exists():
+        index = data.load_vlad_index()
+        if index.metadata != metadata:
+            logger.info("VLAD index is outdated, rebuilding it")
+            index = None
+    if index is not None:
+        known = set(index.images)
+        missing = [im for im in histograms if im not in known]
+        if len(missing) == 0:
+            return index
+        index.add(missing, np.array([histograms[im] for im in missing]))
+    else:
+        index = vlad_index.VladIndex.build(
+            histograms, data.config["matching_vlad_index_cells"], metadata=metadata
+        )
+    data.save_vlad_index(index)
+    return index
+
+
+def vlad_index_neighbors(
+    data: DataSetBase,
+    histograms: Dict[str, np.ndarray],
+    images_ref: List[str],
+    images_cand: List[str],
+    k: int,
+) -> List[Tuple[str, List[float], List[str]]]:
+    """Approximate closest candidates of each reference image using the VLAD index.
+
+    The search is restricted to the candidates, and more cells of the
+    index are probed until k candidates other than the reference itself
+    are found. The recall against exhaustive search is logged for a
+    sample of references.
+
+    Returns results in the format expected by construct_pairs.
+    """
+    candidates = set(images_cand)
+    results = [(im, [], []) for im in images_ref if im not in histograms]
+    ref_names = [im for im in images_ref if im in histograms]
+    cand_histograms = {im: h for im, h in histograms.items() if im in candidates}
+    if len(ref_names) == 0 or len(cand_histograms) == 0:
+        results += [(im, [], []) for im in ref_names]
+        return results
+
+    index = update_vlad_index(data, cand_histograms)
+    num_probes = data.config["matching_vlad_index_probes"]
+    allowed = np.array([im in candidates for im in index.images])
+    queries = np.array([histograms[im] for im in ref_names], dtype=np.float32)
+
+    neighbors = index.search_allowed(queries, k + 1, num_probes, allowed)
+    for im, (distances, indices) in zip(ref_names, neighbors):
+        kept_distances, kept_others = [], []
+        for distance, i in zip(distances, indices):
+            other = index.images[i]
+            if other != im and len(kept_others) < k:
+                kept_distances.append(float(distance))
+                kept_others.append(other)
+        results.append((im, kept_distances, kept_others))
+
+    num_samples = min(100, len(ref_names))
+    sample = np.random.default_rng(0).choice(len(ref_names), num_samples, replace=False)
+    positions = {im: i for i, im in enumerate(index.images)}
+    recall = index.recall(
+        queries[sample],
+        k,
+        num_probes,
+        [positions.get(ref_names[i], -1) for i in sample],
+        allowed,
+    )
+    logger.info(
+        "VLAD index recall@{} on {} images: {:.3f}".format(k, num_samples, recall)
+    )
+    return results
 
 
 def preempt_candidates(
@@ -476,10 +830,13 @@ def construct_pairs(
 def create_parallel_matching_args(
     data: DataSetBase,
     preempted_cand: Dict[str, list],
-    histograms: Dict[str, np.ndarray],
-) -> Tuple[List[Tuple[str, list, Dict[str, np.ndarray]]], int, int]:
-    """Create arguments to matching function"""
-    args = [(im, cands, histograms) for im, cands in preempted_cand.items()]
+) -> Tuple[List[Tuple[str, list]], int, int]:
+    """Create arguments to matching function
+
+    Histograms are shared by all tasks and must be passed to
+    parallel_map as shared arguments.
+    """
+    args = [(im, cands) for im, cands in preempted_cand.items()]
 
     # parallel VLAD neighbors computation
     per_process = 512
@@ -679,15 +1036,13 @@ def bow_distances(
     if image not in histograms:
         return image, [], []
 
-    distances = []
-    other = []
+    other = [im2 for im2 in other_images if im2 != image and im2 in histograms]
+    if len(other) == 0:
+        return image, [], []
     h = histograms[image]
-    for im2 in other_images:
-        if im2 != image and im2 in histograms:
-            h2 = histograms[im2]
-            distances.append(np.fabs(h - h2).sum())
-            other.append(im2)
-    return image, distances, other
+    h2 = np.array([histograms[im2] for im2 in other])
+    distances = np.fabs(h2 - h).sum(axis=1)
+    return image, distances.tolist(), other
 
 
 def load_histograms(data: DataSetBase, images: Iterable[str]) -> Dict[str, np.ndarray]:
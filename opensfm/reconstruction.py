@@ -1,18 +1,33 @@
 """Incremental reconstruction pipeline"""
 
+import bisect
+import contextlib
 import datetime
 import enum
+import heapq
 import logging
 import math
 from abc import abstractmethod, ABC
-from collections import defaultdict
-from itertools import combinations
+from collections import defaultdict, deque
+from itertools import combinations, islice
 from timeit import default_timer as timer
-from typing import Dict, Any, List, Tuple, Set, Optional, Union
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 import cv2
 import numpy as np
 from opensfm import (
+    io,
     log,
     matching,
     multiview,
@@ -106,6 +121,27 @@ def bundle_local(
     return pt_ids, report
 
 
+def bundle_window(
+    reconstruction: types.Reconstruction,
+    camera_priors: Dict[str, pygeometry.Camera],
+    rig_camera_priors: Dict[str, pymap.RigCamera],
+    gcp: Optional[List[pymap.GroundControlPoint]],
+    shot_ids: Iterable[str],
+    config: Dict[str, Any],
+) -> Tuple[List[str], Dict[str, Any]]:
+    """Bundle adjust a set of shots, keeping the shots around them fixed."""
+    pt_ids, report = pysfm.BAHelpers.bundle_shots(
+        reconstruction.map,
+        dict(camera_priors),
+        dict(rig_camera_priors),
+        gcp if gcp is not None else [],
+        set(shot_ids),
+        config,
+    )
+    logger.debug(report["brief_report"])
+    return pt_ids, report
+
+
 def shot_neighborhood(
     reconstruction: types.Reconstruction,
     central_shot_id: str,
@@ -181,7 +217,7 @@ def pairwise_reconstructability(common_tracks: int, rotation_inliers: int) -> fl
 
 
 TPairArguments = Tuple[
-    str, str, np.ndarray, np.ndarray, pygeometry.Camera, pygeometry.Camera, float
+    str, str, np.ndarray, np.ndarray, str, str, Dict[str, pygeometry.Camera], float
 ]
 
 
@@ -190,9 +226,16 @@ def compute_image_pairs(
 ) -> List[Tuple[str, str]]:
     """All matched image pairs sorted by reconstructability."""
     cameras = data.load_camera_models()
-    args = _pair_reconstructability_arguments(track_dict, cameras, data)
+    args = _pair_reconstructability_arguments(track_dict, data)
+    threshold = 4 * data.config["five_point_algo_threshold"]
     processes = data.config["processes"]
-    result = parallel_map(_compute_pair_reconstructability, args, processes)
+    result = parallel_map(
+        _compute_pair_reconstructability,
+        args,
+        processes,
+        backend=data.config["parallel_backend"],
+        shared_args=(cameras, threshold),
+    )
     result = list(result)
     pairs = [(im1, im2) for im1, im2, r in result if r > 0]
     score = [r for im1, im2, r in result if r > 0]
@@ -200,25 +243,126 @@ def compute_image_pairs(
     return [pairs[o] for o in order]
 
 
+class LazyImagePairs:
+    """Matched image pairs by decreasing reconstructability, ranked on demand.
+
+    The reconstructability of a pair is at most its number of common tracks.
+    Pairs are evaluated in batches by decreasing number of common tracks, and
+    the best evaluated pair is yielded once its reconstructability is at least
+    the number of common tracks of the next pair to evaluate, so no other pair
+    can beat it. Iterating over all pairs gives the order of
+    compute_image_pairs, while only evaluating the pairs needed by the
+    consumer.
+
+    If remaining_images is given, pairs with an image not in it anymore are
+    not evaluated. The set can be updated while iterating.
+    """
+
+    def __init__(
+        self,
+        track_dict: Dict[Tuple[str, str], tracking.TPairTracks],
+        data: DataSetBase,
+        remaining_images: Optional[Set[str]] = None,
+    ) -> None:
+        self.track_dict = track_dict
+        self.data = data
+        self.remaining_images = remaining_images
+        self.cameras = data.load_camera_models()
+        self.threshold = 4 * data.config["five_point_algo_threshold"]
+        self.batch_size = max(1, data.config["bootstrap_pairs_batch_size"])
+
+        self.candidates = sorted(track_dict, key=lambda pair: -len(track_dict[pair][1]))
+        self.next_candidate = 0
+        self.evaluated: List[Tuple[float, int, Tuple[str, str]]] = []
+        self.num_evaluated = 0
+        self.num_reconstructable = 0
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        while True:
+            if self.next_candidate < len(self.candidates):
+                next_pair = self.candidates[self.next_candidate]
+                upper_bound = len(self.track_dict[next_pair][1])
+            elif self.evaluated:
+                upper_bound = 0
+            else:
+                return
+
+            if self.evaluated and -self.evaluated[0][0] >= upper_bound:
+                yield heapq.heappop(self.evaluated)[2]
+            else:
+                self._evaluate_batch()
+
+    def _evaluate_batch(self) -> None:
+        batch = {}
+        while self.next_candidate < len(self.candidates) and len(batch) < self.batch_size:
+            im1, im2 = self.candidates[self.next_candidate]
+            self.next_candidate += 1
+            if self.remaining_images is None or (
+                im1 in self.remaining_images and im2 in self.remaining_images
+            ):
+                batch[im1, im2] = self.track_dict[im1, im2]
+
+        result = parallel_map(
+            _compute_pair_reconstructability,
+            _pair_reconstructability_arguments(batch, self.data),
+            self.data.config["processes"],
+            backend=self.data.config["parallel_backend"],
+            shared_args=(self.cameras, self.threshold),
+        )
+        for im1, im2, r in result:
+            if r > 0:
+                heapq.heappush(self.evaluated, (-r, self.num_evaluated, (im1, im2)))
+                self.num_reconstructable += 1
+            self.num_evaluated += 1
+
+
+def rank_image_pairs(
+    track_dict: Dict[Tuple[str, str], tracking.TPairTracks],
+    data: DataSetBase,
+    remaining_images: Optional[Set[str]] = None,
+) -> Union[List[Tuple[str, str]], LazyImagePairs]:
+    """Image pairs by decreasing reconstructability, fully or lazily ranked."""
+    ranking = data.config["bootstrap_pairs_ranking"]
+    if ranking == "FULL":
+        return compute_image_pairs(track_dict, data)
+    elif ranking == "LAZY":
+        return LazyImagePairs(track_dict, data, remaining_images)
+    else:
+        raise ValueError("Unknown pairs ranking: {}".format(ranking))
+
+
+def image_pairs_report(
+    pairs: Union[List[Tuple[str, str]], LazyImagePairs]
+) -> Dict[str, int]:
+    """Number of reconstructable pairs found, and evaluated ones if lazy."""
+    if isinstance(pairs, LazyImagePairs):
+        return {
+            "num_candidate_image_pairs": pairs.num_reconstructable,
+            "num_evaluated_image_pairs": pairs.num_evaluated,
+        }
+    return {"num_candidate_image_pairs": len(pairs)}
+
+
 def _pair_reconstructability_arguments(
     track_dict: Dict[Tuple[str, str], tracking.TPairTracks],
-    cameras: Dict[str, pygeometry.Camera],
     data: DataSetBase,
-) -> List[TPairArguments]:
-    threshold = 4 * data.config["five_point_algo_threshold"]
+) -> List[Tuple[str, str, np.ndarray, np.ndarray, str, str]]:
+    """Per-pair arguments. Cameras and threshold are shared by all pairs."""
+    camera_ids = {}
     args = []
     for (im1, im2), (_, p1, p2) in track_dict.items():
-        camera1 = cameras[data.load_exif(im1)["camera"]]
-        camera2 = cameras[data.load_exif(im2)["camera"]]
-        args.append((im1, im2, p1, p2, camera1, camera2, threshold))
+        for im in (im1, im2):
+            if im not in camera_ids:
+                camera_ids[im] = data.load_exif(im)["camera"]
+        args.append((im1, im2, p1, p2, camera_ids[im1], camera_ids[im2]))
     return args
 
 
 def _compute_pair_reconstructability(args: TPairArguments) -> Tuple[str, str, float]:
     log.setup()
-    im1, im2, p1, p2, camera1, camera2, threshold = args
+    im1, im2, p1, p2, camera_id1, camera_id2, cameras, threshold = args
     R, inliers = two_view_reconstruction_rotation_only(
-        p1, p2, camera1, camera2, threshold
+        p1, p2, cameras[camera_id1], cameras[camera_id2], threshold
     )
     r = pairwise_reconstructability(len(p1), len(inliers))
     return (im1, im2, r)
@@ -654,6 +798,126 @@ def reconstructed_points_for_images(
     return sorted(res.items(), key=lambda x: -x[1])
 
 
+class PointChanges:
+    """Ids of the points created and removed in a reconstruction.
+
+    Filled by the functions creating or removing points when given one, so
+    that incremental structures only look at the points that changed.
+    """
+
+    def __init__(self) -> None:
+        self.added: List[str] = []
+        self.removed: List[str] = []
+
+    def add(self, point_ids: Iterable[str]) -> None:
+        self.added.extend(point_ids)
+
+    def remove(self, point_ids: Iterable[str]) -> None:
+        self.removed.extend(point_ids)
+
+    def pop(self) -> Tuple[List[str], List[str]]:
+        """Return the added and removed ids, and forget them."""
+        added, removed = self.added, self.removed
+        self.added, self.removed = [], []
+        return added, removed
+
+
+class ResectionCandidates:
+    """Number of reconstructed points seen by images not yet reconstructed.
+
+    Same ranking as reconstructed_points_for_images, but kept up to date
+    incrementally : points created and removed are recorded in 'changes',
+    counters of the images seeing them are adjusted at the next update, and
+    images are ranked with a lazily invalidated heap.
+    """
+
+    def __init__(
+        self,
+        tracks_manager: pymap.TracksManager,
+        reconstruction: types.Reconstruction,
+        images: Iterable[str],
+    ) -> None:
+        self.tracks_manager = tracks_manager
+        self.reconstruction = reconstruction
+        self.changes = PointChanges()
+        self.changes.add(reconstruction.points.keys())
+        self.counts: Dict[str, int] = {}
+        self.versions: Dict[str, int] = {}
+        self.heap: List[Tuple[int, str, int]] = []
+        for image in images:
+            if image not in reconstruction.shots:
+                self.counts[image] = 0
+                self._push(image)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def update(self) -> Dict[str, Any]:
+        """Account for the points created and removed since the last update."""
+        start = timer()
+        added, removed = self.changes.pop()
+
+        deltas = defaultdict(int)
+        for tracks, sign in ((added, 1), (removed, -1)):
+            if not tracks:
+                continue
+            counts = pysfm.count_observations_per_shot(self.tracks_manager, tracks)
+            for image, count in counts.items():
+                deltas[image] += sign * count
+
+        num_updated = 0
+        for image, delta in deltas.items():
+            if delta != 0 and image in self.counts:
+                self.counts[image] += delta
+                self._push(image)
+                num_updated += 1
+
+        return {
+            "added_points": len(added),
+            "removed_points": len(removed),
+            "updated_images": num_updated,
+            "wall_time": timer() - start,
+        }
+
+    def remove(self, images: Iterable[str]) -> None:
+        """Stop ranking images, typically once added to the reconstruction."""
+        for image in images:
+            self.counts.pop(image, None)
+            self.versions.pop(image, None)
+
+    def ranked(self) -> Iterator[Tuple[str, int]]:
+        """Iterate (image, num_points) by decreasing number of points.
+
+        Entries are popped from the heap as they are consumed, and pushed
+        back once the iterator is exhausted or closed.
+        """
+        popped = []
+        try:
+            while self.heap:
+                entry = heapq.heappop(self.heap)
+                _, image, version = entry
+                if self.versions.get(image) != version:
+                    continue
+                popped.append(entry)
+                yield image, self.counts[image]
+        finally:
+            for entry in popped:
+                heapq.heappush(self.heap, entry)
+
+    def _push(self, image: str) -> None:
+        version = self.versions.get(image, 0) + 1
+        self.versions[image] = version
+        heapq.heappush(self.heap, (-self.counts[image], image, version))
+
+        # Drop invalidated entries once they dominate the heap
+        if len(self.heap) > 4 * len(self.versions) + 64:
+            self.heap = [
+                (-self.counts[image], image, version)
+                for image, version in self.versions.items()
+            ]
+            heapq.heapify(self.heap)
+
+
 def resect(
     data: DataSetBase,
     tracks_manager: pymap.TracksManager,
@@ -661,14 +925,45 @@ def resect(
     shot_id: str,
     threshold: float,
     min_inliers: int,
+    changes: Optional[PointChanges] = None,
 ) -> Tuple[bool, Set[str], Dict[str, Any]]:
     """Try resecting and adding a shot to the reconstruction.
 
+    Points triangulated for the rest of a rig instance are recorded in
+    changes, if given.
+
     Return:
         True on success.
     """
+    pose, inliers, report = estimate_resection(
+        data, tracks_manager, reconstruction, shot_id, threshold, min_inliers
+    )
+    if pose is None:
+        return False, set(), report
 
-    rig_assignments = rig.rig_assignments_per_image(data.load_rig_assignments())
+    new_shots = apply_resection(
+        data, tracks_manager, reconstruction, shot_id, pose, inliers, changes
+    )
+    report["shots"] = list(new_shots)
+    return True, new_shots, report
+
+
+def estimate_resection(
+    data: DataSetBase,
+    tracks_manager: pymap.TracksManager,
+    reconstruction: types.Reconstruction,
+    shot_id: str,
+    threshold: float,
+    min_inliers: int,
+) -> Tuple[Optional[pygeometry.Pose], List[str], Dict[str, Any]]:
+    """Estimate the pose of a shot from the reconstructed points it sees.
+
+    The reconstruction is only read, so that several shots can be estimated
+    concurrently.
+
+    Return:
+        The pose (None on failure), the inlier tracks and a report.
+    """
     camera = reconstruction.cameras[data.load_exif(shot_id)["camera"]]
 
     bs, Xs, ids = [], [], []
@@ -681,7 +976,7 @@ def resect(
     bs = np.array(bs)
     Xs = np.array(Xs)
     if len(bs) < 5:
-        return False, set(), {"num_common_points": len(bs)}
+        return None, [], {"num_common_points": len(bs)}
 
     T = multiview.absolute_pose_ransac(bs, Xs, threshold, 1000, 0.999)
 
@@ -699,28 +994,95 @@ def resect(
         "num_common_points": len(bs),
         "num_inliers": ninliers,
     }
-    if ninliers >= min_inliers:
-        R = T[:, :3].T
-        t = -R.dot(T[:, 3])
-        assert shot_id not in reconstruction.shots
+    if ninliers < min_inliers:
+        return None, [], report
+
+    R = T[:, :3].T
+    t = -R.dot(T[:, 3])
+    inlier_ids = [ids[i] for i, succeed in enumerate(inliers) if succeed]
+    return pygeometry.Pose(R, t), inlier_ids, report
+
+
+def apply_resection(
+    data: DataSetBase,
+    tracks_manager: pymap.TracksManager,
+    reconstruction: types.Reconstruction,
+    shot_id: str,
+    pose: pygeometry.Pose,
+    inliers: List[str],
+    changes: Optional[PointChanges] = None,
+) -> Set[str]:
+    """Add a resected shot and its inlier observations to the reconstruction.
+
+    Points triangulated for the rest of a rig instance are recorded in
+    changes, if given.
+
+    Return:
+        The added shots, which are all the shots of the rig instance of
+        shot_id if it belongs to one.
+    """
+    assert shot_id not in reconstruction.shots
+    rig_assignments = rig.rig_assignments_per_image(data.load_rig_assignments())
+    new_shots = add_shot(data, reconstruction, rig_assignments, shot_id, pose)
 
-        new_shots = add_shot(
-            data, reconstruction, rig_assignments, shot_id, pygeometry.Pose(R, t)
+    if shot_id in rig_assignments:
+        triangulate_shot_features(
+            tracks_manager, reconstruction, new_shots, data.config, changes
         )
+    for track_id in inliers:
+        add_observation_to_reconstruction(
+            tracks_manager, reconstruction, shot_id, track_id
+        )
+    return new_shots
 
-        if shot_id in rig_assignments:
-            triangulate_shot_features(
-                tracks_manager, reconstruction, new_shots, data.config
-            )
-        for i, succeed in enumerate(inliers):
-            if succeed:
-                add_observation_to_reconstruction(
-                    tracks_manager, reconstruction, shot_id, ids[i]
-                )
+
+def _estimate_resection_unwrap_args(
+    args: Tuple[Any, ...]
+) -> Tuple[str, Optional[pygeometry.Pose], List[str], Dict[str, Any]]:
+    data, tracks_manager, reconstruction, shot_id, threshold, min_inliers = args
+    pose, inliers, report = estimate_resection(
+        data, tracks_manager, reconstruction, shot_id, threshold, min_inliers
+    )
+    return shot_id, pose, inliers, report
+
+
+def resect_candidates(
+    data: DataSetBase,
+    tracks_manager: pymap.TracksManager,
+    reconstruction: types.Reconstruction,
+    shot_ids: List[str],
+    threshold: float,
+    min_inliers: int,
+    changes: Optional[PointChanges] = None,
+) -> List[Tuple[str, Set[str], Dict[str, Any]]]:
+    """Resect several shots concurrently and add the successful ones.
+
+    Poses are all estimated against the current reconstruction in a thread
+    pool, then successes are added in the order of shot_ids. A success is
+    skipped if its shot was already added along with the rig instance of a
+    previous one. Points triangulated for rig instances are recorded in
+    changes, if given.
+
+    Return:
+        (shot id, added shots, report) for each added shot.
+    """
+    arguments = [
+        (data, tracks_manager, reconstruction, shot_id, threshold, min_inliers)
+        for shot_id in shot_ids
+    ]
+    processes = min(data.config["processes"], len(arguments))
+    estimates = parallel_map(_estimate_resection_unwrap_args, arguments, processes)
+
+    resected = []
+    for shot_id, pose, inliers, report in estimates:
+        if pose is None or shot_id in reconstruction.shots:
+            continue
+        new_shots = apply_resection(
+            data, tracks_manager, reconstruction, shot_id, pose, inliers, changes
+        )
         report["shots"] = list(new_shots)
-        return True, new_shots, report
-    else:
-        return False, set(), report
+        resected.append((shot_id, new_shots, report))
+    return resected
 
 
 def corresponding_tracks(
@@ -1066,21 +1428,148 @@ class TrackTriangulator:
             return r
 
 
+def _track_observations_by_shot(
+    tracks_manager: pymap.TracksManager,
+    reconstruction: types.Reconstruction,
+    track_ids: Iterable[str],
+) -> Dict[str, Tuple[List[str], np.ndarray]]:
+    """Observations of the given tracks in the reconstruction shots.
+
+    Only the observations of the tracks are visited. Returns, for each shot,
+    the track ids and pixel coordinates of the observations.
+    """
+    by_shot: Dict[str, Tuple[List[str], List[np.ndarray]]] = {}
+    for track_id in track_ids:
+        observations = tracks_manager.get_track_observations(track_id)
+        for shot_id, observation in observations.items():
+            if shot_id not in reconstruction.shots:
+                continue
+            shot_tracks, shot_points = by_shot.setdefault(shot_id, ([], []))
+            shot_tracks.append(track_id)
+            shot_points.append(observation.point)
+    return {
+        shot_id: (shot_tracks, np.array(shot_points))
+        for shot_id, (shot_tracks, shot_points) in by_shot.items()
+    }
+
+
+def _shot_observations_by_shot(
+    tracks_manager: pymap.TracksManager,
+    reconstruction: types.Reconstruction,
+) -> Dict[str, Tuple[List[str], np.ndarray]]:
+    """Observations of the non-reconstructed tracks of all reconstruction shots."""
+    all_shots_ids = set(tracks_manager.get_shot_ids())
+    has_points = len(reconstruction.points) > 0
+    by_shot = {}
+    for shot_id in reconstruction.shots:
+        if shot_id not in all_shots_ids:
+            continue
+        shot_tracks, points, _, _, _, _ = tracks_manager.get_shot_observations_arrays(
+            shot_id
+        )
+        if has_points:
+            mask = np.fromiter(
+                (t not in reconstruction.points for t in shot_tracks),
+                bool,
+                len(shot_tracks),
+            )
+            shot_tracks = [t for t, m in zip(shot_tracks, mask) if m]
+            points = points[mask]
+        if len(shot_tracks) > 0:
+            by_shot[shot_id] = (list(shot_tracks), points[:, :2])
+    return by_shot
+
+
+def triangulate_tracks_batch(
+    tracks_manager: pymap.TracksManager,
+    reconstruction: types.Reconstruction,
+    track_ids: Optional[Set[str]],
+    config: Dict[str, Any],
+    changes: Optional[PointChanges] = None,
+) -> int:
+    """Triangulate the given tracks all at once and add them to the reconstruction.
+
+    Observations of the tracks in the reconstruction shots are gathered as
+    flat arrays grouped by track, and triangulated in native code (RANSAC
+    for the ROBUST triangulation type, all rays for FULL). Points and inlier
+    observations are then written in bulk. Tracks already in the
+    reconstruction are skipped. Return the number of points added.
+
+    If track_ids is None, all the tracks seen by the reconstruction shots
+    are triangulated, scanning the observations shot by shot. Otherwise,
+    only the observations of the given tracks are visited, so that the cost
+    doesn't grow with the size of the reconstruction.
+
+    Ids of the added points are recorded in changes, if given.
+    """
+    triangulation_type = config["triangulation_type"]
+    if triangulation_type not in ("ROBUST", "FULL"):
+        return 0
+
+    if track_ids is None:
+        by_shot = _shot_observations_by_shot(tracks_manager, reconstruction)
+    else:
+        wanted = [t for t in track_ids if t not in reconstruction.points]
+        by_shot = _track_observations_by_shot(tracks_manager, reconstruction, wanted)
+
+    obs_tracks, obs_shots, origins, bearings = [], [], [], []
+    for shot_id, (shot_tracks, points) in by_shot.items():
+        shot = reconstruction.shots[shot_id]
+        shot_bearings = shot.camera.pixel_bearing_many(points[:, :2])
+        bearings.append(shot_bearings.dot(shot.pose.get_rotation_matrix()))
+        origins.append(np.tile(shot.pose.get_origin(), (len(shot_bearings), 1)))
+        obs_tracks.extend(shot_tracks)
+        obs_shots.extend([shot_id] * len(shot_bearings))
+
+    if not obs_tracks:
+        return 0
+
+    # Group observations by track (CSR layout)
+    unique_tracks, track_of_obs = np.unique(obs_tracks, return_inverse=True)
+    order = np.argsort(track_of_obs, kind="stable")
+    counts = np.bincount(track_of_obs, minlength=len(unique_tracks))
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int32)
+
+    valid, points, sorted_inliers = pygeometry.triangulate_bearings_midpoint_batch(
+        np.concatenate(origins)[order],
+        np.concatenate(bearings)[order],
+        offsets,
+        config["triangulation_threshold"],
+        np.radians(config["triangulation_min_ray_angle"]),
+        config["triangulation_refinement_iterations"],
+        triangulation_type == "ROBUST",
+        config["processes"],
+    )
+    valid = valid.astype(bool)
+    if not valid.any():
+        return 0
+
+    # Back to the shot-ordered observations, which are added faster
+    inliers = np.zeros(len(obs_tracks), dtype=bool)
+    inliers[order] = sorted_inliers.astype(bool)
+    inliers &= valid[track_of_obs]
+    point_index = np.cumsum(valid) - 1
+
+    reconstruction.add_points_from_tracks(
+        tracks_manager,
+        unique_tracks[valid].tolist(),
+        points[valid],
+        [s for s, inlier in zip(obs_shots, inliers) if inlier],
+        point_index[track_of_obs[inliers]],
+    )
+    if changes is not None:
+        changes.add(unique_tracks[valid].tolist())
+    return int(valid.sum())
+
+
 def triangulate_shot_features(
     tracks_manager: pymap.TracksManager,
     reconstruction: types.Reconstruction,
     shot_ids: Set[str],
     config: Dict[str, Any],
+    changes: Optional[PointChanges] = None,
 ) -> None:
     """Reconstruct as many tracks seen in shot_id as possible."""
-    reproj_threshold = config["triangulation_threshold"]
-    min_ray_angle = config["triangulation_min_ray_angle"]
-    refinement_iterations = config["triangulation_refinement_iterations"]
-
-    triangulator = TrackTriangulator(
-        reconstruction, TrackHandlerTrackManager(tracks_manager, reconstruction)
-    )
-
     all_shots_ids = set(tracks_manager.get_shot_ids())
     tracks_ids = {
         t
@@ -1088,52 +1577,26 @@ def triangulate_shot_features(
         if s in all_shots_ids
         for t in tracks_manager.get_shot_observations(s)
     }
-    for track in tracks_ids:
-        if track not in reconstruction.points:
-            if config["triangulation_type"] == "ROBUST":
-                triangulator.triangulate_robust(
-                    track, reproj_threshold, min_ray_angle, refinement_iterations
-                )
-            elif config["triangulation_type"] == "FULL":
-                triangulator.triangulate(
-                    track, reproj_threshold, min_ray_angle, refinement_iterations
-                )
+    triangulate_tracks_batch(
+        tracks_manager, reconstruction, tracks_ids, config, changes
+    )
 
 
 def retriangulate(
     tracks_manager: pymap.TracksManager,
     reconstruction: types.Reconstruction,
     config: Dict[str, Any],
+    changes: Optional[PointChanges] = None,
 ) -> Dict[str, Any]:
     """Retrianguate all points"""
     chrono = Chronometer()
     report = {}
     report["num_points_before"] = len(reconstruction.points)
 
-    threshold = config["triangulation_threshold"]
-    min_ray_angle = config["triangulation_min_ray_angle"]
-    refinement_iterations = config["triangulation_refinement_iterations"]
-
+    if changes is not None:
+        changes.remove(reconstruction.points.keys())
     reconstruction.points = {}
-
-    all_shots_ids = set(tracks_manager.get_shot_ids())
-
-    triangulator = TrackTriangulator(
-        reconstruction, TrackHandlerTrackManager(tracks_manager, reconstruction)
-    )
-    tracks = set()
-    for image in reconstruction.shots.keys():
-        if image in all_shots_ids:
-            tracks.update(tracks_manager.get_shot_observations(image).keys())
-    for track in tracks:
-        if config["triangulation_type"] == "ROBUST":
-            triangulator.triangulate_robust(
-                track, threshold, min_ray_angle, refinement_iterations
-            )
-        elif config["triangulation_type"] == "FULL":
-            triangulator.triangulate(
-                track, threshold, min_ray_angle, refinement_iterations
-            )
+    triangulate_tracks_batch(tracks_manager, reconstruction, None, config, changes)
 
     report["num_points_after"] = len(reconstruction.points)
     chrono.lap("retriangulate")
@@ -1141,25 +1604,22 @@ def retriangulate(
     return report
 
 
-def get_error_distribution(points: Dict[str, pymap.Landmark]) -> Tuple[float, float]:
-    all_errors = []
-    for track in points.values():
-        all_errors += track.reprojection_errors.values()
-    robust_mean = np.median(all_errors, axis=0)
-    robust_std = 1.486 * np.median(
-        np.linalg.norm(np.array(all_errors) - robust_mean, axis=1)
-    )
+def get_error_distribution(errors: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Robust mean and standard deviation of (N, k) reprojection errors."""
+    robust_mean = np.median(errors, axis=0)
+    robust_std = 1.486 * np.median(np.linalg.norm(errors - robust_mean, axis=1))
     return robust_mean, robust_std
 
 
 def get_actual_threshold(
-    config: Dict[str, Any], points: Dict[str, pymap.Landmark]
+    config: Dict[str, Any], reconstruction: types.Reconstruction
 ) -> float:
     filter_type = config["bundle_outlier_filtering_type"]
     if filter_type == "FIXED":
         return config["bundle_outlier_fixed_threshold"]
     elif filter_type == "AUTO":
-        mean, std = get_error_distribution(points)
+        _, _, _, _, errors = reconstruction.map.get_reprojection_error_arrays()
+        mean, std = get_error_distribution(errors)
         return config["bundle_outlier_auto_ratio"] * np.linalg.norm(mean + std)
     else:
         return 1.0
@@ -1169,33 +1629,34 @@ def remove_outliers(
     reconstruction: types.Reconstruction,
     config: Dict[str, Any],
     points: Optional[Dict[str, pymap.Landmark]] = None,
+    changes: Optional[PointChanges] = None,
 ) -> int:
     """Remove points with large reprojection error.
 
-    A list of point ids to be processed can be given in ``points``.
+    A list of point ids to be processed can be given in ``points``. Ids of
+    the points left with too few observations, and thus removed, are
+    recorded in changes, if given.
     """
+    threshold_sqr = get_actual_threshold(config, reconstruction) ** 2
     if points is None:
-        points = reconstruction.points
-    threshold_sqr = get_actual_threshold(config, reconstruction.points) ** 2
-    outliers = []
-    for point_id in points:
-        for shot_id, error in reconstruction.points[
-            point_id
-        ].reprojection_errors.items():
-            error_sqr = error[0] ** 2 + error[1] ** 2
-            if error_sqr > threshold_sqr:
-                outliers.append((point_id, shot_id))
-
-    track_ids = set()
-    for track, shot_id in outliers:
-        reconstruction.map.remove_observation(shot_id, track)
-        track_ids.add(track)
-
-    for track in track_ids:
-        if track in reconstruction.points:
-            lm = reconstruction.points[track]
-            if lm.number_of_observations() < 2:
-                reconstruction.map.remove_landmark(lm)
+        arrays = reconstruction.map.get_reprojection_error_arrays()
+    else:
+        arrays = reconstruction.map.get_reprojection_error_arrays(list(points))
+    point_ids, shot_ids, point_index, shot_index, errors = arrays
+
+    error_sqr = np.sum(errors[:, :2] ** 2, axis=1)
+    outliers = np.nonzero(error_sqr > threshold_sqr)[0]
+    if len(outliers) > 0:
+        reconstruction.map.remove_observations(
+            np.array(shot_ids)[shot_index[outliers]].tolist(),
+            np.array(point_ids)[point_index[outliers]].tolist(),
+            2,
+        )
+        if changes is not None:
+            touched = np.array(point_ids)[np.unique(point_index[outliers])]
+            changes.remove(
+                p for p in touched.tolist() if not reconstruction.map.has_landmark(p)
+            )
 
     logger.info("Removed outliers: {}".format(len(outliers)))
     return len(outliers)
@@ -1363,6 +1824,166 @@ class ShouldRetriangulate:
         self.num_points_last = len(self.reconstruction.points)
 
 
+class BundleScheduler:
+    """Choose how to bundle after adding images, within a time budget.
+
+    Each added image brings 'bundle_time_budget_per_image' seconds of budget,
+    and every bundle spends its measured wall time. When a global adjustment
+    is needed (point growth, shot interval or residual drift since the last
+    full bundle, or a pending retriangulation), a full bundle is run if the
+    budget covers its time, extrapolated from the last full bundle by the
+    number of points. Otherwise, the last added images are bundled as a
+    window. Other steps run a local bundle.
+
+    Drift is the median reprojection error of the points of the last local
+    or window bundle, relative to the one of a fixed-size random sample of
+    points after the last full bundle, so that measuring it never computes
+    the errors of the whole reconstruction.
+    """
+
+    # Number of points used to measure the error after a full bundle
+    error_sample_size = 1000
+
+    def __init__(self, data: DataSetBase, reconstruction: types.Reconstruction) -> None:
+        config = data.config
+        self.reconstruction = reconstruction
+        self.interval = config["bundle_interval"]
+        self.new_points_ratio = config["bundle_new_points_ratio"]
+        self.budget_per_image = config["bundle_time_budget_per_image"]
+        self.drift_ratio = config["bundle_drift_ratio"]
+        self.local_radius = config["local_bundle_radius"]
+        self.window_size = config["bundle_window_size"]
+
+        self.budget = 0.0
+        self.recent_shots: Deque[str] = deque(maxlen=max(1, self.window_size))
+        self.full_time: Optional[float] = None
+        self.num_points_full = 0
+        self.num_shots_full = 0
+        self.reference_error: Optional[float] = None
+        self.last_error: Optional[float] = None
+        self.rng = np.random.default_rng(0)
+
+    def add_shots(self, shot_ids: Iterable[str]) -> None:
+        for shot_id in shot_ids:
+            self.recent_shots.append(shot_id)
+            self.budget += self.budget_per_image
+
+    def window(self) -> List[str]:
+        return list(self.recent_shots)
+
+    def decide(self, retriangulate: bool) -> Dict[str, Any]:
+        """Choose the next bundle : retriangulate, full, window, local or none."""
+        num_points = len(self.reconstruction.points)
+        points_ratio = num_points / max(1, self.num_points_full)
+        shots_since_full = len(self.reconstruction.shots) - self.num_shots_full
+        drift = (
+            self.last_error / self.reference_error
+            if self.last_error is not None and self.reference_error
+            else 1.0
+        )
+
+        estimated_full_time = 0.0
+        if self.full_time is not None:
+            estimated_full_time = self.full_time * points_ratio
+        # Retriangulation runs two full bundles
+        estimated_time = estimated_full_time * (2 if retriangulate else 1)
+
+        needs_global = (
+            retriangulate
+            or points_ratio >= self.new_points_ratio
+            or shots_since_full >= self.interval
+            or drift >= self.drift_ratio
+        )
+        if needs_global and self.budget >= estimated_time:
+            action = "retriangulate" if retriangulate else "full"
+        elif needs_global and self.window_size > 0:
+            action = "window"
+        elif self.local_radius > 0:
+            action = "local"
+        else:
+            action = "none"
+
+        return {
+            "action": action,
+            "budget": self.budget,
+            "estimated_full_time": estimated_full_time,
+            "points_ratio": points_ratio,
+            "shots_since_full": shots_since_full,
+            "drift": drift,
+        }
+
+    def done(
+        self,
+        action: str,
+        wall_time: float,
+        bundled_points: Optional[Iterable[str]] = None,
+    ) -> None:
+        """Spend the wall time of a bundle from the budget.
+
+        bundled_points are the points adjusted by a local or window bundle,
+        used to measure the drift.
+        """
+        self.budget -= wall_time
+        if action in ("full", "retriangulate"):
+            self.full_time = wall_time / (2 if action == "retriangulate" else 1)
+            self.num_points_full = len(self.reconstruction.points)
+            self.num_shots_full = len(self.reconstruction.shots)
+            point_ids = list(self.reconstruction.points.keys())
+            # A random sample, so that the oldest points aren't favored
+            sample = self.rng.choice(
+                len(point_ids),
+                min(len(point_ids), self.error_sample_size),
+                replace=False,
+            )
+            self.reference_error = self._median_error(point_ids[i] for i in sample)
+            self.last_error = self.reference_error
+        elif bundled_points is not None:
+            self.last_error = self._median_error(bundled_points)
+
+    def _median_error(self, point_ids: Iterable[str]) -> Optional[float]:
+        """Median error of the points, ignoring the ones removed since."""
+        _, _, _, _, errors = self.reconstruction.map.get_reprojection_error_arrays(
+            list(point_ids)
+        )
+        if len(errors) == 0:
+            return None
+        return float(np.median(np.linalg.norm(errors, axis=1)))
+
+
+class SequenceWindow:
+    """Reconstructed shots ordered by EXIF capture time.
+
+    Used to bundle the last 'bundle_sliding_window' shots of a sequence,
+    shots outside of the window being kept fixed.
+    """
+
+    def __init__(self, data: DataSetBase, shot_ids: Iterable[str]) -> None:
+        self.size = data.config["bundle_sliding_window"]
+        self.keys: Dict[str, Tuple[float, str]] = {}
+        for shot_id in shot_ids:
+            capture_time = data.load_exif(shot_id).get("capture_time") or 0.0
+            self.keys[shot_id] = (capture_time, shot_id)
+        self.ordered: List[Tuple[float, str]] = []
+
+    def add(self, shot_ids: Iterable[str]) -> None:
+        for shot_id in shot_ids:
+            bisect.insort(self.ordered, self.keys[shot_id])
+
+    def last(self, shot_id: str) -> List[str]:
+        """The window of shots ending at shot_id in capture order."""
+        end = bisect.bisect_right(self.ordered, self.keys[shot_id])
+        return [s for _, s in self.ordered[max(0, end - self.size) : end]]
+
+    def sweep(self) -> Iterator[List[str]]:
+        """Overlapping windows covering the whole sequence, in capture order."""
+        if not self.ordered:
+            return
+        stride = max(1, self.size // 2)
+        end = max(1, len(self.ordered) - self.size + stride)
+        for start in range(0, end, stride):
+            yield [s for _, s in self.ordered[start : start + self.size]]
+
+
 def grow_reconstruction(
     data: DataSetBase,
     tracks_manager: pymap.TracksManager,
@@ -1380,12 +2001,23 @@ def grow_reconstruction(
     paint_reconstruction(data, tracks_manager, reconstruction)
     align_reconstruction(reconstruction, gcp, config)
 
+    start = timer()
     bundle(reconstruction, camera_priors, rig_camera_priors, None, config)
     remove_outliers(reconstruction, config)
+    initial_bundle_time = timer() - start
     paint_reconstruction(data, tracks_manager, reconstruction)
 
     should_bundle = ShouldBundle(data, reconstruction)
     should_retriangulate = ShouldRetriangulate(data, reconstruction)
+    scheduler = None
+    if config["bundle_scheduling"] == "ADAPTIVE":
+        scheduler = BundleScheduler(data, reconstruction)
+        scheduler.done("full", initial_bundle_time)
+    sequence = None
+    if config["bundle_sliding_window"] > 0:
+        sequence = SequenceWindow(data, set(reconstruction.shots) | set(images))
+        sequence.add(reconstruction.shots)
+    candidate_index = ResectionCandidates(tracks_manager, reconstruction, images)
     while True:
         if config["save_partial_reconstructions"]:
             paint_reconstruction(data, tracks_manager, reconstruction)
@@ -1396,28 +2028,52 @@ def grow_reconstruction(
                 ),
             )
 
-        candidates = reconstructed_points_for_images(
-            tracks_manager, reconstruction, images
-        )
-        if not candidates:
+        candidates_report = candidate_index.update()
+        if not candidate_index:
             break
 
         logger.info("-------------------------------------------------------")
         threshold = data.config["resection_threshold"]
         min_inliers = data.config["resection_min_inliers"]
-        for image, _ in candidates:
-            ok, new_shots, resrep = resect(
-                data,
-                tracks_manager,
-                reconstruction,
-                image,
-                threshold,
-                min_inliers,
-            )
-            if not ok:
-                continue
 
+        # Resect the top candidates at once, or the first one that succeeds
+        resected = []
+        num_concurrent = config["resection_candidates"]
+        with contextlib.closing(candidate_index.ranked()) as candidates:
+            if num_concurrent > 1:
+                resected = resect_candidates(
+                    data,
+                    tracks_manager,
+                    reconstruction,
+                    [image for image, _ in islice(candidates, num_concurrent)],
+                    threshold,
+                    min_inliers,
+                    candidate_index.changes,
+                )
+            if not resected:
+                for image, _ in candidates:
+                    ok, new_shots, resrep = resect(
+                        data,
+                        tracks_manager,
+                        reconstruction,
+                        image,
+                        threshold,
+                        min_inliers,
+                        candidate_index.changes,
+                    )
+                    if ok:
+                        resected.append((image, new_shots, resrep))
+                        break
+        if not resected:
+            logger.info("Some images can not be added")
+            break
+
+        steps = []
+        all_new_shots = set()
+        for image, new_shots, resrep in resected:
             images -= new_shots
+            candidate_index.remove(new_shots)
+            all_new_shots |= new_shots
             bundle_shot_poses(
                 reconstruction,
                 new_shots,
@@ -1433,38 +2089,103 @@ def grow_reconstruction(
                 "memory_usage": current_memory_usage(),
             }
             report["steps"].append(step)
+            steps.append(step)
+
+        # Candidate ranking, triangulation and bundle reports go with the last step
+        step = steps[-1]
+        step["candidate_index"] = candidates_report
+        np_before = len(reconstruction.points)
+        triangulate_shot_features(
+            tracks_manager,
+            reconstruction,
+            all_new_shots,
+            config,
+            candidate_index.changes,
+        )
+        np_after = len(reconstruction.points)
+        step["triangulated_points"] = np_after - np_before
+
+        if sequence is not None:
+            sequence.add(shot for _, new_shots, _ in resected for shot in new_shots)
+        if scheduler is not None:
+            scheduler.add_shots(
+                shot for _, new_shots, _ in resected for shot in sorted(new_shots)
+            )
+            decision = scheduler.decide(should_retriangulate.should())
+            step["bundle_decision"] = decision
+            action = decision["action"]
+        elif should_retriangulate.should():
+            action = "retriangulate"
+        elif should_bundle.should():
+            action = "full"
+        elif sequence is not None:
+            action = "sliding"
+        elif config["local_bundle_radius"] > 0:
+            action = "local"
+        else:
+            action = "none"
 
-            np_before = len(reconstruction.points)
-            triangulate_shot_features(tracks_manager, reconstruction, new_shots, config)
-            np_after = len(reconstruction.points)
-            step["triangulated_points"] = np_after - np_before
-
-            if should_retriangulate.should():
-                logger.info("Re-triangulating")
-                align_reconstruction(reconstruction, gcp, config)
-                b1rep = bundle(
-                    reconstruction, camera_priors, rig_camera_priors, None, config
-                )
-                rrep = retriangulate(tracks_manager, reconstruction, config)
-                b2rep = bundle(
-                    reconstruction, camera_priors, rig_camera_priors, None, config
-                )
-                remove_outliers(reconstruction, config)
-                step["bundle"] = b1rep
-                step["retriangulation"] = rrep
-                step["bundle_after_retriangulation"] = b2rep
-                should_retriangulate.done()
-                should_bundle.done()
-            elif should_bundle.should():
-                align_reconstruction(reconstruction, gcp, config)
-                brep = bundle(
-                    reconstruction, camera_priors, rig_camera_priors, None, config
-                )
-                remove_outliers(reconstruction, config)
-                step["bundle"] = brep
-                should_bundle.done()
-            elif config["local_bundle_radius"] > 0:
-                bundled_points, brep = bundle_local(
+        bundled_points = None
+        start = timer()
+        if action == "retriangulate":
+            logger.info("Re-triangulating")
+            align_reconstruction(reconstruction, gcp, config)
+            b1rep = bundle(
+                reconstruction, camera_priors, rig_camera_priors, None, config
+            )
+            rrep = retriangulate(
+                tracks_manager, reconstruction, config, candidate_index.changes
+            )
+            b2rep = bundle(
+                reconstruction, camera_priors, rig_camera_priors, None, config
+            )
+            remove_outliers(reconstruction, config, None, candidate_index.changes)
+            step["bundle"] = b1rep
+            step["retriangulation"] = rrep
+            step["bundle_after_retriangulation"] = b2rep
+            should_retriangulate.done()
+            should_bundle.done()
+        elif action == "full":
+            align_reconstruction(reconstruction, gcp, config)
+            brep = bundle(
+                reconstruction, camera_priors, rig_camera_priors, None, config
+            )
+            remove_outliers(reconstruction, config, None, candidate_index.changes)
+            step["bundle"] = brep
+            should_bundle.done()
+        elif action == "window":
+            bundled_points, brep = bundle_window(
+                reconstruction,
+                camera_priors,
+                rig_camera_priors,
+                None,
+                scheduler.window(),
+                config,
+            )
+            remove_outliers(
+                reconstruction, config, bundled_points, candidate_index.changes
+            )
+            step["window_bundle"] = brep
+        elif action == "sliding" or (action == "local" and sequence is not None):
+            window = set()
+            for image, _, _ in resected:
+                window.update(sequence.last(image))
+            bundled_points, brep = bundle_window(
+                reconstruction,
+                camera_priors,
+                rig_camera_priors,
+                None,
+                window,
+                config,
+            )
+            remove_outliers(
+                reconstruction, config, bundled_points, candidate_index.changes
+            )
+            step["sliding_bundle"] = brep
+        elif action == "local":
+            bundled_points = set()
+            for (image, _, _), image_step in zip(resected, steps):
+                points, brep = bundle_local(
                     reconstruction,
                     camera_priors,
                     rig_camera_priors,
@@ -1472,13 +2193,15 @@ def grow_reconstruction(
                     image,
                     config,
                 )
-                remove_outliers(reconstruction, config, bundled_points)
-                step["local_bundle"] = brep
-
-            break
-        else:
-            logger.info("Some images can not be added")
-            break
+                bundled_points.update(points)
+                image_step["local_bundle"] = brep
+            remove_outliers(
+                reconstruction, config, bundled_points, candidate_index.changes
+            )
+        if scheduler is not None:
+            wall_time = timer() - start
+            scheduler.done(action, wall_time, bundled_points)
+            step["bundle_decision"]["wall_time"] = wall_time
 
     logger.info("-------------------------------------------------------")
 
@@ -1574,17 +2297,64 @@ def incremental_reconstruction(
     data.init_reference(images)
 
     remaining_images = set(images)
-    gcp = data.load_ground_control_points()
     common_tracks = tracking.all_common_tracks_with_features(tracks_manager)
+
+    if data.config["reconstruction_parallel_components"]:
+        components = image_graph_components(common_tracks)
+        report["num_components"] = len(components)
+        (
+            rec_reports,
+            reconstructions,
+            remaining_images,
+            pairs_report,
+        ) = reconstruct_components(data, tracks_manager, components, common_tracks)
+        remaining_images |= set(images) - set().union(*components)
+    else:
+        pairs = rank_image_pairs(common_tracks, data, remaining_images)
+        chrono.lap("compute_image_pairs")
+        gcp = data.load_ground_control_points()
+        rec_reports, reconstructions = reconstruct_from_pairs(
+            data, tracks_manager, pairs, common_tracks, remaining_images, gcp
+        )
+        pairs_report = image_pairs_report(pairs)
+    report.update(pairs_report)
+    report["reconstructions"] = rec_reports
+
+    for k, r in enumerate(reconstructions):
+        logger.info(
+            "Reconstruction {}: {} images, {} points".format(
+                k, len(r.shots), len(r.points)
+            )
+        )
+    logger.info("{} partial reconstructions in total.".format(len(reconstructions)))
+    chrono.lap("compute_reconstructions")
+    report["wall_times"] = dict(chrono.lap_times())
+    report["not_reconstructed_images"] = list(remaining_images)
+    return report, reconstructions
+
+
+def reconstruct_from_pairs(
+    data: DataSetBase,
+    tracks_manager: pymap.TracksManager,
+    pairs: Iterable[Tuple[str, str]],
+    common_tracks: Dict[Tuple[str, str], tracking.TPairTracks],
+    remaining_images: Set[str],
+    gcp: List[pymap.GroundControlPoint],
+) -> Tuple[List[Dict[str, Any]], List[types.Reconstruction]]:
+    """Bootstrap and grow reconstructions from pairs, in order.
+
+    Reconstructed images are removed from remaining_images.
+
+    Return:
+        The report of each reconstruction attempt and the reconstructions,
+        sorted by decreasing number of shots.
+    """
+    rec_reports = []
     reconstructions = []
-    pairs = compute_image_pairs(common_tracks, data)
-    chrono.lap("compute_image_pairs")
-    report["num_candidate_image_pairs"] = len(pairs)
-    report["reconstructions"] = []
     for im1, im2 in pairs:
         if im1 in remaining_images and im2 in remaining_images:
             rec_report = {}
-            report["reconstructions"].append(rec_report)
+            rec_reports.append(rec_report)
             _, p1, p2 = common_tracks[im1, im2]
             reconstruction, rec_report["bootstrap"] = bootstrap_reconstruction(
                 data, tracks_manager, im1, im2, p1, p2
@@ -1601,18 +2371,129 @@ def incremental_reconstruction(
                 )
                 reconstructions.append(reconstruction)
                 reconstructions = sorted(reconstructions, key=lambda x: -len(x.shots))
+    return rec_reports, reconstructions
 
-    for k, r in enumerate(reconstructions):
-        logger.info(
-            "Reconstruction {}: {} images, {} points".format(
-                k, len(r.shots), len(r.points)
+
+def image_graph_components(
+    common_tracks: Dict[Tuple[str, str], Any]
+) -> List[Set[str]]:
+    """Connected components of the image pairs graph, largest first."""
+    parents = {}
+
+    def find(image: str) -> str:
+        root = parents.setdefault(image, image)
+        while root != parents[root]:
+            root = parents[root]
+        while image != root:
+            parents[image], image = root, parents[image]
+        return root
+
+    for im1, im2 in common_tracks:
+        root1, root2 = find(im1), find(im2)
+        if root1 != root2:
+            parents[root1] = root2
+
+    components = defaultdict(set)
+    for image in parents:
+        components[find(image)].add(image)
+    return sorted(components.values(), key=lambda c: (-len(c), min(c)))
+
+
+def reconstruct_components(
+    data: DataSetBase,
+    tracks_manager: pymap.TracksManager,
+    components: List[Set[str]],
+    common_tracks: Dict[Tuple[str, str], tracking.TPairTracks],
+) -> Tuple[List[Dict[str, Any]], List[types.Reconstruction], Set[str], Dict[str, int]]:
+    """Reconstruct each image graph component in its own worker process.
+
+    Image pairs of each component are ranked by its worker.
+
+    Each worker gets the observations of its component only, so tracks
+    spanning components through weak links (pairs with too few common
+    tracks) are not shared between reconstructions. Reconstructions are
+    sent back as JSON, so they don't carry the point observations.
+
+    Return:
+        The merged reports and reconstructions (sorted by decreasing number
+        of shots), the images left unreconstructed and the summed pairs
+        ranking report.
+    """
+    component_of = {im: i for i, component in enumerate(components) for im in component}
+    component_pairs = [[] for _ in components]
+    for im1, im2 in common_tracks:
+        component_pairs[component_of[im1]].append((im1, im2))
+
+    arguments = []
+    remaining_images = set()
+    for component, cpairs in zip(components, component_pairs):
+        if not cpairs:
+            remaining_images |= component
+            continue
+        sub_tracks_manager = tracks_manager.construct_sub_tracks_manager(
+            list(
+                {
+                    track
+                    for image in component
+                    for track in tracks_manager.get_shot_observations(image)
+                }
+            ),
+            list(component),
+        )
+        arguments.append(
+            (
+                data,
+                sub_tracks_manager.as_string(),
+                {pair: common_tracks[pair] for pair in cpairs},
+                component,
             )
         )
-    logger.info("{} partial reconstructions in total.".format(len(reconstructions)))
-    chrono.lap("compute_reconstructions")
-    report["wall_times"] = dict(chrono.lap_times())
-    report["not_reconstructed_images"] = list(remaining_images)
-    return report, reconstructions
+
+    processes = data.config["processes"]
+    logger.info(
+        "Reconstructing {} components with {} processes".format(
+            len(arguments), processes
+        )
+    )
+    results = parallel_map(
+        _reconstruct_component, arguments, processes, backend="processes"
+    )
+
+    rec_reports, reconstructions = [], []
+    pairs_report = defaultdict(int)
+    for (
+        component_reports,
+        component_reconstructions,
+        component_remaining,
+        component_pairs_report,
+    ) in results:
+        rec_reports.extend(component_reports)
+        reconstructions.extend(io.reconstructions_from_json(component_reconstructions))
+        remaining_images.update(component_remaining)
+        for key, value in component_pairs_report.items():
+            pairs_report[key] += value
+    reconstructions = sorted(reconstructions, key=lambda x: -len(x.shots))
+    return rec_reports, reconstructions, remaining_images, dict(pairs_report)
+
+
+def _reconstruct_component(
+    args: Tuple[Any, ...]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[str], Dict[str, int]]:
+    log.setup()
+    data, tracks_string, common_tracks, images = args
+    tracks_manager = pymap.TracksManager.instanciate_from_string(tracks_string)
+    gcp = data.load_ground_control_points()
+    remaining_images = set(images)
+    pairs = rank_image_pairs(common_tracks, data, remaining_images)
+    rec_reports, reconstructions = reconstruct_from_pairs(
+        data, tracks_manager, pairs, common_tracks, remaining_images, gcp
+    )
+    return (
+        rec_reports,
+        io.reconstructions_to_json(reconstructions),
+        list(remaining_images),
+        image_pairs_report(pairs),
+    )
 
 
 def reconstruct_from_prior(
@@ -1640,11 +2521,40 @@ def reconstruct_from_prior(
 
     # Start with the known poses
     triangulate_shot_features(tracks_manager, reconstruction, prior_images, data.config)
+
+    if data.config["bundle_sliding_window"] > 0:
+        rec_report["sliding_bundle"] = bundle_sequence(
+            data, reconstruction, prior_images
+        )
     paint_reconstruction(data, tracks_manager, reconstruction)
     report["not_reconstructed_images"] = list(remaining_images)
     return report, reconstruction
 
 
+def bundle_sequence(
+    data: DataSetBase,
+    reconstruction: types.Reconstruction,
+    shot_ids: Iterable[str],
+) -> List[Dict[str, Any]]:
+    """Bundle the shots with overlapping windows along their capture order."""
+    config = data.config
+    camera_priors = data.load_camera_models()
+    rig_camera_priors = data.load_rig_cameras()
+
+    shot_ids = list(shot_ids)
+    sequence = SequenceWindow(data, shot_ids)
+    sequence.add(shot_ids)
+
+    reports = []
+    for window in sequence.sweep():
+        points, brep = bundle_window(
+            reconstruction, camera_priors, rig_camera_priors, None, window, config
+        )
+        remove_outliers(reconstruction, config, points)
+        reports.append(brep)
+    return reports
+
+
 class Chronometer:
     def __init__(self) -> None:
         self.start()
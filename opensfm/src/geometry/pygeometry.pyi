@@ -26,6 +26,7 @@ __all__  = [
 "relative_rotation_n_points",
 "triangulate_bearings_dlt",
 "triangulate_bearings_midpoint",
+"triangulate_bearings_midpoint_batch",
 "triangulate_two_bearings_midpoint",
 "triangulate_two_bearings_midpoint_many",
 "BROWN",
@@ -287,6 +288,7 @@ def relative_pose_refinement(arg0: numpy.ndarray, arg1: numpy.ndarray, arg2: num
 def relative_rotation_n_points(arg0: numpy.ndarray, arg1: numpy.ndarray) -> numpy.ndarray:...
 def triangulate_bearings_dlt(arg0: List[numpy.ndarray], arg1: numpy.ndarray, arg2: float, arg3: float) -> Tuple[bool, numpy.ndarray]:...
 def triangulate_bearings_midpoint(arg0: numpy.ndarray, arg1: numpy.ndarray, arg2: List[float], arg3: float) -> Tuple[bool, numpy.ndarray]:...
+def triangulate_bearings_midpoint_batch(arg0: numpy.ndarray, arg1: numpy.ndarray, arg2: numpy.ndarray, arg3: float, arg4: float, arg5: int, arg6: bool, arg7: int) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:...
 def triangulate_two_bearings_midpoint(arg0: numpy.ndarray, arg1: numpy.ndarray) -> Tuple[bool, numpy.ndarray]:...
 def triangulate_two_bearings_midpoint_many(arg0: numpy.ndarray, arg1: numpy.ndarray, arg2: numpy.ndarray, arg3: numpy.ndarray) -> List[Tuple[bool, numpy.ndarray]]:...
 BROWN = ...
@@ -300,6 +300,9 @@ PYBIND11_MODULE(pygeometry, m) {
         py::call_guard<py::gil_scoped_release>());
   m.def("point_refinement", geometry::PointRefinement,
         py::call_guard<py::gil_scoped_release>());
+  m.def("triangulate_bearings_midpoint_batch",
+        geometry::TriangulateBearingsMidpointBatch,
+        py::call_guard<py::gil_scoped_release>());
   m.def("essential_five_points", geometry::EssentialFivePoints);
   m.def("absolute_pose_three_points", geometry::AbsolutePoseThreePoints);
   m.def("absolute_pose_n_points", geometry::AbsolutePoseNPoints);
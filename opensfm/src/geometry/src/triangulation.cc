@@ -7,6 +7,13 @@
 #include <geometry/triangulation.h>
 #include <math.h>
 
+#include <algorithm>
+#include <atomic>
+#include <random>
+#include <set>
+#include <stdexcept>
+#include <thread>
+
 double AngleBetweenVectors(const Eigen::Vector3d &u, const Eigen::Vector3d &v) {
   double c = (u.dot(v)) / sqrt(u.dot(u) * v.dot(v));
   if (std::fabs(c) >= 1.0)
@@ -225,4 +232,188 @@ Vec3d PointRefinement(const MatX3d &centers, const MatX3d &bearings,
   return refined;
 }
 
+namespace {
+
+struct TrackTriangulation {
+  bool valid{false};
+  Vec3d point{Vec3d::Zero()};
+  std::vector<int> inliers;
+};
+
+std::vector<int> BearingInliers(const MatX3d &centers, const MatX3d &bearings,
+                                const Vec3d &point, double threshold) {
+  std::vector<int> inliers;
+  for (int i = 0; i < centers.rows(); ++i) {
+    const Vec3d projected =
+        (point - centers.row(i).transpose()).normalized();
+    if ((projected - bearings.row(i).transpose()).norm() < threshold) {
+      inliers.push_back(i);
+    }
+  }
+  return inliers;
+}
+
+MatX3d SelectRows(const MatX3d &matrix, const std::vector<int> &rows) {
+  MatX3d selected(rows.size(), 3);
+  for (int i = 0; i < rows.size(); ++i) {
+    selected.row(i) = matrix.row(rows[i]);
+  }
+  return selected;
+}
+
+TrackTriangulation TriangulateTrackRobust(const MatX3d &centers,
+                                          const MatX3d &bearings,
+                                          double threshold, double min_angle,
+                                          int iterations,
+                                          std::mt19937 &generator) {
+  const int count = centers.rows();
+  const int combinations = count * (count - 1) / 2;
+  const std::vector<double> thresholds(2, threshold);
+  std::uniform_int_distribution<int> distribution(0, combinations - 1);
+  std::set<int> tried;
+
+  TrackTriangulation best;
+  const int ransac_tries = 11;  // 0.99 proba, 60% inliers
+  for (int k = 0; k < ransac_tries; ++k) {
+    const int combination = distribution(generator);
+    if (!tried.insert(combination).second) {
+      continue;
+    }
+
+    // Combination index to pair (i, j) with i < j
+    int i = 0, remaining = combination;
+    while (remaining >= count - 1 - i) {
+      remaining -= count - 1 - i;
+      ++i;
+    }
+    const int j = i + 1 + remaining;
+
+    MatX3d centers_pair(2, 3), bearings_pair(2, 3);
+    centers_pair << centers.row(i), centers.row(j);
+    bearings_pair << bearings.row(i), bearings.row(j);
+    const auto triangulated = geometry::TriangulateBearingsMidpoint(
+        centers_pair, bearings_pair, thresholds, min_angle);
+    if (!triangulated.first) {
+      continue;
+    }
+    const Vec3d X = geometry::PointRefinement(centers_pair, bearings_pair,
+                                              triangulated.second, iterations);
+    const auto inliers = BearingInliers(centers, bearings, X, threshold);
+    if (inliers.size() <= best.inliers.size()) {
+      continue;
+    }
+
+    const Vec3d refined =
+        geometry::PointRefinement(SelectRows(centers, inliers),
+                                  SelectRows(bearings, inliers), X, iterations);
+    auto refined_inliers = BearingInliers(centers, bearings, refined, threshold);
+    if (refined_inliers.size() > inliers.size()) {
+      best.point = refined;
+      best.inliers = std::move(refined_inliers);
+    } else {
+      best.point = X;
+      best.inliers = inliers;
+    }
+
+    const double pout = 0.99;
+    const double inliers_ratio = double(best.inliers.size()) / count;
+    if (inliers_ratio == 1.0) {
+      break;
+    }
+    const double optimal_iter =
+        std::log(1.0 - pout) / std::log(1.0 - inliers_ratio * inliers_ratio);
+    if (optimal_iter <= k) {
+      break;
+    }
+  }
+  best.valid = best.inliers.size() > 1;
+  return best;
+}
+
+TrackTriangulation TriangulateTrackFull(const MatX3d &centers,
+                                        const MatX3d &bearings,
+                                        double threshold, double min_angle,
+                                        int iterations) {
+  const int count = centers.rows();
+  const std::vector<double> thresholds(count, threshold);
+  const auto triangulated = geometry::TriangulateBearingsMidpoint(
+      centers, bearings, thresholds, min_angle);
+
+  TrackTriangulation result;
+  if (!triangulated.first) {
+    return result;
+  }
+  result.valid = true;
+  result.point = geometry::PointRefinement(centers, bearings,
+                                           triangulated.second, iterations);
+  for (int i = 0; i < count; ++i) {
+    result.inliers.push_back(i);
+  }
+  return result;
+}
+
+}  // namespace
+
+namespace geometry {
+
+std::tuple<VecXi, MatX3d, VecXi> TriangulateBearingsMidpointBatch(
+    const MatX3d &centers, const MatX3d &bearings, const VecXi &offsets,
+    double threshold, double min_angle, int iterations, bool robust,
+    int num_threads) {
+  if (centers.rows() != bearings.rows()) {
+    throw std::runtime_error("Inconsistent number of centers and bearings");
+  }
+  const int num_tracks = std::max<int>(0, offsets.size() - 1);
+  VecXi valid = VecXi::Zero(num_tracks);
+  MatX3d points = MatX3d::Zero(num_tracks, 3);
+  VecXi inliers = VecXi::Zero(centers.rows());
+
+  // Threads process chunks of consecutive tracks, writing to distinct rows
+  const int chunk_size = 256;
+  std::atomic<int> next_chunk(0);
+  const auto worker = [&]() {
+    std::mt19937 generator;
+    for (int begin = next_chunk.fetch_add(chunk_size); begin < num_tracks;
+         begin = next_chunk.fetch_add(chunk_size)) {
+      const int end = std::min(begin + chunk_size, num_tracks);
+      for (int t = begin; t < end; ++t) {
+        const int start = offsets(t);
+        const int count = offsets(t + 1) - start;
+        if (count < 2) {
+          continue;
+        }
+        const MatX3d track_centers = centers.middleRows(start, count);
+        const MatX3d track_bearings = bearings.middleRows(start, count);
+
+        // Seed per track so that results don't depend on threads
+        generator.seed(t);
+        const auto triangulation =
+            robust ? TriangulateTrackRobust(track_centers, track_bearings,
+                                            threshold, min_angle, iterations,
+                                            generator)
+                   : TriangulateTrackFull(track_centers, track_bearings,
+                                          threshold, min_angle, iterations);
+        if (!triangulation.valid) {
+          continue;
+        }
+        valid(t) = 1;
+        points.row(t) = triangulation.point;
+        for (const int i : triangulation.inliers) {
+          inliers(start + i) = 1;
+        }
+      }
+    }
+  };
+
+  std::vector<std::thread> threads;
+  for (int i = 1; i < num_threads; ++i) {
+    threads.emplace_back(worker);
+  }
+  worker();
+  for (auto &thread : threads) {
+    thread.join();
+  }
+  return std::make_tuple(valid, points, inliers);
+}
+
 }  // namespace geometry
@@ -22,3 +22,46 @@ TEST(Point, IsRefined) {
     ASSERT_NEAR(expected(i), refined(i), 1e-6);
   }
 }
+
+TEST(Point, TriangulatesBatch) {
+  const Vec3d point(1., 2., 10.);
+  const int per_track = 4;
+
+  // Two tracks seeing the same point, and a single observation track
+  MatX3d centers(2 * per_track + 1, 3);
+  for (int i = 0; i < per_track; ++i) {
+    centers.row(i) << i, 0., 0.;
+    centers.row(per_track + i) << 0., i, 0.;
+  }
+  centers.row(2 * per_track) << 0., 0., 0.;
+  MatX3d bearings(centers.rows(), 3);
+  for (int i = 0; i < centers.rows(); ++i) {
+    bearings.row(i) = (point - centers.row(i).transpose()).normalized();
+  }
+  // Make one observation of the first track an outlier
+  bearings.row(1) << 0., 0., 1.;
+  VecXi offsets(4);
+  offsets << 0, per_track, 2 * per_track, 2 * per_track + 1;
+
+  for (const bool robust : {true, false}) {
+    const auto result = geometry::TriangulateBearingsMidpointBatch(
+        centers, bearings, offsets, 0.01, 0.01, 10, robust, 2);
+    const VecXi& valid = std::get<0>(result);
+    const MatX3d& points = std::get<1>(result);
+    const VecXi& inliers = std::get<2>(result);
+
+    ASSERT_EQ(1, valid(1));
+    ASSERT_EQ(0, valid(2));
+    for (int i = 0; i < 3; ++i) {
+      ASSERT_NEAR(point(i), points(1, i), 1e-6);
+    }
+    if (robust) {
+      ASSERT_EQ(1, valid(0));
+      ASSERT_EQ(0, inliers(1));
+      ASSERT_EQ(3, inliers.head(per_track).sum());
+      for (int i = 0; i < 3; ++i) {
+        ASSERT_NEAR(point(i), points(0, i), 1e-6);
+      }
+    }
+  }
+}
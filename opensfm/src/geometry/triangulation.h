@@ -9,6 +9,7 @@
 #include <fstream>
 #include <iostream>
 #include <string>
+#include <tuple>
 
 double AngleBetweenVectors(const Eigen::Vector3d &u, const Eigen::Vector3d &v);
 
@@ -103,4 +104,16 @@ EpipolarAngleTwoBearingsMany(
 Vec3d PointRefinement(const MatX3d &centers, const MatX3d &bearings,
                       const Vec3d &point, int iterations);
 
+// Triangulate many tracks at once with the midpoint method, followed by
+// point refinement. Observations of track t are the rows offsets(t) to
+// offsets(t + 1) - 1 of centers and (world-oriented) bearings. If robust,
+// each track is triangulated with RANSAC over pairs of observations,
+// otherwise with all of them. Tracks are split between num_threads threads.
+// Return, for each track, whether it is valid and its position, and for
+// each observation, whether it is an inlier of its track.
+std::tuple<VecXi, MatX3d, VecXi> TriangulateBearingsMidpointBatch(
+    const MatX3d &centers, const MatX3d &bearings, const VecXi &offsets,
+    double threshold, double min_angle, int iterations, bool robust,
+    int num_threads);
+
 }  // namespace geometry
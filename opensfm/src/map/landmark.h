@@ -39,7 +39,7 @@ class Landmark {
   // Reprojection Errors
   void SetReprojectionErrors(
       const std::map<ShotId, Eigen::VectorXd>& reproj_errors);
-  std::map<ShotId, Eigen::VectorXd> GetReprojectionErrors() const;
+  const std::map<ShotId, Eigen::VectorXd>& GetReprojectionErrors() const;
   void RemoveReprojectionError(const ShotId& shot_id);
 
  public:
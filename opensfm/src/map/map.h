@@ -15,6 +15,7 @@
 #include <map>
 #include <memory>
 #include <set>
+#include <tuple>
 #include <unordered_map>
 namespace map {
 
@@ -149,7 +150,22 @@ class Map {
   void AddObservation(const ShotId& shot_id, const LandmarkId& lm_id,
                       const Observation& obs);
   void RemoveObservation(const ShotId& shot_id, const LandmarkId& lm_id);
+  // Remove the observations (shot_ids[i], lm_ids[i]), then the landmarks
+  // left with less than min_observations. Return the number of removed
+  // landmarks.
+  size_t RemoveObservations(const std::vector<ShotId>& shot_ids,
+                            const std::vector<LandmarkId>& lm_ids,
+                            const size_t min_observations);
   void ClearObservationsAndLandmarks();
+
+  // Create the landmarks landmark_ids at positions, and add the observation
+  // i of shot_ids[i] and landmark_ids[landmark_indices[i]], as stored in
+  // the tracks manager.
+  void AddLandmarksFromTracks(const TracksManager& tracks_manager,
+                              const std::vector<LandmarkId>& landmark_ids,
+                              const MatX3d& positions,
+                              const std::vector<ShotId>& shot_ids,
+                              const VecXi& landmark_indices);
   void CleanLandmarksBelowMinObservations(const size_t min_observations);
 
   // Map information and access methods
@@ -194,6 +210,17 @@ class Map {
   std::unordered_map<ShotId, std::unordered_map<LandmarkId, Observation> >
   GetValidObservations(const TracksManager& tracks_manager) const;
 
+  // Reprojection errors stored in the landmarks as flat arrays : landmark
+  // ids, shot ids, and for each error, the index of its landmark, the index
+  // of its shot and its residual. Residuals are zero-padded to the largest
+  // residual size (at least 2).
+  using ReprojectionErrorArrays =
+      std::tuple<std::vector<LandmarkId>, std::vector<ShotId>, VecXi, VecXi,
+                 MatXd>;
+  ReprojectionErrorArrays GetReprojectionErrorArrays() const;
+  ReprojectionErrorArrays GetReprojectionErrorArrays(
+      const std::vector<LandmarkId>& lm_ids) const;
+
  private:
   void UpdateShotWithRig(const Shot& other_shot);
 
@@ -130,6 +130,7 @@ class LandmarkView:
     def values(self) -> Iterator: ...
 class Map:
     def __init__(self) -> None: ...
+    def add_landmarks_from_tracks(self, tracks_manager: TracksManager, landmark_ids: List[str], positions: numpy.ndarray, shot_ids: List[str], landmark_indices: numpy.ndarray) -> None: ...
     @overload
     def add_observation(self, shot: Shot, landmark: Landmark, observation: Observation) -> None: ...
     @overload
@@ -157,6 +158,10 @@ class Map:
     def get_pano_shot(self, arg0: str) -> Shot: ...
     def get_pano_shots(self) -> PanoShotView: ...
     def get_reference(self) -> opensfm.pygeo.TopocentricConverter: ...
+    @overload
+    def get_reprojection_error_arrays(self) -> Tuple[List[str], List[str], numpy.ndarray, numpy.ndarray, numpy.ndarray]: ...
+    @overload
+    def get_reprojection_error_arrays(self, landmark_ids: List[str]) -> Tuple[List[str], List[str], numpy.ndarray, numpy.ndarray, numpy.ndarray]: ...
     def get_shot(self, arg0: str) -> Shot: ...
     def get_shots(self) -> ShotView: ...
     def get_valid_observations(self, arg0: TracksManager) -> Dict[str, Dict[str, Observation]]: ...
@@ -166,6 +171,7 @@ class Map:
     @overload
     def remove_landmark(self, arg0: str) -> None: ...
     def remove_observation(self, shot: str, landmark: str) -> None: ...
+    def remove_observations(self, shot_ids: List[str], landmark_ids: List[str], min_observations: int = 0) -> int: ...
     def remove_pano_shot(self, arg0: str) -> None: ...
     def remove_rig_instance(self, arg0: str) -> None: ...
     def remove_shot(self, arg0: str) -> None: ...
@@ -435,6 +441,10 @@ class ShotView:
 class TracksManager:
     def __init__(self) -> None: ...
     def add_observation(self, arg0: str, arg1: str, arg2: Observation) -> None: ...
+    @overload
+    def add_shot_observations(self, arg0: str, arg1: numpy.ndarray, arg2: numpy.ndarray, arg3: numpy.ndarray, arg4: numpy.ndarray, arg5: numpy.ndarray, arg6: numpy.ndarray) -> None: ...
+    @overload
+    def add_shot_observations(self, arg0: str, arg1: List[str], arg2: numpy.ndarray, arg3: numpy.ndarray, arg4: numpy.ndarray, arg5: numpy.ndarray, arg6: numpy.ndarray) -> None: ...
     def as_string(self) -> str: ...
     def construct_sub_tracks_manager(self, arg0: List[str], arg1: List[str]) -> TracksManager: ...
     def get_all_common_observations(self, arg0: str, arg1: str) -> List[Tuple[str, Observation, Observation]]: ...
@@ -442,6 +452,7 @@ class TracksManager:
     def get_observation(self, arg0: str, arg1: str) -> Observation: ...
     def get_shot_ids(self) -> List[str]: ...
     def get_shot_observations(self, arg0: str) -> Dict[str, Observation]: ...
+    def get_shot_observations_arrays(self, arg0: str) -> Tuple[List[str], numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]: ...
     def get_track_ids(self) -> List[str]: ...
     def get_track_observations(self, arg0: str) -> Dict[str, Observation]: ...
     @staticmethod
@@ -272,6 +272,23 @@ PYBIND11_MODULE(pymap, m) {
       .def_static("merge_tracks_manager",
                   &map::TracksManager::MergeTracksManager)
       .def("add_observation", &map::TracksManager::AddObservation)
+      .def("add_shot_observations",
+           py::overload_cast<const map::ShotId &, const Eigen::VectorXi &,
+                             const MatX3d &, const MatX3i &,
+                             const Eigen::VectorXi &, const Eigen::VectorXi &,
+                             const Eigen::VectorXi &>(
+               &map::TracksManager::AddShotObservations),
+           py::call_guard<py::gil_scoped_release>())
+      .def("add_shot_observations",
+           py::overload_cast<const map::ShotId &,
+                             const std::vector<map::TrackId> &, const MatX3d &,
+                             const MatX3i &, const Eigen::VectorXi &,
+                             const Eigen::VectorXi &, const Eigen::VectorXi &>(
+               &map::TracksManager::AddShotObservations),
+           py::call_guard<py::gil_scoped_release>())
+      .def("get_shot_observations_arrays",
+           &map::TracksManager::GetShotObservationArrays,
+           py::call_guard<py::gil_scoped_release>())
       .def("remove_observation", &map::TracksManager::RemoveObservation)
       .def("num_shots", &map::TracksManager::NumShots)
       .def("num_tracks", &map::TracksManager::NumTracks)
@@ -640,6 +657,15 @@ PYBIND11_MODULE(pymap, m) {
            (void (map::Map::*)(const map::ShotId &, const map::LandmarkId &)) &
                map::Map::RemoveObservation,
            py::arg("shot"), py::arg("landmark"))
+      .def("remove_observations", &map::Map::RemoveObservations,
+           py::arg("shot_ids"), py::arg("landmark_ids"),
+           py::arg("min_observations") = 0,
+           py::call_guard<py::gil_scoped_release>())
+      .def("add_landmarks_from_tracks", &map::Map::AddLandmarksFromTracks,
+           py::arg("tracks_manager"), py::arg("landmark_ids"),
+           py::arg("positions"), py::arg("shot_ids"),
+           py::arg("landmark_indices"),
+           py::call_guard<py::gil_scoped_release>())
       // Getters
       .def("get_shots", &map::Map::GetShotView)
       .def("get_pano_shots", &map::Map::GetPanoShotView)
@@ -657,6 +683,14 @@ PYBIND11_MODULE(pymap, m) {
            })
       // Tracks manager x Reconstruction intersection
       .def("compute_reprojection_errors", &map::Map::ComputeReprojectionErrors)
+      .def("get_reprojection_error_arrays",
+           py::overload_cast<>(&map::Map::GetReprojectionErrorArrays,
+                               py::const_),
+           py::call_guard<py::gil_scoped_release>())
+      .def("get_reprojection_error_arrays",
+           py::overload_cast<const std::vector<map::LandmarkId> &>(
+               &map::Map::GetReprojectionErrorArrays, py::const_),
+           py::arg("landmark_ids"), py::call_guard<py::gil_scoped_release>())
       .def("get_valid_observations", &map::Map::GetValidObservations)
       .def("to_tracks_manager", &map::Map::ToTracksManager);
 }
@@ -35,7 +35,8 @@ const std::map<Shot*, FeatureId, KeyCompare>& Landmark::GetObservations()
   return observations_;
 }
 
-std::map<ShotId, Eigen::VectorXd> Landmark::GetReprojectionErrors() const {
+const std::map<ShotId, Eigen::VectorXd>& Landmark::GetReprojectionErrors()
+    const {
   return reproj_errors_;
 }
 void Landmark::RemoveReprojectionError(const ShotId& shot_id) {
@@ -5,10 +5,53 @@
 #include <map/rig.h>
 #include <map/shot.h>
 
+#include <algorithm>
 #include <cmath>
 #include <stdexcept>
 #include <unordered_set>
 
+namespace {
+map::Map::ReprojectionErrorArrays ReprojectionErrorArrays(
+    const std::vector<const map::Landmark*>& landmarks) {
+  int num_errors = 0;
+  int residual_size = 2;
+  for (const auto lm : landmarks) {
+    for (const auto& shot_n_error : lm->GetReprojectionErrors()) {
+      residual_size =
+          std::max<int>(residual_size, shot_n_error.second.size());
+      ++num_errors;
+    }
+  }
+
+  std::vector<map::LandmarkId> lm_ids;
+  std::vector<map::ShotId> shot_ids;
+  std::unordered_map<map::ShotId, int> shot_indexes;
+  VecXi lm_index(num_errors);
+  VecXi shot_index(num_errors);
+  MatXd residuals = MatXd::Zero(num_errors, residual_size);
+
+  lm_ids.reserve(landmarks.size());
+  int i = 0;
+  for (const auto lm : landmarks) {
+    const int current_lm = lm_ids.size();
+    lm_ids.push_back(lm->id_);
+    for (const auto& shot_n_error : lm->GetReprojectionErrors()) {
+      const auto inserted =
+          shot_indexes.emplace(shot_n_error.first, shot_ids.size());
+      if (inserted.second) {
+        shot_ids.push_back(shot_n_error.first);
+      }
+      lm_index(i) = current_lm;
+      shot_index(i) = inserted.first->second;
+      const auto& error = shot_n_error.second;
+      residuals.row(i).head(error.size()) = error.transpose();
+      ++i;
+    }
+  }
+  return std::make_tuple(lm_ids, shot_ids, lm_index, shot_index, residuals);
+}
+}  // namespace
+
 namespace {
 void AssignShot(map::Shot& to, const map::Shot& from) {
   to.merge_cc = from.merge_cc;
@@ -39,6 +82,63 @@ void Map::RemoveObservation(const ShotId& shot_id, const LandmarkId& lm_id) {
   lm.RemoveObservation(&shot);
 }
 
+void Map::AddLandmarksFromTracks(const TracksManager& tracks_manager,
+                                 const std::vector<LandmarkId>& landmark_ids,
+                                 const MatX3d& positions,
+                                 const std::vector<ShotId>& shot_ids,
+                                 const VecXi& landmark_indices) {
+  if (positions.rows() != landmark_ids.size()) {
+    throw std::runtime_error("Inconsistent number of landmarks and positions");
+  }
+  if (landmark_indices.size() != shot_ids.size()) {
+    throw std::runtime_error("Inconsistent number of observations");
+  }
+
+  std::vector<Landmark*> landmarks;
+  landmarks.reserve(landmark_ids.size());
+  for (int i = 0; i < landmark_ids.size(); ++i) {
+    landmarks.push_back(
+        &CreateLandmark(landmark_ids[i], positions.row(i).transpose()));
+  }
+
+  // Consecutive observations usually belong to the same shot
+  Shot* shot = nullptr;
+  for (int i = 0; i < shot_ids.size(); ++i) {
+    if (shot == nullptr || shot->id_ != shot_ids[i]) {
+      shot = &GetShot(shot_ids[i]);
+    }
+    const int index = landmark_indices(i);
+    if (index < 0 || index >= landmarks.size()) {
+      throw std::runtime_error("Invalid landmark index");
+    }
+    AddObservation(shot, landmarks[index],
+                   tracks_manager.GetObservation(shot_ids[i],
+                                                 landmark_ids[index]));
+  }
+}
+
+size_t Map::RemoveObservations(const std::vector<ShotId>& shot_ids,
+                               const std::vector<LandmarkId>& lm_ids,
+                               const size_t min_observations) {
+  if (shot_ids.size() != lm_ids.size()) {
+    throw std::runtime_error("Inconsistent number of shots and landmarks");
+  }
+  std::unordered_set<LandmarkId> touched;
+  for (int i = 0; i < shot_ids.size(); ++i) {
+    RemoveObservation(shot_ids[i], lm_ids[i]);
+    touched.insert(lm_ids[i]);
+  }
+
+  size_t removed = 0;
+  for (const auto& lm_id : touched) {
+    if (GetLandmark(lm_id).NumberOfObservations() < min_observations) {
+      RemoveLandmark(lm_id);
+      ++removed;
+    }
+  }
+  return removed;
+}
+
 const Shot& Map::GetShot(const ShotId& shot_id) const {
   const auto& it = shots_.find(shot_id);
   if (it == shots_.end()) {
@@ -497,6 +597,28 @@ Map::ComputeReprojectionErrors(const TracksManager& tracks_manager,
   return errors;
 }
 
+Map::ReprojectionErrorArrays Map::GetReprojectionErrorArrays() const {
+  std::vector<const Landmark*> landmarks;
+  landmarks.reserve(landmarks_.size());
+  for (const auto& lm : landmarks_) {
+    landmarks.push_back(&lm.second);
+  }
+  return ReprojectionErrorArrays(landmarks);
+}
+
+Map::ReprojectionErrorArrays Map::GetReprojectionErrorArrays(
+    const std::vector<LandmarkId>& lm_ids) const {
+  std::vector<const Landmark*> landmarks;
+  landmarks.reserve(lm_ids.size());
+  for (const auto& lm_id : lm_ids) {
+    const auto find_landmark = landmarks_.find(lm_id);
+    if (find_landmark != landmarks_.end()) {
+      landmarks.push_back(&find_landmark->second);
+    }
+  }
+  return ReprojectionErrorArrays(landmarks);
+}
+
 std::unordered_map<ShotId, std::unordered_map<LandmarkId, Observation> >
 Map::GetValidObservations(const TracksManager& tracks_manager) const {
   std::unordered_map<ShotId, std::unordered_map<LandmarkId, Observation> >
@@ -189,6 +189,83 @@ void TracksManager::AddObservation(const ShotId& shot_id,
   shots_per_track_[track_id][shot_id] = observation;
 }
 
+template <class TrackIdAt>
+void TracksManager::AddShotObservationsT(
+    const ShotId& shot_id, int count, const TrackIdAt& track_id_at,
+    const MatX3d& points, const MatX3i& colors,
+    const Eigen::VectorXi& feature_ids, const Eigen::VectorXi& segmentations,
+    const Eigen::VectorXi& instances) {
+  if (points.rows() != count || colors.rows() != count ||
+      feature_ids.size() != count || segmentations.size() != count ||
+      instances.size() != count) {
+    throw std::runtime_error("Inconsistent number of observations");
+  }
+
+  auto& shot_observations = tracks_per_shot_[shot_id];
+  shot_observations.reserve(shot_observations.size() + count);
+  for (int i = 0; i < count; ++i) {
+    const Observation observation(
+        points(i, 0), points(i, 1), points(i, 2), colors(i, 0), colors(i, 1),
+        colors(i, 2), feature_ids(i), segmentations(i), instances(i));
+    const TrackId track_id = track_id_at(i);
+    shot_observations[track_id] = observation;
+    shots_per_track_[track_id][shot_id] = observation;
+  }
+}
+
+void TracksManager::AddShotObservations(const ShotId& shot_id,
+                                        const Eigen::VectorXi& track_ids,
+                                        const MatX3d& points,
+                                        const MatX3i& colors,
+                                        const Eigen::VectorXi& feature_ids,
+                                        const Eigen::VectorXi& segmentations,
+                                        const Eigen::VectorXi& instances) {
+  AddShotObservationsT(
+      shot_id, track_ids.size(),
+      [&track_ids](int i) { return std::to_string(track_ids(i)); }, points,
+      colors, feature_ids, segmentations, instances);
+}
+
+void TracksManager::AddShotObservations(const ShotId& shot_id,
+                                        const std::vector<TrackId>& track_ids,
+                                        const MatX3d& points,
+                                        const MatX3i& colors,
+                                        const Eigen::VectorXi& feature_ids,
+                                        const Eigen::VectorXi& segmentations,
+                                        const Eigen::VectorXi& instances) {
+  AddShotObservationsT(
+      shot_id, track_ids.size(), [&track_ids](int i) { return track_ids[i]; },
+      points, colors, feature_ids, segmentations, instances);
+}
+
+TracksManager::ShotObservationArrays TracksManager::GetShotObservationArrays(
+    const ShotId& shot_id) const {
+  const auto& observations = GetShotObservations(shot_id);
+  const int count = observations.size();
+
+  std::vector<TrackId> track_ids;
+  track_ids.reserve(count);
+  MatX3d points(count, 3);
+  MatX3i colors(count, 3);
+  Eigen::VectorXi feature_ids(count);
+  Eigen::VectorXi segmentations(count);
+  Eigen::VectorXi instances(count);
+  int i = 0;
+  for (const auto& track_observation : observations) {
+    const auto& observation = track_observation.second;
+    track_ids.push_back(track_observation.first);
+    points.row(i) << observation.point(0), observation.point(1),
+        observation.scale;
+    colors.row(i) = observation.color.transpose();
+    feature_ids(i) = observation.feature_id;
+    segmentations(i) = observation.segmentation_id;
+    instances(i) = observation.instance_id;
+    ++i;
+  }
+  return std::make_tuple(track_ids, points, colors, feature_ids,
+                         segmentations, instances);
+}
+
 void TracksManager::RemoveObservation(const ShotId& shot_id,
                                       const TrackId& track_id) {
   const auto find_shot = tracks_per_shot_.find(shot_id);
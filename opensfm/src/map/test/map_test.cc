@@ -358,4 +358,57 @@ TEST_F(ToyMapFixture, ToTracksManager) {
   }
 }
 
+TEST_F(ToyMapFixture, AddLandmarksFromTracks) {
+  map::TracksManager manager;
+  manager.AddObservation("0", "a",
+                         map::Observation(100, 200, 0.5, 255, 255, 255, 1));
+  manager.AddObservation("1", "a",
+                         map::Observation(110, 210, 0.5, 255, 255, 255, 2));
+  manager.AddObservation("1", "b",
+                         map::Observation(120, 220, 0.5, 255, 255, 255, 3));
+
+  MatX3d positions(2, 3);
+  positions << 1, 2, 3, 4, 5, 6;
+  VecXi landmark_indices(2);
+  landmark_indices << 0, 0;
+  map.AddLandmarksFromTracks(manager, {"a", "b"}, positions, {"0", "1"},
+                             landmark_indices);
+
+  ASSERT_EQ(map.NumberOfLandmarks(), num_points + 2);
+  ASSERT_EQ(map.GetLandmark("a").GetGlobalPos(), Vec3d(1, 2, 3));
+  ASSERT_EQ(map.GetLandmark("b").GetGlobalPos(), Vec3d(4, 5, 6));
+  ASSERT_EQ(map.GetLandmark("a").NumberOfObservations(), 2);
+  ASSERT_EQ(map.GetLandmark("b").NumberOfObservations(), 0);
+  ASSERT_EQ(*map.GetShot("1").GetLandmarkObservation(&map.GetLandmark("a")),
+            manager.GetObservation("1", "a"));
+}
+
+TEST_F(ToyMapFixture, ReprojectionErrorArraysAndRemoveObservations) {
+  auto& lm = map.GetLandmark("0");
+  for (const auto& shot_id : {"0", "1", "2"}) {
+    map.AddObservation(shot_id, "0",
+                       map::Observation(100, 200, 0.5, 255, 255, 255, 0));
+  }
+  Eigen::VectorXd error2(2), error3(3);
+  error2 << 1, 2;
+  error3 << 3, 4, 5;
+  lm.SetReprojectionErrors({{"0", error2}, {"1", error3}});
+
+  const auto arrays = map.GetReprojectionErrorArrays({"0", "missing"});
+  ASSERT_EQ(std::get<0>(arrays), std::vector<map::LandmarkId>({"0"}));
+  ASSERT_EQ(std::get<1>(arrays), std::vector<map::ShotId>({"0", "1"}));
+  ASSERT_EQ(std::get<2>(arrays), Eigen::Vector2i(0, 0));
+  ASSERT_EQ(std::get<3>(arrays), Eigen::Vector2i(0, 1));
+  MatXd expected(2, 3);
+  expected << 1, 2, 0, 3, 4, 5;
+  ASSERT_EQ(std::get<4>(arrays), expected);
+  ASSERT_EQ(std::get<2>(map.GetReprojectionErrorArrays()).size(), 2);
+
+  ASSERT_EQ(map.RemoveObservations({"0"}, {"0"}, 2), 0);
+  ASSERT_EQ(map.GetLandmark("0").NumberOfObservations(), 2);
+  ASSERT_EQ(map.GetLandmark("0").GetReprojectionErrors().size(), 1);
+  ASSERT_EQ(map.RemoveObservations({"1"}, {"0"}, 2), 1);
+  ASSERT_FALSE(map.HasLandmark("0"));
+}
+
 }  // namespace
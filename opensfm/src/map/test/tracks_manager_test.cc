@@ -60,6 +60,41 @@ TEST_F(TracksManagerTest, AddsObservation) {
   EXPECT_EQ(manager.GetObservation("4", "1"), obs);
 }
 
+TEST_F(TracksManagerTest, AddsShotObservations) {
+  Eigen::VectorXi track_ids(2);
+  track_ids << 1, 2;
+  MatX3d points(2, 3);
+  points << 4.0, 4.0, 4.0, 5.0, 5.0, 5.0;
+  MatX3i colors(2, 3);
+  colors << 4, 4, 4, 5, 5, 5;
+  Eigen::VectorXi feature_ids(2);
+  feature_ids << 4, 5;
+  Eigen::VectorXi semantics(2);
+  semantics << map::Observation::NO_SEMANTIC_VALUE,
+      map::Observation::NO_SEMANTIC_VALUE;
+
+  manager.AddShotObservations("4", track_ids, points, colors, feature_ids,
+                              semantics, semantics);
+  EXPECT_EQ(manager.GetObservation("4", "1"),
+            map::Observation(4.0, 4.0, 4.0, 4, 4, 4, 4));
+  EXPECT_EQ(manager.GetObservation("4", "2"),
+            map::Observation(5.0, 5.0, 5.0, 5, 5, 5, 5));
+  EXPECT_EQ(manager.GetTrackObservations("1").size(), 4);
+}
+
+TEST_F(TracksManagerTest, RoundtripsShotObservationArrays) {
+  const auto arrays = manager.GetShotObservationArrays("1");
+  const auto& track_ids = std::get<0>(arrays);
+  ASSERT_EQ(track_ids.size(), 1);
+  EXPECT_EQ(track_ids[0], "1");
+
+  map::TracksManager copy;
+  copy.AddShotObservations("1", track_ids, std::get<1>(arrays),
+                           std::get<2>(arrays), std::get<3>(arrays),
+                           std::get<4>(arrays), std::get<5>(arrays));
+  EXPECT_EQ(copy.GetShotObservations("1"), manager.GetShotObservations("1"));
+}
+
 TEST_F(TracksManagerTest, RemoveObservation) {
   manager.RemoveObservation("3", "1");
   auto copy = track;
@@ -1,10 +1,12 @@
 #pragma once
 
+#include <foundation/types.h>
 #include <map/defines.h>
 #include <map/observation.h>
 
 #include <fstream>
 #include <map>
+#include <tuple>
 #include <unordered_map>
 #include <vector>
 
@@ -13,6 +15,28 @@ class TracksManager {
  public:
   void AddObservation(const ShotId& shot_id, const TrackId& track_id,
                       const Observation& observation);
+  // Add all observations of a shot at once. Row i of each array holds
+  // observation i, whose track id is the string of track_ids(i).
+  void AddShotObservations(const ShotId& shot_id,
+                           const Eigen::VectorXi& track_ids,
+                           const MatX3d& points, const MatX3i& colors,
+                           const Eigen::VectorXi& feature_ids,
+                           const Eigen::VectorXi& segmentations,
+                           const Eigen::VectorXi& instances);
+  void AddShotObservations(const ShotId& shot_id,
+                           const std::vector<TrackId>& track_ids,
+                           const MatX3d& points, const MatX3i& colors,
+                           const Eigen::VectorXi& feature_ids,
+                           const Eigen::VectorXi& segmentations,
+                           const Eigen::VectorXi& instances);
+
+  // All observations of a shot as arrays, in the layout used by
+  // AddShotObservations : track ids, (x, y, scale), colors, feature ids,
+  // segmentations and instances.
+  using ShotObservationArrays =
+      std::tuple<std::vector<TrackId>, MatX3d, MatX3i, Eigen::VectorXi,
+                 Eigen::VectorXi, Eigen::VectorXi>;
+  ShotObservationArrays GetShotObservationArrays(const ShotId& shot_id) const;
   void RemoveObservation(const ShotId& shot_id, const TrackId& track_id);
   Observation GetObservation(const ShotId& shot, const TrackId& track) const;
 
@@ -54,6 +78,14 @@ class TracksManager {
   static int TRACKS_VERSION;
 
  private:
+  template <class TrackIdAt>
+  void AddShotObservationsT(const ShotId& shot_id, int count,
+                            const TrackIdAt& track_id_at, const MatX3d& points,
+                            const MatX3i& colors,
+                            const Eigen::VectorXi& feature_ids,
+                            const Eigen::VectorXi& segmentations,
+                            const Eigen::VectorXi& instances);
+
   std::unordered_map<ShotId, std::unordered_map<TrackId, Observation>>
       tracks_per_shot_;
   std::unordered_map<TrackId, std::unordered_map<ShotId, Observation>>
@@ -4,6 +4,7 @@
 #include <map/map.h>
 #include <pybind11/pybind11.h>
 
+#include <chrono>
 #include <unordered_map>
 #include <unordered_set>
 
@@ -28,6 +29,16 @@ class BAHelpers {
       const AlignedVector<map::GroundControlPoint>& gcp,
       const map::ShotId& central_shot_id, const py::dict& config);
 
+  // Bundle adjust the given shots and their points, with the other shots
+  // observing these points fixed
+  static py::tuple BundleShots(
+      map::Map& map,
+      const std::unordered_map<map::CameraId, geometry::Camera>& camera_priors,
+      const std::unordered_map<map::RigCameraId, map::RigCamera>&
+          rig_camera_priors,
+      const AlignedVector<map::GroundControlPoint>& gcp,
+      const std::unordered_set<map::ShotId>& shot_ids, const py::dict& config);
+
   static py::dict BundleShotPoses(
       map::Map& map, const std::unordered_set<map::ShotId>& shot_ids,
       const std::unordered_map<map::CameraId, geometry::Camera>& camera_priors,
@@ -58,6 +69,15 @@ class BAHelpers {
       const py::dict& config);
 
  private:
+  static py::tuple BundleInterior(
+      map::Map& map,
+      const std::unordered_map<map::CameraId, geometry::Camera>& camera_priors,
+      const std::unordered_map<map::RigCameraId, map::RigCamera>&
+          rig_camera_priors,
+      const AlignedVector<map::GroundControlPoint>& gcp,
+      const std::unordered_set<map::Shot*>& interior,
+      const std::unordered_set<map::Shot*>& boundary, const py::dict& config,
+      const std::chrono::high_resolution_clock::time_point& start);
   static std::unordered_set<map::Shot*> DirectShotNeighbors(
       map::Map& map, const std::unordered_set<map::Shot*>& shot_ids,
       const size_t min_common_points, const size_t max_neighbors);
@@ -16,6 +16,9 @@ PYBIND11_MODULE(pysfm, m) {
   py::module::import("opensfm.pybundle");
 
   m.def("count_tracks_per_shot", &sfm::tracks_helpers::CountTracksPerShot);
+  m.def("count_observations_per_shot",
+        &sfm::tracks_helpers::CountObservationsPerShot,
+        py::call_guard<py::gil_scoped_release>());
   m.def("add_connections", &sfm::tracks_helpers::AddConnections,
         py::call_guard<py::gil_scoped_release>());
   m.def("remove_connections", &sfm::tracks_helpers::RemoveConnections,
@@ -24,6 +27,7 @@ PYBIND11_MODULE(pysfm, m) {
   py::class_<sfm::BAHelpers>(m, "BAHelpers")
       .def_static("bundle", &sfm::BAHelpers::Bundle)
       .def_static("bundle_local", &sfm::BAHelpers::BundleLocal)
+      .def_static("bundle_shots", &sfm::BAHelpers::BundleShots)
       .def_static("bundle_shot_poses", &sfm::BAHelpers::BundleShotPoses)
       .def_static("bundle_to_map", &sfm::BAHelpers::BundleToMap)
       .def_static("shot_neighborhood_ids", &sfm::BAHelpers::ShotNeighborhoodIds)
@@ -119,14 +119,48 @@ py::tuple BAHelpers::BundleLocal(
         rig_camera_priors,
     const AlignedVector<map::GroundControlPoint>& gcp,
     const map::ShotId& central_shot_id, const py::dict& config) {
-  py::dict report;
   const auto start = std::chrono::high_resolution_clock::now();
   auto neighborhood = ShotNeighborhood(
       map, central_shot_id, config["local_bundle_radius"].cast<size_t>(),
       config["local_bundle_min_common_points"].cast<size_t>(),
       config["local_bundle_max_shots"].cast<size_t>());
-  auto& interior = neighborhood.first;
-  auto& boundary = neighborhood.second;
+  return BundleInterior(map, camera_priors, rig_camera_priors, gcp,
+                        neighborhood.first, neighborhood.second, config, start);
+}
+
+py::tuple BAHelpers::BundleShots(
+    map::Map& map,
+    const std::unordered_map<map::CameraId, geometry::Camera>& camera_priors,
+    const std::unordered_map<map::RigCameraId, map::RigCamera>&
+        rig_camera_priors,
+    const AlignedVector<map::GroundControlPoint>& gcp,
+    const std::unordered_set<map::ShotId>& shot_ids, const py::dict& config) {
+  const auto start = std::chrono::high_resolution_clock::now();
+  constexpr size_t MaxBoundarySize{1000000};
+  std::unordered_set<map::Shot*> interior;
+  for (const auto& shot_id : shot_ids) {
+    // Rig instances move as a whole
+    const auto& shot = map.GetShot(shot_id);
+    for (const auto& s :
+         map.GetRigInstance(shot.GetRigInstanceId()).GetShotIDs()) {
+      interior.insert(&map.GetShot(s));
+    }
+  }
+  const auto boundary = DirectShotNeighbors(map, interior, 1, MaxBoundarySize);
+  return BundleInterior(map, camera_priors, rig_camera_priors, gcp, interior,
+                        boundary, config, start);
+}
+
+py::tuple BAHelpers::BundleInterior(
+    map::Map& map,
+    const std::unordered_map<map::CameraId, geometry::Camera>& camera_priors,
+    const std::unordered_map<map::RigCameraId, map::RigCamera>&
+        rig_camera_priors,
+    const AlignedVector<map::GroundControlPoint>& gcp,
+    const std::unordered_set<map::Shot*>& interior,
+    const std::unordered_set<map::Shot*>& boundary, const py::dict& config,
+    const std::chrono::high_resolution_clock::time_point& start) {
+  py::dict report;
 
   // set up BA
   auto ba = bundle::BundleAdjuster();
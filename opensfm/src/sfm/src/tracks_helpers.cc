@@ -29,6 +29,18 @@ std::unordered_map<map::ShotId, int> CountTracksPerShot(
   return counts;
 }
 
+std::unordered_map<map::ShotId, int> CountObservationsPerShot(
+    const map::TracksManager& manager,
+    const std::vector<map::TrackId>& tracks) {
+  std::unordered_map<map::ShotId, int> counts;
+  for (const auto& track : tracks) {
+    for (const auto& shot_n_obs : manager.GetTrackObservations(track)) {
+      ++counts[shot_n_obs.first];
+    }
+  }
+  return counts;
+}
+
 void AddConnections(map::TracksManager& manager, const map::ShotId& shot_id,
                     const std::vector<map::TrackId>& connections) {
   map::Observation observation;
@@ -40,6 +40,16 @@ TEST_F(TracksHelpersTest, CountTracksPerShot) {
   EXPECT_EQ(1, counts.at("3"));
 }
 
+TEST_F(TracksHelpersTest, CountObservationsPerShot) {
+  manager.AddObservation("1", "2", map::Observation());
+  const auto counts =
+      sfm::tracks_helpers::CountObservationsPerShot(manager, {"1", "2"});
+
+  EXPECT_EQ(2, counts.at("1"));
+  EXPECT_EQ(1, counts.at("2"));
+  EXPECT_EQ(1, counts.at("3"));
+}
+
 TEST_F(TracksHelpersTest, AddConnections) {
   sfm::tracks_helpers::AddConnections(manager, "1", connections_add);
   sfm::tracks_helpers::AddConnections(manager, "2", connections_add);
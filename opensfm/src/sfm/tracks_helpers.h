@@ -14,6 +14,9 @@ namespace tracks_helpers {
 std::unordered_map<map::ShotId, int> CountTracksPerShot(
     const map::TracksManager& manager, const std::vector<map::ShotId>& shots,
     const std::vector<map::TrackId>& tracks);
+// Number of observations of the given tracks in each shot that sees them
+std::unordered_map<map::ShotId, int> CountObservationsPerShot(
+    const map::TracksManager& manager, const std::vector<map::TrackId>& tracks);
 void AddConnections(map::TracksManager& manager, const map::ShotId& shot_id,
                     const std::vector<map::TrackId>& connections);
 void RemoveConnections(map::TracksManager& manager, const map::ShotId& shot_id,
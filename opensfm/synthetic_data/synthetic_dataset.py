@@ -180,11 +180,17 @@ class SyntheticDataSet(DataSet):
         return matches
 
     def load_tracks_manager(
-        self, filename: Optional[str] = None
+        self, filename: Optional[str] = None, images: Optional[List[str]] = None
     ) -> pymap.TracksManager:
         tracks_mgr = self.tracks_manager
         if not tracks_mgr:
             raise RuntimeError("No tracks manager for the synthetic dataset")
+        if images is not None:
+            images = set(images)
+            return tracks_mgr.construct_sub_tracks_manager(
+                tracks_mgr.get_track_ids(),
+                [s for s in tracks_mgr.get_shot_ids() if s in images],
+            )
         return tracks_mgr
 
     def init_reference(self, images: Optional[List[str]] = None) -> None:
@@ -0,0 +1,40 @@
+import pytest
+from opensfm import context
+
+
+def _scaled_sum(args):
+    value, offset, scale = args
+    return (value + offset) * scale
+
+
+@pytest.mark.parametrize("backend", ["threading", "processes"])
+def test_parallel_map_shared_args(backend) -> None:
+    args = [(i,) for i in range(20)]
+    res = context.parallel_map(
+        _scaled_sum, args, 4, backend=backend, shared_args=(1, 2)
+    )
+    assert res == [(i + 1) * 2 for i in range(20)]
+
+
+@pytest.mark.parametrize("backend", ["threading", "processes"])
+def test_parallel_map_no_shared_args(backend) -> None:
+    args = [(i, 1, 2) for i in range(20)]
+    res = context.parallel_map(_scaled_sum, args, 4, backend=backend)
+    assert res == [(i + 1) * 2 for i in range(20)]
+
+
+def test_parallel_map_invalid_backend() -> None:
+    with pytest.raises(ValueError):
+        context.parallel_map(_scaled_sum, [(0, 1, 2)], 1, backend="mpi")
+
+
+def _num_process_workers(args):
+    return context.num_process_workers()
+
+
+def test_num_process_workers() -> None:
+    args = [(i,) for i in range(8)]
+    res = context.parallel_map(_num_process_workers, args, 4, backend="processes")
+    assert res == [4] * 8
+    res = context.parallel_map(_num_process_workers, args, 4, backend="threading")
+    assert res == [1] * 8
@@ -1,5 +1,6 @@
 import numpy as np
-from opensfm import features
+import pytest
+from opensfm import dataset, features, pymap
 from opensfm.test import data_generation
 
 
@@ -34,3 +35,129 @@ def test_dataset_load_features_sift(tmpdir) -> None:
         semantic.segmentation,
     )
     assert np.allclose(instances, semantic.instances)
+
+
+def test_dataset_binary_matches(tmpdir) -> None:
+    data = data_generation.create_berlin_test_folder(tmpdir)
+    im1, im2, im3 = data.images()
+
+    data.save_matches(im1, {im2: np.array([[0, 1], [2, 3]]), im3: np.array([])})
+    data.save_matches(im2, {im3: np.array([[4, 5]])})
+    data.config["matches_format"] = "binary"
+    assert data.convert_matches_to_binary() == 2
+
+    assert data.matches_exists(im1)
+    assert not data.matches_exists(im3)
+    im1_matches = data.load_matches(im1)
+    assert np.array_equal(im1_matches[im2], [[0, 1], [2, 3]])
+    assert len(im1_matches[im3]) == 0
+    assert np.array_equal(data.find_matches(im3, im2), [[5, 4]])
+
+    # Saving again replaces previous matches without rewriting them
+    data.save_matches(im1, {im3: np.array([[6, 7]])})
+    assert list(data.load_matches(im1)) == [im3]
+    assert len(data.find_matches(im1, im2)) == 0
+
+    # A new dataset object reads back the same index
+    reloaded = dataset.DataSet(data.data_path)
+    reloaded.config["matches_format"] = "binary"
+    assert np.array_equal(reloaded.find_matches(im1, im3), [[6, 7]])
+
+
+def _shot_observations(tracks_manager, shot_id):
+    return {
+        track_id: (
+            tuple(obs.point),
+            obs.scale,
+            tuple(obs.color),
+            obs.id,
+            obs.segmentation,
+            obs.instance,
+        )
+        for track_id, obs in tracks_manager.get_shot_observations(shot_id).items()
+    }
+
+
+def test_dataset_binary_tracks(tmpdir) -> None:
+    data = data_generation.create_berlin_test_folder(tmpdir)
+    tracks_manager = pymap.TracksManager()
+    tracks_manager.add_observation(
+        "1", "a", pymap.Observation(0.1, 0.2, 0.3, 1, 2, 3, 4, 5, 6)
+    )
+    tracks_manager.add_observation(
+        "2", "a", pymap.Observation(0.4, 0.5, 0.6, 7, 8, 9, 10)
+    )
+    tracks_manager.add_observation(
+        "2", "b", pymap.Observation(0.7, 0.8, 0.9, 1, 1, 1, 11)
+    )
+    data.save_tracks_manager(tracks_manager)
+
+    data.config["tracks_format"] = "binary"
+    data.save_tracks_manager(tracks_manager)
+    assert data.tracks_exists()
+
+    loaded = data.load_tracks_manager()
+    assert sorted(loaded.get_shot_ids()) == ["1", "2"]
+    for shot_id in ("1", "2"):
+        assert _shot_observations(loaded, shot_id) == _shot_observations(
+            tracks_manager, shot_id
+        )
+
+    subset = data.load_tracks_manager(images=["2"])
+    assert subset.get_shot_ids() == ["2"]
+    assert _shot_observations(subset, "2") == _shot_observations(tracks_manager, "2")
+
+    # CSV tracks stay readable
+    data.config["tracks_format"] = "csv"
+    csv_subset = data.load_tracks_manager(images=["1"])
+    assert csv_subset.get_shot_ids() == ["1"]
+
+
+@pytest.mark.parametrize("storage", ["COMPRESSED", "NPZ", "NPY"])
+def test_undistorted_dataset_depthmap_storage(tmpdir, storage) -> None:
+    data = data_generation.create_berlin_test_folder(tmpdir)
+    data.config["depthmap_storage"] = storage
+    udata = dataset.UndistortedDataSet(data, str(tmpdir.join("undistorted")))
+    image = data.images()[0]
+
+    depth = np.random.random((4, 5))
+    plane = np.random.random((4, 5, 3))
+    score = np.random.random((4, 5))
+    nghbr = np.random.randint(0, 3, (4, 5))
+    assert not udata.raw_depthmap_exists(image)
+    udata.save_raw_depthmap(image, depth, plane, score, nghbr, ["a", "b"])
+    assert udata.raw_depthmap_exists(image)
+
+    loaded = udata.load_raw_depthmap(image)
+    for before, after in zip((depth, plane, score, nghbr), loaded):
+        assert np.array_equal(before, after)
+    assert list(loaded[4]) == ["a", "b"]
+
+    (depth_only,) = udata.load_depthmap_arrays(image, "raw", ("depth",))
+    assert np.array_equal(depth_only, depth)
+
+    udata.save_clean_depthmap(image, depth, plane, score)
+    clean_depth, clean_plane = udata.load_depthmap_arrays(
+        image, "clean", ("depth", "plane")
+    )
+    assert np.array_equal(clean_depth, depth)
+    assert np.array_equal(clean_plane, plane)
+
+
+@pytest.mark.parametrize("first, second", [("NPY", "COMPRESSED"), ("NPZ", "NPY")])
+def test_undistorted_dataset_depthmap_storage_change(tmpdir, first, second) -> None:
+    data = data_generation.create_berlin_test_folder(tmpdir)
+    udata = dataset.UndistortedDataSet(data, str(tmpdir.join("undistorted")))
+    image = data.images()[0]
+
+    depth = np.random.random((4, 5))
+    plane = np.random.random((4, 5, 3))
+    score = np.random.random((4, 5))
+    data.config["depthmap_storage"] = first
+    udata.save_clean_depthmap(image, depth, plane, score)
+    data.config["depthmap_storage"] = second
+    udata.save_clean_depthmap(image, 2 * depth, 2 * plane, 2 * score)
+
+    loaded = udata.load_clean_depthmap(image)
+    for before, after in zip((depth, plane, score), loaded):
+        assert np.array_equal(2 * before, after)
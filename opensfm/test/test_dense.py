@@ -1,7 +1,15 @@
+import threading
+from types import SimpleNamespace
+
 import numpy as np
+from opensfm import dataset
 from opensfm import dense
+from opensfm import io
 from opensfm import pygeometry
+from opensfm import pymap
 from opensfm import types
+from opensfm.synthetic_data import synthetic_scene
+from opensfm.test import data_generation
 
 
 def test_angle_between_points() -> None:
@@ -40,3 +48,190 @@ def test_depthmap_to_ply() -> None:
 
     ply = dense.depthmap_to_ply(shot, depth, image)
     assert len(ply.splitlines()) == 16
+
+
+def test_run_depthmap_stages_respects_dependencies(monkeypatch) -> None:
+    shot_ids = ["shot{}".format(i) for i in range(6)]
+    shots = {shot_id: SimpleNamespace(id=shot_id) for shot_id in shot_ids}
+    neighbors = {
+        shot_id: [shots[shot_id]] + [shots[shot_ids[(i + 1) % len(shot_ids)]]]
+        for i, shot_id in enumerate(shot_ids)
+    }
+
+    done = []
+    lock = threading.Lock()
+
+    def record(stage):
+        def run(arguments, cache=None):
+            with lock:
+                done.append((stage, arguments[0]))
+
+        return run
+
+    monkeypatch.setattr(dense, "compute_depthmap", record("compute"))
+    monkeypatch.setattr(dense, "clean_depthmap", record("clean"))
+    monkeypatch.setattr(dense, "prune_depthmap", record("prune"))
+
+    stage_arguments = {
+        shot_id: {stage: (shot_id,) for stage in dense.DEPTHMAP_STAGES}
+        for shot_id in shot_ids
+    }
+    report = dense.run_depthmap_stages(stage_arguments, neighbors, 3)
+
+    assert len(done) == 3 * len(shot_ids)
+    position = {task: i for i, task in enumerate(done)}
+    dependencies = dense.depthmap_stage_dependencies(shot_ids, neighbors)
+    for task, required in dependencies.items():
+        for r in required:
+            assert position[r] < position[task]
+    assert set(report["shots"]) == set(shot_ids)
+    for timings in report["shots"].values():
+        assert set(timings) == set(dense.DEPTHMAP_STAGES)
+
+
+def test_compute_neighbors_and_depth_ranges(
+    scene_synthetic: synthetic_scene.SyntheticInputData,
+) -> None:
+    reconstruction = scene_synthetic.reconstruction
+    tracks_manager = scene_synthetic.tracks_manager
+    config = {"depthmap_min_depth": 0, "depthmap_max_depth": 0}
+    num_neighbors = 1000
+
+    neighbors, depth_ranges = dense.compute_neighbors_and_depth_ranges(
+        tracks_manager, reconstruction, num_neighbors, config
+    )
+
+    common_tracks = dense.common_tracks_double_dict(tracks_manager)
+    for shot in reconstruction.shots.values():
+        expected = dense.find_neighboring_images(
+            shot, common_tracks, reconstruction, num_neighbors
+        )
+        assert neighbors[shot.id][0].id == shot.id
+        assert {n.id for n in neighbors[shot.id]} == {n.id for n in expected}
+
+        expected_range = dense.compute_depth_range(
+            tracks_manager, reconstruction, shot, config
+        )
+        assert np.allclose(depth_ranges[shot.id], expected_range)
+
+
+def test_compute_neighbors_min_common_tracks() -> None:
+    camera = pygeometry.Camera.create_perspective(1.0, 0.0, 0.0)
+    camera.id = "cam1"
+    rec = types.Reconstruction()
+    rec.add_camera(camera)
+    for shot_id, x in (("im1", 0.0), ("im2", 1.0)):
+        rec.create_shot(
+            shot_id, camera.id, pygeometry.Pose(np.zeros(3), np.array([-x, 0, 0]))
+        )
+
+    # 30 reconstructed points seen at a good angle by both shots
+    tracks_manager = pymap.TracksManager()
+    for i in range(45):
+        track_id = str(i)
+        for shot_id in ("im1", "im2"):
+            observation = pymap.Observation(0, 0, 1.0, 0, 0, 0, i)
+            tracks_manager.add_observation(shot_id, track_id, observation)
+        if i < 30:
+            rec.create_point(track_id, np.array([i * 0.1, 0.0, 10.0]))
+    config = {"depthmap_min_depth": 0, "depthmap_max_depth": 0}
+
+    def neighbor_ids():
+        neighbors, _ = dense.compute_neighbors_and_depth_ranges(
+            tracks_manager, rec, 10, config
+        )
+        common_tracks = dense.common_tracks_double_dict(tracks_manager)
+        expected = dense.find_neighboring_images(
+            rec.shots["im1"], common_tracks, rec, 10
+        )
+        ids = [n.id for n in neighbors["im1"]]
+        assert ids == [n.id for n in expected]
+        return ids
+
+    # 45 common tracks : not enough, even if 30 have a good angle
+    assert neighbor_ids() == ["im1"]
+
+    # Non-reconstructed tracks count towards the 50 common tracks
+    for i in range(45, 55):
+        for shot_id in ("im1", "im2"):
+            observation = pymap.Observation(0, 0, 1.0, 0, 0, 0, i)
+            tracks_manager.add_observation(shot_id, str(i), observation)
+    assert neighbor_ids() == ["im1", "im2"]
+
+
+def test_voxel_merge() -> None:
+    points = np.array(
+        [[0.1, 0.1, 0.1], [0.3, 0.1, 0.1], [0.2, 0.4, 0.1], [1.5, 0.2, 0.2]]
+    )
+    normals = np.array([[0, 0, 1], [0, 1, 0], [0, 0, 1], [1, 0, 0]], dtype=float)
+    colors = np.array([[0, 0, 0], [30, 60, 90], [0, 0, 0], [10, 20, 30]])
+    labels = np.array([2, 5, 2, 7])
+
+    p, n, c, l = dense.voxel_merge(points, normals, colors, labels, 1.0)
+
+    assert len(p) == 2
+    order = np.argsort(p[:, 0])
+    p, n, c, l = p[order], n[order], c[order], l[order]
+    assert np.allclose(p[0], [0.2, 0.2, 0.1])
+    assert np.allclose(p[1], [1.5, 0.2, 0.2])
+    assert np.allclose(np.linalg.norm(n, axis=1), 1)
+    assert np.allclose(n[0], np.array([0, 1, 2]) / np.sqrt(5))
+    assert c.tolist() == [[10, 20, 30], [10, 20, 30]]
+    assert l.tolist() == [2, 7]
+
+
+def test_save_voxel_merged_depthmaps(tmpdir) -> None:
+    data = data_generation.create_berlin_test_folder(tmpdir)
+    udata = dataset.UndistortedDataSet(data, str(tmpdir.join("undistorted")))
+    udata.config["depthmap_merge_voxel_size"] = 1.0
+    # Rounded to 3 voxels : with 2.6, voxel 2 would straddle tiles 0 and 1
+    udata.config["depthmap_merge_tile_size"] = 2.6
+    udata.config["depthmap_merge_tiled_output"] = True
+
+    depthmaps = {
+        "a": [[0.2, 0.2, 0.2], [0.8, 0.5, 0.5], [2.9, 0.5, 0.5], [3.1, 0.5, 0.5]],
+        "b": [[2.5, 0.1, 0.1], [5.5, -1.5, 0.5], [0.5, 0.5, 0.5]],
+    }
+    for image, points in depthmaps.items():
+        n = len(points)
+        udata.save_pruned_depthmap(
+            image,
+            np.array(points, dtype=np.float32),
+            np.tile(np.array([0, 0, 1], dtype=np.float32), (n, 1)),
+            np.full((n, 3), 100, dtype=np.uint8),
+            np.ones(n, dtype=np.uint8),
+        )
+    stale = udata.point_cloud_file("tiles/9_9_9.ply")
+    udata.io_handler.mkdir_p(udata.point_cloud_file("tiles"))
+    with udata.io_handler.open(stale, "wb") as fout:
+        fout.write(b"stale")
+
+    rec = SimpleNamespace(shots={"a": None, "b": None, "c": None})
+    report = dense.save_voxel_merged_depthmaps(udata, rec)
+
+    assert report["num_input_points"] == 7
+    assert report["num_points"] == 4
+    assert report["num_tiles"] == 3
+    assert report["tile_size"] == 3.0
+
+    points, normals, colors, labels = udata.load_point_cloud()
+    assert len(points) == 4
+    voxels = np.floor(points).astype(int)
+    assert len(np.unique(voxels, axis=0)) == 4
+    assert np.allclose(normals, [0, 0, 1])
+    assert np.all(colors == 100)
+
+    with udata.io_handler.open_rt(udata.point_cloud_file("tiles/index.json")) as fin:
+        index = io.json_load(fin)
+    assert index["tile_size"] == 3.0
+    tiles = {tuple(tile["key"]): tile for tile in index["tiles"]}
+    assert set(tiles) == {(0, 0, 0), (1, 0, 0), (1, -1, 0)}
+    assert tiles[0, 0, 0]["num_points"] == 2
+    assert sum(tile["num_points"] for tile in tiles.values()) == 4
+    for tile in tiles.values():
+        tile_points, _, _, _ = udata.load_point_cloud(tile["filename"])
+        assert len(tile_points) == tile["num_points"]
+        assert np.all(tile_points >= tile["min"])
+        assert np.all(tile_points < tile["max"])
+    assert not udata.io_handler.exists(stale)
+    assert udata.io_handler.ls(udata.point_cloud_file("merge_tiles")) == []
@@ -0,0 +1,58 @@
+import numpy as np
+from opensfm import feature_loading, features
+from opensfm.test import data_generation
+
+
+def test_feature_cache_evicts_least_recently_used() -> None:
+    cache = feature_loading.FeatureCache(max_bytes=2 * 800)
+    for key in ("a", "b"):
+        cache.get_or_compute(key, lambda: np.zeros(100))
+    # Touch "a" so that "b" is the least recently used entry
+    cache.get_or_compute("a", lambda: np.zeros(100))
+    cache.get_or_compute("c", lambda: np.zeros(100))
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 2 * 800
+
+    cache.get_or_compute("b", lambda: np.zeros(100))
+    assert cache.stats()["misses"] == 4
+
+
+def test_feature_cache_skips_oversized_values() -> None:
+    cache = feature_loading.FeatureCache(max_bytes=100)
+    cache.get_or_compute("a", lambda: np.zeros(100))
+    assert cache.stats()["entries"] == 0
+
+
+def test_cache_budget_from_config() -> None:
+    config = {"feature_cache_memory": 10, "feature_cache_memory_fraction": 0.5}
+    assert feature_loading.cache_budget(config) == 10 * 1024 * 1024
+    assert feature_loading.cache_budget(config, 4) == 10 * 1024 * 1024 / 4
+
+
+def test_persisted_features_index(tmpdir) -> None:
+    data = data_generation.create_berlin_test_folder(tmpdir)
+    data.config["flann_persist_index"] = True
+    image = data.images()[0]
+    points = np.random.random((100, 4))
+    descriptors = np.random.random((100, 128)).astype(np.float32)
+    colors = np.random.random((100, 3))
+    data.save_features(image, features.FeaturesData(points, descriptors, colors, None))
+
+    loader = feature_loading.FeatureLoader()
+    assert loader.save_features_index(data, image, False)
+    assert data.feature_index_exists(image)
+
+    features_data, _ = loader.load_features_index(data, image, True, False)
+    metadata = features.flann_index_metadata(features_data.descriptors, data.config)
+    assert data.load_feature_index_metadata(image) == metadata
+
+    # Changing the descriptors makes the persisted index stale
+    loader.clear_cache()
+    descriptors[0] += 1
+    data.save_features(image, features.FeaturesData(points, descriptors, colors, None))
+    features_data, _ = loader.load_features_index(data, image, True, False)
+    assert loader._load_persisted_index(data, image, features_data.descriptors) is None
@@ -0,0 +1,34 @@
+import pytest
+from opensfm import features_processing
+
+
+def test_run_pipeline() -> None:
+    written = []
+    stages = [
+        features_processing.Stage(
+            "decode", lambda i: (i, 100) if i % 5 else None, 3, 300
+        ),
+        features_processing.Stage("detect", lambda i: (2 * i, 50), 2, 100),
+        features_processing.Stage("write", written.append, 2, 0),
+    ]
+    report = features_processing.run_pipeline(stages, list(range(100)))
+
+    assert sorted(written) == [2 * i for i in range(100) if i % 5]
+    assert report["decode"]["items"] == 100
+    assert report["write"]["items"] == 80
+    assert report["detect"]["max_queue_bytes"] <= 300
+    assert report["write"]["max_queue_bytes"] <= 100
+
+
+def test_run_pipeline_raises_stage_error() -> None:
+    def fail_on_three(i):
+        if i == 3:
+            raise ValueError("Failed")
+        return i, 1
+
+    stages = [
+        features_processing.Stage("first", fail_on_three, 2, 10),
+        features_processing.Stage("second", lambda i: None, 1, 0),
+    ]
+    with pytest.raises(ValueError):
+        features_processing.run_pipeline(stages, list(range(10)))
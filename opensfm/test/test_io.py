@@ -1,8 +1,9 @@
 import json
 import os.path
-from io import StringIO
+from io import BytesIO, StringIO
 
 import numpy as np
+import pytest
 from opensfm import pygeometry, io, types
 from opensfm.test import data_generation, utils
 
@@ -217,3 +218,44 @@ def test_panoshots_consistency() -> None:
     rec_after = io.reconstructions_from_json(json_data)[0]
 
     utils.assert_reconstructions_equal(rec_before, rec_after)
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_point_cloud_ply_round_trip(binary: bool) -> None:
+    n = 1000
+    points = np.random.uniform(-100, 100, (n, 3)).astype(np.float32)
+    normals = np.random.uniform(-1, 1, (n, 3)).astype(np.float32)
+    colors = np.random.randint(0, 256, (n, 3)).astype(np.uint8)
+    labels = np.random.randint(0, 10, n).astype(np.uint8)
+
+    fp = BytesIO()
+    writer = io.PointCloudPlyWriter(fp, n, binary)
+    for start in range(0, n, 300):
+        end = start + 300
+        writer.write(
+            points[start:end], normals[start:end], colors[start:end], labels[start:end]
+        )
+    writer.close()
+
+    fp.seek(0)
+    reader = io.PointCloudPlyReader(fp)
+    assert reader.count == n
+    assert reader.binary == binary
+    chunks = list(reader.chunks(400))
+    assert [len(c[0]) for c in chunks] == [400, 400, 200]
+
+    fp.seek(0)
+    p, nr, c, l = io.point_cloud_from_ply(fp)
+    assert np.allclose(p, points, atol=1e-3)
+    assert np.allclose(nr, normals, atol=1e-3)
+    assert np.array_equal(c, colors)
+    assert np.array_equal(l, labels)
+
+
+def test_point_cloud_ply_writer_checks_count() -> None:
+    writer = io.PointCloudPlyWriter(BytesIO(), 2, True)
+    writer.write(
+        np.zeros((1, 3)), np.zeros((1, 3)), np.zeros((1, 3)), np.zeros(1)
+    )
+    with pytest.raises(IOError):
+        writer.close()
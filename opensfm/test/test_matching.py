@@ -62,6 +62,17 @@ def test_match_using_words() -> None:
         assert i == j
 
 
+def test_map_to_words_batch() -> None:
+    configuration = config.default_config()
+    bag_of_words = bow.load_bows(configuration)
+    assert bow.load_bows(configuration) is bag_of_words
+
+    features, _ = example_features(100, configuration)
+    batched = bag_of_words.map_to_words_batch(features, 5)
+    for f, words in zip(features, batched):
+        assert np.array_equal(words, bag_of_words.map_to_words(f, 5))
+
+
 def test_unfilter_matches() -> None:
     matches = np.array([])
     m1 = np.array([], dtype=bool)
@@ -137,6 +148,58 @@ def test_ordered_pairs() -> None:
     }
 
 
+def test_schedule_pairs() -> None:
+    pairs = [("a", "b"), ("c", "d"), ("b", "c"), ("a", "c"), ("d", "e"), ("f", "g")]
+    scheduled = matching.schedule_pairs(pairs)
+
+    assert sorted(scheduled) == sorted(pairs)
+    # Pairs of the most connected image come first, together
+    assert set(scheduled[:3]) == {("c", "d"), ("b", "c"), ("a", "c")}
+
+
+def test_match_images_reports_cache(scene_synthetic) -> None:
+    reference = scene_synthetic.reconstruction
+    synthetic = synthetic_dataset.SyntheticDataSet(
+        reference,
+        scene_synthetic.exifs,
+        scene_synthetic.features,
+        scene_synthetic.tracks_manager,
+    )
+    synthetic.matches_exists = lambda im: False
+    synthetic.save_matches = lambda im, m: False
+
+    override = {}
+    override["matching_gps_neighbors"] = 0
+    override["matching_gps_distance"] = 0
+    override["matching_time_neighbors"] = 2
+
+    images = sorted(synthetic.images())
+    _, report = matching.match_images(synthetic, override, images, images)
+    stats = report["feature_cache"]
+    assert stats["hits"] + stats["misses"] > 0
+    assert 0 <= stats["hit_rate"] <= 1
+
+
+def test_match_brute_force_batch() -> None:
+    np.random.seed(42)
+    f1 = np.random.rand(100, 32).astype(np.float32)
+    candidates = [
+        (f1[:60] + 0.01 * np.random.rand(60, 32)).astype(np.float32),
+        np.random.rand(80, 32).astype(np.float32),
+        (f1[40:] + 0.01 * np.random.rand(60, 32)).astype(np.float32),
+    ]
+    config = {"lowes_ratio": 0.8}
+
+    batched = matching.match_brute_force_batch(
+        f1, candidates, config, True, max_block_elements=150 * 100
+    )
+    assert len(batched) == len(candidates)
+    for f2, matches in zip(candidates, batched):
+        expected = matching.match_brute_force_symmetric(f1, f2, config)
+        assert set(map(tuple, matches.tolist())) == set(expected)
+    assert len(batched[0]) > 50
+
+
 def test_triangulation_inliers(pairs_and_their_E) -> None:
     for f1, f2, _, pose in pairs_and_their_E:
         Rt = pose.get_cam_to_world()[:3]
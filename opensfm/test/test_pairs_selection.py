@@ -131,6 +131,42 @@ def test_match_candidates_from_metadata_graph(lund_path) -> None:
     match_candidates_from_metadata(data)
 
 
+@pytest.mark.parametrize("enforce_other_cameras", [False, True])
+def test_compute_affinity_top_k(lund_path, enforce_other_cameras: bool) -> None:
+    data_generation.save_config({"matching_affinity_block_size": 7}, lund_path)
+    data = dataset.DataSet(lund_path)
+
+    np.random.seed(42)
+    images = ["image_{}".format(i) for i in range(30)]
+    exifs = {im: {"camera": "camera_{}".format(i % 3)} for i, im in enumerate(images)}
+    histograms = {im: np.random.rand(16) for im in images[:-2]}
+    images_ref, images_cand = images[:20], images[5:]
+
+    results = pairs_selection.compute_affinity_top_k(
+        data,
+        histograms,
+        images_ref,
+        images_cand,
+        "L1",
+        NEIGHBORS,
+        exifs if enforce_other_cameras else None,
+    )
+    expected = [
+        pairs_selection.bow_distances(im, images_cand, histograms)
+        for im in images_ref
+    ]
+
+    pairs = pairs_selection.construct_pairs(
+        results, NEIGHBORS, exifs, enforce_other_cameras
+    )
+    expected_pairs = pairs_selection.construct_pairs(
+        expected, NEIGHBORS, exifs, enforce_other_cameras
+    )
+    assert pairs.keys() == expected_pairs.keys()
+    for pair, distance in pairs.items():
+        assert np.isclose(distance, expected_pairs[pair], rtol=1e-5)
+
+
 def test_get_gps_point() -> None:
     reference = geo.TopocentricConverter(0, 0, 0)
     exifs = {}
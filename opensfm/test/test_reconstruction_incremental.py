@@ -1,4 +1,8 @@
-from opensfm import reconstruction
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from opensfm import config, reconstruction, types
 from opensfm.synthetic_data import synthetic_dataset, synthetic_scene
 
 
@@ -76,3 +80,356 @@ def test_reconstruction_incremental_rig(
     assert 0 < errors["aligned_points_rmse"] < 0.05
 
     assert 0 < errors["absolute_gps_rmse"] < 0.15
+
+
+def test_reconstruction_incremental_concurrent_resection(
+    scene_synthetic: synthetic_scene.SyntheticInputData,
+) -> None:
+    reference = scene_synthetic.reconstruction
+    dataset = synthetic_dataset.SyntheticDataSet(
+        reference,
+        scene_synthetic.exifs,
+        scene_synthetic.features,
+        scene_synthetic.tracks_manager,
+        scene_synthetic.gcps,
+    )
+
+    dataset.config["resection_candidates"] = 4
+    dataset.config["processes"] = 2
+    _, reconstructed_scene = reconstruction.incremental_reconstruction(
+        dataset, scene_synthetic.tracks_manager
+    )
+    errors = synthetic_scene.compare(
+        reference,
+        scene_synthetic.gcps,
+        reconstructed_scene[0],
+    )
+
+    assert errors["ratio_cameras"] == 1.0
+    assert 0.7 < errors["ratio_points"] < 1.0
+    assert 0 < errors["aligned_position_rmse"] < 0.03
+
+
+def test_resection_candidates(
+    scene_synthetic: synthetic_scene.SyntheticInputData,
+) -> None:
+    reference = scene_synthetic.reconstruction
+    tracks_manager = scene_synthetic.tracks_manager
+    images = set(tracks_manager.get_shot_ids())
+
+    rec = types.Reconstruction()
+    for camera in reference.cameras.values():
+        rec.add_camera(camera)
+    shot_ids = sorted(reference.shots)
+    for shot_id in shot_ids[:2]:
+        shot = reference.shots[shot_id]
+        rec.create_shot(shot_id, shot.camera.id, shot.pose)
+
+    candidates = reconstruction.ResectionCandidates(tracks_manager, rec, images)
+    added = list(reference.points)[:100]
+    for point_id in added:
+        rec.create_point(point_id, reference.points[point_id].coordinates)
+    candidates.changes.add(added)
+    report = candidates.update()
+    assert report["added_points"] == 100
+
+    expected = reconstruction.reconstructed_points_for_images(
+        tracks_manager, rec, images
+    )
+    ranked = list(candidates.ranked())
+    assert dict(ranked) == dict(expected)
+    assert [n for _, n in ranked] == [n for _, n in expected]
+
+    removed = list(reference.points)[:50]
+    for point_id in removed:
+        rec.remove_point(point_id)
+    candidates.changes.remove(removed)
+    candidates.remove([ranked[0][0]])
+    report = candidates.update()
+    assert report["removed_points"] == 50
+    expected = dict(
+        reconstruction.reconstructed_points_for_images(tracks_manager, rec, images)
+    )
+    del expected[ranked[0][0]]
+    assert dict(candidates.ranked()) == expected
+
+
+def test_resection_candidates_rig(
+    scene_synthetic_rig: synthetic_scene.SyntheticInputData,
+) -> None:
+    reference = scene_synthetic_rig.reconstruction
+    tracks_manager = scene_synthetic_rig.tracks_manager
+    dataset = synthetic_dataset.SyntheticDataSet(
+        reference,
+        scene_synthetic_rig.exifs,
+        scene_synthetic_rig.features,
+        tracks_manager,
+    )
+    images = set(tracks_manager.get_shot_ids())
+
+    rec = types.Reconstruction()
+    for camera in reference.cameras.values():
+        rec.add_camera(camera)
+    for rig_camera in reference.rig_cameras.values():
+        rec.add_rig_camera(rig_camera)
+
+    candidates = reconstruction.ResectionCandidates(tracks_manager, rec, images)
+    instances = sorted(reference.rig_instances.values(), key=lambda i: i.id)
+    for instance in instances[:2]:
+        shot_id = sorted(instance.shots)[0]
+        new_shots = reconstruction.apply_resection(
+            dataset,
+            tracks_manager,
+            rec,
+            shot_id,
+            reference.shots[shot_id].pose,
+            [],
+            candidates.changes,
+        )
+        assert len(new_shots) > 1
+        candidates.remove(new_shots)
+    assert len(rec.points) > 0
+
+    report = candidates.update()
+    assert report["added_points"] == len(rec.points)
+    expected = reconstruction.reconstructed_points_for_images(
+        tracks_manager, rec, images
+    )
+    assert dict(candidates.ranked()) == dict(expected)
+
+
+def test_resect_with_few_points(
+    scene_synthetic: synthetic_scene.SyntheticInputData,
+) -> None:
+    reference = scene_synthetic.reconstruction
+    tracks_manager = scene_synthetic.tracks_manager
+    dataset = synthetic_dataset.SyntheticDataSet(
+        reference,
+        scene_synthetic.exifs,
+        scene_synthetic.features,
+        tracks_manager,
+        scene_synthetic.gcps,
+    )
+
+    rec = types.Reconstruction()
+    for camera in reference.cameras.values():
+        rec.add_camera(camera)
+    shot_ids = sorted(reference.shots)
+    for shot_id in shot_ids[:2]:
+        shot = reference.shots[shot_id]
+        rec.create_shot(shot_id, shot.camera.id, shot.pose)
+    image = shot_ids[2]
+    for point_id in list(tracks_manager.get_shot_observations(image))[:4]:
+        if point_id in reference.points:
+            rec.create_point(point_id, reference.points[point_id].coordinates)
+
+    ok, new_shots, report = reconstruction.resect(
+        dataset, tracks_manager, rec, image, 0.01, 2
+    )
+    assert not ok
+    assert new_shots == set()
+    assert report["num_common_points"] < 5
+
+    resected = reconstruction.resect_candidates(
+        dataset, tracks_manager, rec, [image], 0.01, 2
+    )
+    assert resected == []
+    assert image not in rec.shots
+
+
+def test_image_graph_components() -> None:
+    pairs = {("a", "b"): None, ("c", "d"): None, ("b", "e"): None, ("f", "d"): None}
+    pairs[("g", "h")] = None
+    components = reconstruction.image_graph_components(pairs)
+    assert components == [{"a", "b", "e"}, {"c", "d", "f"}, {"g", "h"}]
+
+
+def test_reconstruction_incremental_components(
+    scene_synthetic: synthetic_scene.SyntheticInputData,
+) -> None:
+    reference = scene_synthetic.reconstruction
+    dataset = synthetic_dataset.SyntheticDataSet(
+        reference,
+        scene_synthetic.exifs,
+        scene_synthetic.features,
+        scene_synthetic.tracks_manager,
+        scene_synthetic.gcps,
+    )
+
+    dataset.config["reconstruction_parallel_components"] = True
+    report, reconstructed_scene = reconstruction.incremental_reconstruction(
+        dataset, scene_synthetic.tracks_manager
+    )
+    errors = synthetic_scene.compare(
+        reference,
+        scene_synthetic.gcps,
+        reconstructed_scene[0],
+    )
+
+    assert report["num_components"] == 1
+    assert report["not_reconstructed_images"] == []
+    assert errors["ratio_cameras"] == 1.0
+    assert 0.7 < errors["ratio_points"] < 1.0
+
+
+def test_reconstruction_incremental_lazy_pairs(
+    scene_synthetic: synthetic_scene.SyntheticInputData,
+) -> None:
+    reference = scene_synthetic.reconstruction
+    dataset = synthetic_dataset.SyntheticDataSet(
+        reference,
+        scene_synthetic.exifs,
+        scene_synthetic.features,
+        scene_synthetic.tracks_manager,
+        scene_synthetic.gcps,
+    )
+
+    dataset.config["bootstrap_pairs_ranking"] = "LAZY"
+    dataset.config["bootstrap_pairs_batch_size"] = 4
+    report, reconstructed_scene = reconstruction.incremental_reconstruction(
+        dataset, scene_synthetic.tracks_manager
+    )
+    errors = synthetic_scene.compare(
+        reference,
+        scene_synthetic.gcps,
+        reconstructed_scene[0],
+    )
+
+    assert 0 < report["num_evaluated_image_pairs"]
+    assert errors["ratio_cameras"] == 1.0
+    assert 0.7 < errors["ratio_points"] < 1.0
+
+
+def test_reconstruction_incremental_adaptive_bundle(
+    scene_synthetic: synthetic_scene.SyntheticInputData,
+) -> None:
+    reference = scene_synthetic.reconstruction
+    dataset = synthetic_dataset.SyntheticDataSet(
+        reference,
+        scene_synthetic.exifs,
+        scene_synthetic.features,
+        scene_synthetic.tracks_manager,
+        scene_synthetic.gcps,
+    )
+
+    dataset.config["bundle_scheduling"] = "ADAPTIVE"
+    dataset.config["bundle_time_budget_per_image"] = 0.0
+    dataset.config["bundle_window_size"] = 5
+    report, reconstructed_scene = reconstruction.incremental_reconstruction(
+        dataset, scene_synthetic.tracks_manager
+    )
+    errors = synthetic_scene.compare(
+        reference,
+        scene_synthetic.gcps,
+        reconstructed_scene[0],
+    )
+
+    steps = report["reconstructions"][0]["grow"]["steps"]
+    actions = {
+        step["bundle_decision"]["action"]
+        for step in steps
+        if "bundle_decision" in step
+    }
+    assert "window" in actions
+    assert all(
+        step["bundle_decision"]["drift"] > 0
+        for step in steps
+        if "bundle_decision" in step
+    )
+    assert errors["ratio_cameras"] == 1.0
+    assert 0.7 < errors["ratio_points"] < 1.0
+
+
+def test_reconstruction_incremental_sliding_window(
+    scene_synthetic: synthetic_scene.SyntheticInputData,
+) -> None:
+    reference = scene_synthetic.reconstruction
+    dataset = synthetic_dataset.SyntheticDataSet(
+        reference,
+        scene_synthetic.exifs,
+        scene_synthetic.features,
+        scene_synthetic.tracks_manager,
+        scene_synthetic.gcps,
+    )
+
+    dataset.config["bundle_sliding_window"] = window_size
+    report, reconstructed_scene = reconstruction.incremental_reconstruction(
+        dataset, scene_synthetic.tracks_manager
+    )
+    errors = synthetic_scene.compare(
+        reference,
+        scene_synthetic.gcps,
+        reconstructed_scene[0],
+    )
+
+    steps = report["reconstructions"][0]["grow"]["steps"]
+    assert any("sliding_bundle" in step for step in steps)
+    assert errors["ratio_cameras"] == 1.0
+    assert 0.7 < errors["ratio_points"] < 1.0
+
+
+@pytest.mark.parametrize("window_size", [5, 1])
+def test_reconstruct_from_prior_sliding_window(
+    scene_synthetic: synthetic_scene.SyntheticInputData, monkeypatch, window_size: int
+) -> None:
+    reference = scene_synthetic.reconstruction
+    dataset = synthetic_dataset.SyntheticDataSet(
+        reference,
+        scene_synthetic.exifs,
+        scene_synthetic.features,
+        scene_synthetic.tracks_manager,
+        scene_synthetic.gcps,
+    )
+    dataset.config["bundle_sliding_window"] = 5
+
+    windows = []
+    bundle_window = reconstruction.bundle_window
+
+    def checked_bundle_window(rec, camera_priors, rig_priors, gcp, shot_ids, config):
+        window = set(shot_ids)
+        fixed = {
+            shot.id: (shot.pose.get_origin(), shot.pose.get_rotation_matrix())
+            for shot in rec.shots.values()
+            if shot.id not in window
+        }
+        result = bundle_window(rec, camera_priors, rig_priors, gcp, window, config)
+        for shot_id, (origin, rotation) in fixed.items():
+            pose = rec.shots[shot_id].pose
+            assert np.array_equal(pose.get_origin(), origin)
+            assert np.array_equal(pose.get_rotation_matrix(), rotation)
+        windows.append(window)
+        return result
+
+    monkeypatch.setattr(reconstruction, "bundle_window", checked_bundle_window)
+    report, rec = reconstruction.reconstruct_from_prior(
+        dataset, scene_synthetic.tracks_manager, reference
+    )
+
+    rec_report = report["retriangulate"][0]
+    assert len(rec_report["sliding_bundle"]) == len(windows) > 1
+    assert all(len(window) <= window_size for window in windows)
+    assert set.union(*windows) == set(reference.shots)
+    assert len(rec.points) > 0
+
+
+def test_bundle_scheduler_samples_reference_error() -> None:
+    # The oldest points have a lower error than the others
+    errors = {"p{:05d}".format(i): 1.0 if i < 2000 else 3.0 for i in range(10000)}
+
+    def get_reprojection_error_arrays(point_ids):
+        e = np.array([[errors[p], 0.0] for p in point_ids]).reshape(-1, 2)
+        return None, None, None, None, e
+
+    rec = SimpleNamespace(
+        points=errors,
+        shots={},
+        map=SimpleNamespace(get_reprojection_error_arrays=get_reprojection_error_arrays),
+    )
+    data = SimpleNamespace(config=config.default_config())
+    scheduler = reconstruction.BundleScheduler(data, rec)
+
+    scheduler.done("full", 1.0)
+    assert scheduler.reference_error == 3.0
+
+    scheduler.done("local", 0.1, ["p00000", "p00001", "p00002"])
+    assert scheduler.decide(False)["drift"] == pytest.approx(1.0 / 3.0)
@@ -0,0 +1,50 @@
+import numpy as np
+from opensfm import tracking
+
+
+def _tracks_as_sets(tracks_manager):
+    tracks = set()
+    for track_id in tracks_manager.get_track_ids():
+        observations = tracks_manager.get_track_observations(track_id)
+        tracks.add(frozenset((im, obs.id) for im, obs in observations.items()))
+    return tracks
+
+
+def test_create_tracks_manager_matches_unionfind() -> None:
+    np.random.seed(42)
+    images = ["im{}".format(i) for i in range(4)]
+    num_features = 30
+    features = {im: np.random.rand(num_features, 3) for im in images}
+    colors = {im: np.random.randint(0, 255, (num_features, 3)) for im in images}
+    segmentations = {images[0]: np.random.randint(0, 10, num_features)}
+    matches = {}
+    for i, im1 in enumerate(images):
+        for im2 in images[i + 1 :]:
+            matches[im1, im2] = np.random.randint(0, num_features, (20, 2))
+    # Matches involving an image without features
+    matches[images[0], "missing"] = np.array([[0, 3], [1, 4]])
+
+    for min_length in [2, 3]:
+        expected = tracking.create_tracks_manager_unionfind(
+            features, colors, segmentations, {}, matches, min_length
+        )
+        result = tracking.create_tracks_manager(
+            features, colors, segmentations, {}, matches, min_length
+        )
+        assert _tracks_as_sets(result) == _tracks_as_sets(expected)
+
+    for track_id in result.get_track_ids():
+        for im, obs in result.get_track_observations(track_id).items():
+            assert np.allclose(obs.point, features[im][obs.id, :2])
+            assert np.allclose(obs.scale, features[im][obs.id, 2])
+            assert np.array_equal(obs.color, colors[im][obs.id])
+            if im in segmentations:
+                assert obs.segmentation == segmentations[im][obs.id]
+
+
+def test_create_tracks_manager_empty() -> None:
+    features = {"im1": np.zeros((0, 3))}
+    tracks_manager = tracking.create_tracks_manager(
+        features, {"im1": np.zeros((0, 3))}, {}, {}, {}, 2
+    )
+    assert tracks_manager.num_tracks() == 0
@@ -1,12 +1,13 @@
 import numpy as np
+import pytest
+from opensfm import config
 from opensfm import io
 from opensfm import pygeometry
 from opensfm import pymap
 from opensfm import reconstruction
 
 
-def test_track_triangulator_spherical() -> None:
-    """Test triangulating tracks of spherical images."""
+def _spherical_scene():
     tracks_manager = pymap.TracksManager()
     tracks_manager.add_observation("im1", "1", pymap.Observation(0, 0, 1.0, 0, 0, 0, 0))
     tracks_manager.add_observation(
@@ -37,7 +38,12 @@ def test_track_triangulator_spherical() -> None:
             "points": {},
         }
     )
+    return tracks_manager, rec
+
 
+def test_track_triangulator_spherical() -> None:
+    """Test triangulating tracks of spherical images."""
+    tracks_manager, rec = _spherical_scene()
     triangulator = reconstruction.TrackTriangulator(
         rec, reconstruction.TrackHandlerTrackManager(tracks_manager, rec)
     )
@@ -48,6 +54,65 @@ def test_track_triangulator_spherical() -> None:
     assert len(rec.points["1"].get_observations()) == 2
 
 
+@pytest.mark.parametrize("triangulation_type", ["ROBUST", "FULL"])
+def test_triangulate_shot_features_batch(triangulation_type) -> None:
+    """Test triangulating tracks of a shot in batch."""
+    tracks_manager, rec = _spherical_scene()
+    tracks_manager.add_observation("im1", "2", pymap.Observation(0, 0, 1.0, 0, 0, 0, 1))
+
+    conf = config.default_config()
+    conf["triangulation_type"] = triangulation_type
+    conf["triangulation_min_ray_angle"] = 2.0
+    changes = reconstruction.PointChanges()
+    reconstruction.triangulate_shot_features(
+        tracks_manager, rec, {"im1"}, conf, changes
+    )
+
+    assert list(rec.points) == ["1"]
+    assert changes.pop() == (["1"], [])
+    p = rec.points["1"].coordinates
+    assert np.allclose(p, [0, 0, 1.3763819204711])
+    observations = rec.points["1"].get_observations()
+    assert {shot.id: f for shot, f in observations.items()} == {"im1": 0, "im2": 1}
+
+
+def test_remove_outliers() -> None:
+    """Test removing observations with large reprojection errors."""
+    tracks_manager, rec = _spherical_scene()
+    reconstruction.triangulate_shot_features(
+        tracks_manager, rec, {"im1"}, config.default_config()
+    )
+    rec.create_point("2", np.array([0.0, 0.0, 1.0]))
+    for shot_id in ("im1", "im2"):
+        rec.add_observation(shot_id, "2", pymap.Observation(0, 0, 1.0, 0, 0, 0, 2))
+    rec.points["1"].reprojection_errors = {
+        "im1": np.array([0.001, 0.0]),
+        "im2": np.array([0.0, 0.002]),
+    }
+    rec.points["2"].reprojection_errors = {
+        "im1": np.array([0.001, 0.001]),
+        "im2": np.array([0.5, 0.0]),
+    }
+
+    conf = config.default_config()
+    conf["bundle_outlier_filtering_type"] = "FIXED"
+    conf["bundle_outlier_fixed_threshold"] = 0.01
+    assert reconstruction.remove_outliers(rec, conf, {"1": rec.points["1"]}) == 0
+    changes = reconstruction.PointChanges()
+    assert reconstruction.remove_outliers(rec, conf, None, changes) == 1
+    assert changes.pop() == ([], ["2"])
+    assert "1" in rec.points
+    assert "2" not in rec.points
+    assert len(rec.shots["im2"].get_valid_landmarks()) == 1
+
+
+def test_error_distribution() -> None:
+    errors = np.array([[0.0, 0.0], [1.0, 0.0], [2.0, 0.0]])
+    mean, std = reconstruction.get_error_distribution(errors)
+    assert np.allclose(mean, [1.0, 0.0])
+    assert np.isclose(std, 1.486)
+
+
 def unit_vector(x: object) -> np.ndarray:
     return np.array(x) / np.linalg.norm(x)
 
@@ -0,0 +1,98 @@
+import io
+
+import numpy as np
+from opensfm import pairs_selection, vlad, vlad_index
+from opensfm.test import data_generation
+
+
+def _clustered_descriptors(num_images: int, dimension: int) -> np.ndarray:
+    np.random.seed(42)
+    centers = np.random.normal(size=(20, dimension))
+    vectors = centers[np.random.randint(0, len(centers), num_images)]
+    vectors += 0.3 * np.random.normal(size=vectors.shape)
+    return vectors / np.linalg.norm(vectors, axis=1)[:, None]
+
+
+def test_vlad_index_recall() -> None:
+    vectors = _clustered_descriptors(1000, 32)
+    descriptors = {"im{}".format(i): v for i, v in enumerate(vectors)}
+    index = vlad_index.VladIndex.build(descriptors)
+
+    assert len(index) == len(descriptors)
+    positions = {im: i for i, im in enumerate(index.images)}
+    queries = ["im{}".format(i) for i in range(50)]
+    recall = index.recall(
+        np.array([descriptors[im] for im in queries]),
+        10,
+        16,
+        [positions[im] for im in queries],
+    )
+    assert recall > 0.9
+
+
+def test_vlad_index_search_finds_itself() -> None:
+    vectors = _clustered_descriptors(200, 16)
+    descriptors = {"im{}".format(i): v for i, v in enumerate(vectors)}
+    index = vlad_index.VladIndex.build(descriptors)
+
+    distances, indices = index.search(descriptors["im7"][None, :], 5, 4)[0]
+    assert index.images[indices[0]] == "im7"
+    assert distances[0] < 1e-5
+    assert np.all(np.diff(distances) >= 0)
+
+
+def test_vlad_index_add_and_save() -> None:
+    vectors = _clustered_descriptors(300, 16)
+    descriptors = {"im{}".format(i): v for i, v in enumerate(vectors[:200])}
+    index = vlad_index.VladIndex.build(descriptors, metadata={"dimension": 16})
+
+    new_images = ["new{}".format(i) for i in range(100)]
+    index.add(new_images, vectors[200:])
+    index.add(new_images[:10], vectors[200:210])
+    assert len(index) == 300
+
+    buffer = io.BytesIO()
+    index.save(buffer)
+    buffer.seek(0)
+    loaded = vlad_index.VladIndex.load(buffer)
+
+    assert loaded.images == index.images
+    assert loaded.metadata == {"dimension": 16}
+    assert np.allclose(loaded.vectors, index.vectors)
+    _, indices = loaded.search(vectors[250][None, :], 1, 4)[0]
+    assert loaded.images[indices[0]] == "new50"
+
+
+def test_vlad_index_search_allowed() -> None:
+    vectors = _clustered_descriptors(500, 16)
+    descriptors = {"im{}".format(i): v for i, v in enumerate(vectors)}
+    index = vlad_index.VladIndex.build(descriptors, 20)
+    allowed = np.array([int(im[2:]) % 10 == 0 for im in index.images])
+
+    for distances, indices in index.search_allowed(vectors[:20], 10, 1, allowed):
+        assert len(indices) == 10
+        assert np.all(allowed[indices])
+        assert np.all(np.diff(distances) >= 0)
+
+    positions = {im: i for i, im in enumerate(index.images)}
+    exclude = [positions["im{}".format(i)] for i in range(20)]
+    assert index.recall(vectors[:20], 10, 8, exclude, allowed) > 0.9
+
+
+def test_update_vlad_index_rebuilds_outdated(tmpdir, monkeypatch) -> None:
+    data = data_generation.create_berlin_test_folder(tmpdir)
+    words = np.random.default_rng(0).normal(size=(16, 8)).astype(np.float32)
+    monkeypatch.setattr(vlad.instance, "load_words", lambda data: words)
+
+    vectors = _clustered_descriptors(100, 16)
+    descriptors = {"im{}".format(i): v for i, v in enumerate(vectors)}
+    pairs_selection.update_vlad_index(data, descriptors)
+    index = pairs_selection.update_vlad_index(data, {"new": vectors[0]})
+    assert len(index) == len(descriptors) + 1
+
+    monkeypatch.setattr(vlad.instance, "load_words", lambda data: 2 * words)
+    subset = {im: descriptors[im] for im in list(descriptors)[:10]}
+    index = pairs_selection.update_vlad_index(data, subset)
+
+    assert len(index) == len(subset)
+    assert data.load_vlad_index().metadata == index.metadata
@@ -4,6 +4,8 @@ import typing as t
 import networkx as nx
 import numpy as np
 from opensfm import pymap
+from scipy import sparse
+from scipy.sparse import csgraph
 from opensfm.dataset_base import DataSetBase
 from opensfm.unionfind import UnionFind
 from opensfm.pymap import TracksManager
@@ -66,7 +68,120 @@ def create_tracks_manager(
     matches: t.Dict[t.Tuple[str, str], t.List[t.Tuple[int, int]]],
     min_length: int,
 ) -> TracksManager:
-    """Link matches into tracks."""
+    """Link matches into tracks.
+
+    Features are encoded as integers (image offset + feature index) and
+    tracks are the connected components of the graph of matches. Tracks
+    shorter than min_length or seeing an image twice are discarded.
+    """
+    logger.debug("Merging features onto tracks")
+    images, offsets, nodes, labels = _connected_features(features, matches)
+    num_images = len(images)
+    node_image = np.searchsorted(offsets, nodes, side="right") - 1
+    node_feature = nodes - offsets[node_image]
+
+    # Keep tracks having at least min_length features and at most one per image
+    labels = labels.astype(np.int64)
+    num_components = labels.max() + 1 if len(labels) else 0
+    track_length = np.bincount(labels, minlength=num_components)
+    image_per_track = np.unique(labels * num_images + node_image) // num_images
+    distinct_images = np.bincount(image_per_track, minlength=num_components)
+    good = (track_length >= min_length) & (distinct_images == track_length)
+    track_ids = np.cumsum(good) - 1
+    logger.debug("Good tracks: {}".format(np.count_nonzero(good)))
+
+    # Nodes are sorted, so the kept observations are grouped by image
+    kept = np.flatnonzero(good[labels])
+    kept_images, starts = np.unique(node_image[kept], return_index=True)
+    ends = np.append(starts[1:], len(kept))
+
+    NO_VALUE = pymap.Observation.NO_SEMANTIC_VALUE
+    tracks_manager = pymap.TracksManager()
+    for image_index, start, end in zip(kept_images, starts, ends):
+        image = images[image_index]
+        if image not in features:
+            continue
+        observations = kept[start:end]
+        feature_ids = node_feature[observations]
+        no_values = np.full(len(feature_ids), NO_VALUE, dtype=np.int32)
+        tracks_manager.add_shot_observations(
+            image,
+            track_ids[labels[observations]].astype(np.int32),
+            np.asarray(features[image][feature_ids, :3], dtype=np.float64),
+            np.asarray(colors[image][feature_ids], dtype=np.int32),
+            feature_ids.astype(np.int32),
+            segmentations[image][feature_ids].astype(np.int32)
+            if image in segmentations
+            else no_values,
+            instances[image][feature_ids].astype(np.int32)
+            if image in instances
+            else no_values,
+        )
+    return tracks_manager
+
+
+def _connected_features(
+    features: t.Dict[str, np.ndarray],
+    matches: t.Dict[t.Tuple[str, str], t.List[t.Tuple[int, int]]],
+) -> t.Tuple[t.List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """Connected components of the graph of matched features.
+
+    Returns the list of images, the offset of the first feature of each
+    image in the integer encoding, the sorted encoded matched features
+    and their component labels.
+    """
+    sizes = {im: len(f) for im, f in features.items()}
+    pairs = []
+    for (im1, im2), pair_matches in matches.items():
+        pair_matches = np.asarray(pair_matches, dtype=np.int64).reshape(-1, 2)
+        if not len(pair_matches):
+            continue
+        for im, column in ((im1, 0), (im2, 1)):
+            if im not in features:
+                # Features are missing, size the image from its matches
+                size = pair_matches[:, column].max() + 1
+                sizes[im] = max(sizes.get(im, 0), size)
+        pairs.append((im1, im2, pair_matches))
+
+    images = list(sizes)
+    image_index = {im: i for i, im in enumerate(images)}
+    offsets = np.zeros(len(images) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([sizes[im] for im in images])
+    if not pairs:
+        empty = np.zeros(0, dtype=np.int64)
+        return images, offsets, empty, empty
+
+    sources = np.concatenate(
+        [offsets[image_index[im1]] + m[:, 0] for im1, _, m in pairs]
+    )
+    targets = np.concatenate(
+        [offsets[image_index[im2]] + m[:, 1] for _, im2, m in pairs]
+    )
+
+    # Only matched features are graph vertices
+    nodes, edges = np.unique(np.concatenate((sources, targets)), return_inverse=True)
+    num_edges = len(sources)
+    graph = sparse.coo_matrix(
+        (np.ones(num_edges, dtype=np.int8), (edges[:num_edges], edges[num_edges:])),
+        shape=(len(nodes), len(nodes)),
+    )
+    _, labels = csgraph.connected_components(graph, directed=False)
+    return images, offsets, nodes, labels
+
+
+def create_tracks_manager_unionfind(
+    features: t.Dict[str, np.ndarray],
+    colors: t.Dict[str, np.ndarray],
+    segmentations: t.Dict[str, np.ndarray],
+    instances: t.Dict[str, np.ndarray],
+    matches: t.Dict[t.Tuple[str, str], t.List[t.Tuple[int, int]]],
+    min_length: int,
+) -> TracksManager:
+    """Link matches into tracks using a pure-Python union-find.
+
+    Slow reference implementation of create_tracks_manager, kept for
+    validation and benchmarking.
+    """
     logger.debug("Merging features onto tracks")
     uf = UnionFind()
     for im1, im2 in matches:
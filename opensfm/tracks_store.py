@@ -0,0 +1,206 @@
+"""Binary columnar storage of a TracksManager.
+
+A tracks store is a directory holding:
+ - a text shot table ``shots.txt`` with one line per shot: ``shot offset
+   count`` (tab-separated) after a version header line, where offset and
+   count locate the shot observations in the columns,
+ - a text track table ``tracks.txt`` with one track id per line, the line
+   number being the track index used by the observations,
+ - one raw little-endian file per observation column (track index, feature
+   id, x/y/scale, color, segmentation and instance).
+
+Observations are written shot by shot, so that saving never needs more than
+the observations of one shot on top of the manager itself. Columns are
+memory-mapped when loading, and only the shots asked for are materialized.
+"""
+
+import contextlib
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from opensfm import io, pymap
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+VERSION_HEADER = "OPENSFM_BINARY_TRACKS_v1"
+TABLE_SEPARATOR = "\t"
+
+# Column name -> (dtype, number of values per observation)
+COLUMNS: Dict[str, Tuple[np.dtype, int]] = {
+    "track_index": (np.dtype("<i4"), 1),
+    "feature_id": (np.dtype("<i4"), 1),
+    "point": (np.dtype("<f8"), 3),
+    "color": (np.dtype("<i4"), 3),
+    "segmentation": (np.dtype("<i4"), 1),
+    "instance": (np.dtype("<i4"), 1),
+}
+
+TShotTable = Dict[str, Tuple[int, int]]
+
+
+class BinaryTracksStore(object):
+    """Columnar, memory-mapped store of a TracksManager."""
+
+    def __init__(self, io_handler: io.IoFilesystemBase, path: str) -> None:
+        self.io_handler = io_handler
+        self.path = path
+        self._shots: Optional[TShotTable] = None
+        self._track_ids: Optional[np.ndarray] = None
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["_shots"] = None
+        state["_track_ids"] = None
+        state["_columns"] = {}
+        return state
+
+    def shots_file(self) -> str:
+        return os.path.join(self.path, "shots.txt")
+
+    def tracks_file(self) -> str:
+        return os.path.join(self.path, "tracks.txt")
+
+    def column_file(self, name: str) -> str:
+        return os.path.join(self.path, name + ".bin")
+
+    def exists(self) -> bool:
+        return self.io_handler.isfile(self.shots_file())
+
+    def shot_ids(self) -> List[str]:
+        return list(self._load_shots().keys())
+
+    def save(self, tracks_manager: pymap.TracksManager) -> None:
+        """Write all observations of the manager, one shot at a time."""
+        self.io_handler.mkdir_p(self.path)
+        track_indices: Dict[str, int] = {}
+
+        with contextlib.ExitStack() as stack:
+            fshots = stack.enter_context(self.io_handler.open(self.shots_file(), "w"))
+            ftracks = stack.enter_context(
+                self.io_handler.open(self.tracks_file(), "w")
+            )
+            fcolumns = {
+                name: stack.enter_context(
+                    self.io_handler.open(self.column_file(name), "wb")
+                )
+                for name in COLUMNS
+            }
+
+            fshots.write(VERSION_HEADER + "\n")
+            offset = 0
+            for shot_id in sorted(tracks_manager.get_shot_ids()):
+                (
+                    track_ids,
+                    points,
+                    colors,
+                    feature_ids,
+                    segmentations,
+                    instances,
+                ) = tracks_manager.get_shot_observations_arrays(shot_id)
+
+                indices = np.empty(len(track_ids), dtype=np.int64)
+                new_tracks = []
+                for i, track_id in enumerate(track_ids):
+                    index = track_indices.get(track_id)
+                    if index is None:
+                        index = len(track_indices)
+                        track_indices[track_id] = index
+                        new_tracks.append(track_id)
+                    indices[i] = index
+                if new_tracks:
+                    ftracks.write("\n".join(new_tracks) + "\n")
+
+                values = {
+                    "track_index": indices,
+                    "feature_id": feature_ids,
+                    "point": points,
+                    "color": colors,
+                    "segmentation": segmentations,
+                    "instance": instances,
+                }
+                for name, (dtype, _) in COLUMNS.items():
+                    column = np.ascontiguousarray(values[name], dtype=dtype)
+                    fcolumns[name].write(column.tobytes())
+
+                count = len(track_ids)
+                fshots.write(
+                    TABLE_SEPARATOR.join((shot_id, str(offset), str(count))) + "\n"
+                )
+                offset += count
+
+        self._shots = None
+        self._track_ids = None
+        self._columns = {}
+
+    def load(self, shot_ids: Optional[Iterable[str]] = None) -> pymap.TracksManager:
+        """Materialize a TracksManager with the given shots (all by default).
+
+        Shots not present in the store are ignored.
+        """
+        shots = self._load_shots()
+        if shot_ids is None:
+            shot_ids = shots.keys()
+        track_ids = self._load_track_ids()
+
+        tracks_manager = pymap.TracksManager()
+        for shot_id in shot_ids:
+            if shot_id not in shots:
+                continue
+            offset, count = shots[shot_id]
+            if count == 0:
+                continue
+            end = offset + count
+            tracks_manager.add_shot_observations(
+                shot_id,
+                track_ids[self._column("track_index")[offset:end]].tolist(),
+                self._column("point")[offset:end],
+                self._column("color")[offset:end],
+                self._column("feature_id")[offset:end],
+                self._column("segmentation")[offset:end],
+                self._column("instance")[offset:end],
+            )
+        return tracks_manager
+
+    def _column(self, name: str) -> np.ndarray:
+        column = self._columns.get(name)
+        if column is None:
+            dtype, width = COLUMNS[name]
+            column = self.io_handler.memmap(self.column_file(name), dtype)
+            if width > 1:
+                column = column.reshape(-1, width)
+            self._columns[name] = column
+        return column
+
+    def _load_track_ids(self) -> np.ndarray:
+        if self._track_ids is None:
+            with self.io_handler.open_rt(self.tracks_file()) as fin:
+                self._track_ids = np.array(fin.read().splitlines(), dtype=object)
+        return self._track_ids
+
+    def _load_shots(self) -> TShotTable:
+        if self._shots is not None:
+            return self._shots
+
+        shots = {}
+        with self.io_handler.open_rt(self.shots_file()) as fin:
+            header = fin.readline().rstrip("\n")
+            if header != VERSION_HEADER:
+                raise IOError(
+                    "Unsupported binary tracks version: {}".format(header)
+                )
+            for line in fin:
+                fields = line.rstrip("\n").split(TABLE_SEPARATOR)
+                if len(fields) != 3:
+                    logger.warning(
+                        "Ignoring invalid tracks shot line: {}".format(line)
+                    )
+                    continue
+                shot_id, offset, count = fields
+                shots[shot_id] = (int(offset), int(count))
+        self._shots = shots
+        return shots
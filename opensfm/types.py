@@ -1,5 +1,5 @@
 """Basic types for building a reconstruction."""
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 import numpy as np
 from opensfm import pygeometry
@@ -331,6 +331,29 @@ class Reconstruction(object):
     def remove_observation(self, shot_id: str, lm_id: str) -> None:
         self.map.remove_observation(shot_id, lm_id)
 
+    def add_points_from_tracks(
+        self,
+        tracks_manager: pymap.TracksManager,
+        point_ids: List[str],
+        coordinates: np.ndarray,
+        shot_ids: List[str],
+        point_indices: np.ndarray,
+    ) -> None:
+        """Create points and add their observations from a tracks manager
+        :param tracks_manager: The tracks manager holding the observations
+        :param point_ids: The ids of the points to create
+        :param coordinates: The (N, 3) coordinates of the points
+        :param shot_ids: The shot of each observation to add
+        :param point_indices: The index in point_ids of each observation
+        """
+        self.map.add_landmarks_from_tracks(
+            tracks_manager,
+            point_ids,
+            np.asarray(coordinates, dtype=np.float64),
+            shot_ids,
+            np.asarray(point_indices, dtype=np.int32),
+        )
+
     def __deepcopy__(self, d):
         # create new reconstruction
         rec_cpy = Reconstruction()
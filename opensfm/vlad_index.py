@@ -0,0 +1,278 @@
+"""Approximate nearest neighbors index of VLAD descriptors.
+
+The index is an inverted file (IVF): descriptors are clustered with k-means
+into cells, and a query only compares to the descriptors of the cells having
+the closest centroids. Descriptors are stored as a float32 matrix sorted by
+cell, so that the members of a cell are a contiguous slice.
+
+An index carries metadata identifying what its descriptors were computed
+from (e.g. the VLAD vocabulary), so that a stale persisted index can be
+detected and rebuilt.
+"""
+
+import json
+import logging
+from typing import Any, Dict, IO, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+VLAD_INDEX_VERSION = 1
+
+# Number of rows per block when comparing descriptors to centroids
+ASSIGNMENT_BLOCK_SIZE = 4096
+
+
+def squared_distances(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Squared L2 distances between the rows of a and b."""
+    squared = (
+        np.einsum("ij,ij->i", a, a)[:, None]
+        + np.einsum("ij,ij->i", b, b)[None, :]
+        - 2 * a.dot(b.T)
+    )
+    return np.maximum(squared, 0)
+
+
+def nearest_centroids(
+    vectors: np.ndarray, centroids: np.ndarray, count: int = 1
+) -> np.ndarray:
+    """Indices of the count closest centroids of each vector, closest first."""
+    count = min(count, len(centroids))
+    nearest = np.empty((len(vectors), count), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGNMENT_BLOCK_SIZE):
+        block = squared_distances(
+            vectors[start : start + ASSIGNMENT_BLOCK_SIZE], centroids
+        )
+        if count < len(centroids):
+            candidates = np.argpartition(block, count - 1, axis=1)[:, :count]
+        else:
+            candidates = np.tile(np.arange(len(centroids)), (len(block), 1))
+        order = np.argsort(np.take_along_axis(block, candidates, axis=1), axis=1)
+        nearest[start : start + len(block)] = np.take_along_axis(
+            candidates, order, axis=1
+        )
+    return nearest
+
+
+def kmeans(
+    vectors: np.ndarray, num_clusters: int, iterations: int, seed: int = 0
+) -> np.ndarray:
+    """Cluster centers of the vectors computed with Lloyd iterations."""
+    rng = np.random.default_rng(seed)
+    num_clusters = min(num_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), num_clusters, replace=False)]
+    for _ in range(iterations):
+        labels = nearest_centroids(vectors, centroids)[:, 0]
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        counts = np.bincount(labels, minlength=num_clusters)
+        non_empty = counts > 0
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+    return centroids
+
+
+class VladIndex(object):
+    """Inverted file index of VLAD descriptors."""
+
+    def __init__(
+        self,
+        images: List[str],
+        vectors: np.ndarray,
+        centroids: np.ndarray,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.metadata: Dict[str, Any] = metadata or {}
+        self.centroids = centroids.astype(np.float32)
+        self.images: List[str] = []
+        self.vectors = np.zeros((0, self.centroids.shape[1]), dtype=np.float32)
+        self.cells = np.zeros(0, dtype=np.int64)
+        self.cell_offsets = np.zeros(len(self.centroids) + 1, dtype=np.int64)
+        self.add(images, vectors)
+
+    @classmethod
+    def build(
+        cls,
+        descriptors: Dict[str, np.ndarray],
+        num_cells: int = 0,
+        iterations: int = 10,
+        max_training_vectors_per_cell: int = 256,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> "VladIndex":
+        """Build an index of the given VLAD descriptors.
+
+        If num_cells is 0, it is set to 4 * sqrt(number of descriptors).
+        Centroids are trained on a random sample of at most
+        max_training_vectors_per_cell descriptors per cell.
+        """
+        images = sorted(descriptors)
+        vectors = np.array([descriptors[im] for im in images], dtype=np.float32)
+        if num_cells <= 0:
+            num_cells = max(1, int(4 * np.sqrt(len(images))))
+        num_cells = min(num_cells, len(images))
+
+        rng = np.random.default_rng(0)
+        num_training = min(len(images), num_cells * max_training_vectors_per_cell)
+        training = vectors[rng.choice(len(images), num_training, replace=False)]
+        centroids = kmeans(training, num_cells, iterations)
+        return cls(images, vectors, centroids, metadata)
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def add(self, images: Iterable[str], vectors: np.ndarray) -> None:
+        """Add descriptors to the index, keeping the current centroids.
+
+        Images already in the index are ignored.
+        """
+        images = list(images)
+        known = set(self.images)
+        new = [i for i, im in enumerate(images) if im not in known]
+        if len(new) == 0:
+            return
+        new_vectors = np.asarray(vectors, dtype=np.float32)[new]
+        new_cells = nearest_centroids(new_vectors, self.centroids)[:, 0]
+
+        all_images = np.array(self.images + [images[i] for i in new], dtype=object)
+        all_vectors = np.vstack((self.vectors, new_vectors))
+        all_cells = np.concatenate((self.cells, new_cells))
+
+        order = np.argsort(all_cells, kind="stable")
+        self.images = all_images[order].tolist()
+        self.vectors = all_vectors[order]
+        self.cells = all_cells[order]
+        self.cell_offsets = np.searchsorted(
+            self.cells, np.arange(len(self.centroids) + 1)
+        )
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        num_probes: int,
+        allowed: Optional[np.ndarray] = None,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Approximate k nearest descriptors of each query.
+
+        Only the descriptors of the num_probes cells closest to a query are
+        compared to it. If allowed is set, it is a boolean mask over
+        self.images of the descriptors that can be returned. Returns, for
+        each query, the L2 distances and the indices in self.images of its
+        neighbors, closest first.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        probes = nearest_centroids(queries, self.centroids, num_probes)
+
+        results = []
+        for query, cells in zip(queries, probes):
+            members = np.concatenate(
+                [
+                    np.arange(self.cell_offsets[c], self.cell_offsets[c + 1])
+                    for c in cells
+                ]
+            )
+            if allowed is not None:
+                members = members[allowed[members]]
+            if len(members) == 0:
+                results.append((np.zeros(0), np.zeros(0, dtype=np.int64)))
+                continue
+            distances = np.linalg.norm(self.vectors[members] - query, axis=1)
+            if len(members) > k:
+                best = np.argpartition(distances, k - 1)[:k]
+            else:
+                best = np.arange(len(members))
+            best = best[np.argsort(distances[best])]
+            results.append((distances[best], members[best]))
+        return results
+
+    def recall(
+        self,
+        queries: np.ndarray,
+        k: int,
+        num_probes: int,
+        exclude: Optional[List[int]] = None,
+        allowed: Optional[np.ndarray] = None,
+    ) -> float:
+        """Fraction of the exact k nearest neighbors found by search.
+
+        Exact neighbors are computed exhaustively. If exclude is set, it
+        holds for each query the index of a descriptor to ignore (e.g. the
+        query itself), or -1. If allowed is set, neighbors are searched
+        among the allowed descriptors only, as with search_allowed.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        exact = squared_distances(queries, self.vectors)
+        if allowed is None:
+            approximate = self.search(queries, k + 1, num_probes)
+        else:
+            exact[:, ~allowed] = np.inf
+            approximate = self.search_allowed(queries, k + 1, num_probes, allowed)
+
+        found, total = 0, 0
+        for i, (_, indices) in enumerate(approximate):
+            if exclude is not None and exclude[i] >= 0:
+                exact[i, exclude[i]] = np.inf
+                indices = indices[indices != exclude[i]]
+            expected = np.argsort(exact[i])[:k]
+            expected = expected[np.isfinite(exact[i, expected])]
+            found += len(np.intersect1d(expected, indices[:k]))
+            total += len(expected)
+        return found / total if total > 0 else 1.0
+
+    def search_allowed(
+        self,
+        queries: np.ndarray,
+        k: int,
+        num_probes: int,
+        allowed: np.ndarray,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Search among the allowed descriptors, probing more cells if needed.
+
+        Queries getting less than k neighbors from the allowed descriptors
+        of their num_probes closest cells are searched again with twice as
+        many probes, up to all the cells.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        k = min(k, int(np.count_nonzero(allowed)))
+        results: List[Tuple[np.ndarray, np.ndarray]] = [
+            (np.zeros(0), np.zeros(0, dtype=np.int64))
+        ] * len(queries)
+        pending = np.arange(len(queries))
+        while len(pending) > 0:
+            found = self.search(queries[pending], k, num_probes, allowed)
+            exhaustive = num_probes >= len(self.centroids)
+            missing = []
+            for query, result in zip(pending, found):
+                results[query] = result
+                if len(result[1]) < k and not exhaustive:
+                    missing.append(query)
+            pending = np.array(missing, dtype=np.int64)
+            num_probes *= 2
+        return results
+
+    def save(self, fileobj: IO[bytes]) -> None:
+        np.savez(
+            fileobj,
+            images=np.array(self.images, dtype=str),
+            vectors=self.vectors,
+            centroids=self.centroids,
+            cells=self.cells,
+            metadata=np.array(json.dumps(self.metadata, sort_keys=True)),
+        )
+
+    @classmethod
+    def load(cls, fileobj: IO[bytes]) -> "VladIndex":
+        s = np.load(fileobj)
+        metadata = json.loads(str(s["metadata"])) if "metadata" in s else {}
+        index = cls(
+            [], np.zeros((0, s["centroids"].shape[1])), s["centroids"], metadata
+        )
+        index.images = s["images"].tolist()
+        index.vectors = s["vectors"]
+        index.cells = s["cells"]
+        index.cell_offsets = np.searchsorted(
+            index.cells, np.arange(len(index.centroids) + 1)
+        )
+        return index